@@ -1,25 +1,236 @@
 # acervo/admin.py
+#
+# O admin precisa aguentar milhões de empréstimos:
+# - a listagem busca livro e leitor no mesmo SELECT (list_select_related);
+# - os campos de livro/leitor são autocomplete, não um <select> com todos;
+# - a busca usa o índice textual de acervo/busca.py, não LIKE em cada coluna;
+# - não há COUNT(*) da tabela inteira (show_full_result_count e PaginadorEstimado);
+# - os filtros por autor/gênero/turma listam só os valores mais frequentes,
+#   com a agregação em cache, em vez de um DISTINCT de todos os valores.
+#
+# Livros não são apagados pelo admin: 'Excluir' marca o livro como excluído
+# (acervo/exclusao.py) e a remoção física fica para 'manage.py purgar_livros'.
 
 from django.contrib import admin
-from .models import Livro, Emprestimo
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from .models import Livro, Leitor, Emprestimo, EmprestimoArquivado
+from . import busca, estatisticas, exclusao
+from .paginacao import PaginadorEstimado
+
+TIMEOUT_FACETAS = 600
+
+
+class _MaisFrequentesFilter(admin.SimpleListFilter):
+    """
+    Filtro pelo campo de texto 'parameter_name' que oferece só os 'limite'
+    valores mais frequentes, com a contagem de cada um. Qualquer outro valor
+    continua filtrável pela URL (?autor=...) e aparece na lista quando selecionado.
+    """
+    limite = 20
+
+    def lookups(self, request, model_admin):
+        chave = f'acervo:admin:facetas:{model_admin.model._meta.label_lower}:{self.parameter_name}'
+        frequentes = cache.get(chave)
+        if frequentes is None:
+            frequentes = list(
+                model_admin.model.objects.exclude(**{self.parameter_name: ''})
+                .values_list(self.parameter_name)
+                .annotate(total=Count('id'))
+                .order_by('-total', self.parameter_name)[:self.limite]
+            )
+            cache.set(chave, frequentes, TIMEOUT_FACETAS)
+        opcoes = [(valor, f'{valor} ({total})') for valor, total in frequentes]
+        if self.value() and self.value() not in dict(frequentes):
+            opcoes.insert(0, (self.value(), self.value()))
+        return opcoes
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.parameter_name: self.value()})
+        return queryset
+
+
+class AutorFilter(_MaisFrequentesFilter):
+    title = 'autor'
+    parameter_name = 'autor'
+
+
+class GeneroFilter(_MaisFrequentesFilter):
+    title = 'gênero'
+    parameter_name = 'genero'
+
+
+class TurmaFilter(_MaisFrequentesFilter):
+    title = 'turma'
+    parameter_name = 'turma'
+    limite = 50
+
+
+class SituacaoLivroFilter(admin.SimpleListFilter):
+    """Ativos (padrão) ou excluídos, no lugar da opção 'Todos'."""
+    title = 'situação'
+    parameter_name = 'situacao'
+
+    def lookups(self, request, model_admin):
+        return [('ativos', 'Ativos'), ('excluidos', 'Excluídos')]
+
+    def choices(self, changelist):
+        for valor, rotulo in self.lookup_choices:
+            yield {
+                'selected': (self.value() or 'ativos') == valor,
+                'query_string': changelist.get_query_string({self.parameter_name: valor}),
+                'display': rotulo,
+            }
+
+    def queryset(self, request, queryset):
+        return queryset.filter(excluido_em__isnull=self.value() != 'excluidos')
+
+
+class _AdminEscalavel(admin.ModelAdmin):
+    """Sem COUNT(*) da tabela inteira e com a busca textual de acervo/busca.py."""
+    show_full_result_count = False
+    paginator = PaginadorEstimado
+    buscar = None
+
+    def get_search_results(self, request, queryset, search_term):
+        # Também atende o autocomplete dos campos de chave estrangeira
+        if not search_term.strip():
+            return queryset, False
+        return self.buscar(queryset, search_term), False
+
 
 @admin.register(Livro)
-class LivroAdmin(admin.ModelAdmin):
+class LivroAdmin(_AdminEscalavel):
     # CORREÇÃO: Substitua 'disponivel' pelos novos campos
-    list_display = ('titulo', 'autor', 'numero_copias', 'copias_disponiveis') 
-    # CORREÇÃO: Remova 'disponivel' do filtro (pode adicionar 'genero' ou outro campo se quiser)
-    list_filter = ('genero', 'autor') 
+    list_display = ('titulo', 'autor', 'numero_copias', 'copias_disponiveis', 'excluido_em')
+    list_filter = (SituacaoLivroFilter, GeneroFilter, AutorFilter)
     search_fields = ('titulo', 'autor', 'isbn')
+    search_help_text = 'Título, autor ou ISBN.'
+    buscar = staticmethod(busca.buscar_livros)
+    ordering = ('titulo', 'id')
     # Adiciona 'copias_disponiveis' como campo de apenas leitura
     readonly_fields = ('copias_disponiveis',)
 
+    actions = ('excluir_livros', 'restaurar_livros')
+
+    def get_queryset(self, request):
+        # Também os excluídos, para o filtro de situação e a restauração
+        return Livro.todos.order_by(*self.get_ordering(request))
+
+    def get_search_results(self, request, queryset, search_term):
+        if request.GET.get('field_name'):
+            # Autocomplete de Emprestimo.livro: excluídos não podem ser emprestados
+            queryset = queryset.filter(excluido_em__isnull=True)
+        return super().get_search_results(request, queryset, search_term)
+
+    def has_delete_permission(self, request, obj=None):
+        # O DELETE em cascata apagaria o histórico numa transação só
+        return False
+
+    # Mantém os contadores do dashboard em dia (ver acervo/estatisticas.py)
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change:
+            estatisticas.ajustar(total_livros=1)
+
+    @admin.action(description='Excluir os livros selecionados', permissions=['change'])
+    def excluir_livros(self, request, queryset):
+        excluidos = exclusao.excluir(queryset)
+        self.message_user(request, f'{excluidos} livro(s) excluído(s). O histórico fica até a limpeza periódica.')
+
+    @admin.action(description='Restaurar os livros selecionados', permissions=['change'])
+    def restaurar_livros(self, request, queryset):
+        restaurados = exclusao.restaurar(queryset)
+        self.message_user(request, f'{restaurados} livro(s) de volta ao catálogo.')
+
+
+@admin.register(Leitor)
+class LeitorAdmin(_AdminEscalavel):
+    list_display = ('nome', 'matricula', 'turma', 'telefone', 'ativo', 'emprestimos_abertos', 'emprestimos_atrasados')
+    list_filter = ('ativo', TurmaFilter)
+    search_fields = ('nome', 'matricula', 'turma')
+    search_help_text = 'Nome, matrícula ou turma.'
+    buscar = staticmethod(busca.buscar_leitores)
+    ordering = ('nome', 'id')
+
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        antes = change and Leitor.objects.filter(pk=obj.pk).values_list('ativo', flat=True).first()
+        if change:
+            # Só os campos do form: os contadores de empréstimos são mantidos pela circulação
+            obj.save(update_fields=[*form._meta.fields, 'atualizado_em'])
+        else:
+            super().save_model(request, obj, form, change)
+        estatisticas.ajustar(leitores_ativos=int(obj.ativo) - int(bool(antes)))
+
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        estatisticas.ajustar(leitores_ativos=-int(obj.ativo))
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        ativos = queryset.filter(ativo=True).count()
+        super().delete_queryset(request, queryset)
+        estatisticas.ajustar(leitores_ativos=-ativos)
+
+
 @admin.register(Emprestimo)
-class EmprestimoAdmin(admin.ModelAdmin):
-    list_display = ('livro', 'leitor', 'data_emprestimo', 'data_devolucao_prevista', 'data_devolucao_real')
-    list_filter = ('data_emprestimo', 'data_devolucao_prevista')
-    search_fields = ('livro__titulo', 'leitor')
+class EmprestimoAdmin(_AdminEscalavel):
+    list_display = ('livro', 'leitor', 'data_emprestimo', 'data_devolucao_prevista', 'data_devolucao_real', 'status')
+    list_select_related = ('livro', 'leitor')
+    list_filter = ('status', 'data_emprestimo', 'data_devolucao_prevista')
+    search_fields = ('livro__titulo', 'leitor__nome', 'leitor__matricula')
+    search_help_text = 'Título do livro, nome ou matrícula do leitor.'
+    buscar = staticmethod(busca.buscar_emprestimos)
+    autocomplete_fields = ('livro', 'leitor')
+    # Casa com o índice emprestimo_data_idx
+    ordering = ('-data_emprestimo', '-id')
 
+    @transaction.atomic
     def save_model(self, request, obj, form, change):
         if not obj.pk:
             obj.bibliotecario = request.user
-        super().save_model(request, obj, form, change)
\ No newline at end of file
+        # Compara a situação antes/depois da edição para ajustar os contadores
+        antigo = Emprestimo.objects.filter(pk=obj.pk).first() if obj.pk else None
+        # As datas podem ter mudado: o status gravado acompanha
+        obj.status = obj.calcular_status()
+        super().save_model(request, obj, form, change)
+        estatisticas.emprestimo_alterado(estatisticas.situacao(antigo), estatisticas.situacao(obj))
+        # Edições no admin são raras: recalcula o leitor e o livro envolvidos (antes e depois)
+        estatisticas.recalcular_agregados(
+            leitores={obj.leitor_id, antigo.leitor_id if antigo else obj.leitor_id},
+            livros={obj.livro_id, antigo.livro_id if antigo else obj.livro_id},
+        )
+
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        estatisticas.emprestimos_removidos(Emprestimo.objects.filter(pk=obj.pk))
+        super().delete_model(request, obj)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        estatisticas.emprestimos_removidos(queryset)
+        super().delete_queryset(request, queryset)
+
+
+@admin.register(EmprestimoArquivado)
+class EmprestimoArquivadoAdmin(_AdminEscalavel):
+    """Só consulta: o arquivo é escrito por 'manage.py arquivar_emprestimos'."""
+    list_display = ('livro', 'leitor', 'data_emprestimo', 'data_devolucao_prevista', 'data_devolucao_real')
+    list_select_related = ('livro', 'leitor')
+    list_filter = ('data_emprestimo',)
+    search_fields = ('livro__titulo', 'leitor__nome', 'leitor__matricula')
+    search_help_text = 'Título do livro, nome ou matrícula do leitor.'
+    buscar = staticmethod(busca.buscar_emprestimos)
+    # Casa com o índice arquivado_data_idx
+    ordering = ('-data_emprestimo', '-id')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,239 @@
+# acervo/api.py
+#
+# API REST somente leitura (/api/v1/) do catálogo, dos leitores e dos
+# empréstimos, para integrações (sistema da escola, terminais de consulta)
+# que sincronizam o acervo com frequência.
+#
+# - Paginação por cursor (acervo/paginacao.py): sem COUNT(*) nem OFFSET, a
+#   página N custa o mesmo que a primeira. ?page_size= vai até 500.
+# - ?fields=id,titulo devolve só esses campos, e o SELECT também só lê essas
+#   colunas (only() + select_related montados a partir do serializer).
+# - Os filtros da listagem são os das páginas HTML (acervo/filtros.py): ?q=,
+#   ?status=... Em leitores, como na página, o padrão são os ativos.
+# - ETag a partir da versão de cada tabela (a do cache do catálogo para
+#   livros e leitores, 'versao_emprestimos' para empréstimos): um cliente que
+#   manda If-None-Match recebe 304 sem que a consulta da página seja feita.
+# - ?changed_since=<data ISO> troca a listagem pela de alterações: tudo o que
+#   mudou depois do instante, em ordem de 'atualizado_em' (os filtros acima
+#   são ignorados, para que inativações e devoluções também apareçam). Livros
+#   excluídos aparecem com 'excluido_em' preenchido (ver acervo/exclusao.py);
+#   remoções físicas e empréstimos que foram para o arquivo (ver
+#   acervo/historico.py) não aparecem. O cliente deve pedir com alguns
+#   segundos de folga em relação à última alteração recebida (transações
+#   ainda abertas gravam 'atualizado_em' antes do commit).
+
+import hashlib
+
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from rest_framework import routers, serializers, viewsets
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+from .models import Livro, Leitor, Emprestimo
+from . import autocomplete, cache_catalogo, estatisticas, filtros
+from .paginacao import paginar_por_cursor
+
+
+# --- Serializers ---
+
+class _CamposEsparsosMixin:
+    """Mantém só os campos pedidos em ?fields= (separados por vírgula)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        pedidos = request.query_params.get('fields') if request is not None else None
+        if not pedidos:
+            return
+        campos = {nome.strip() for nome in pedidos.split(',') if nome.strip()}
+        desconhecidos = campos - set(self.fields)
+        if desconhecidos:
+            raise ValidationError({'fields': (
+                f"Campos desconhecidos: {', '.join(sorted(desconhecidos))}. "
+                f"Disponíveis: {', '.join(self.fields)}."
+            )})
+        for nome in set(self.fields) - campos:
+            self.fields.pop(nome)
+
+
+class LivroSerializer(_CamposEsparsosMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Livro
+        fields = [
+            'id', 'titulo', 'autor', 'editora', 'ano_publicacao', 'isbn', 'genero', 'descricao',
+            'numero_copias', 'copias_disponiveis', 'atualizado_em', 'excluido_em',
+        ]
+        read_only_fields = fields
+
+
+class LeitorSerializer(_CamposEsparsosMixin, serializers.ModelSerializer):
+    # O telefone fica de fora: é dado pessoal e só a lista de cobrança o usa
+    class Meta:
+        model = Leitor
+        fields = ['id', 'nome', 'matricula', 'turma', 'ativo', 'atualizado_em']
+        read_only_fields = fields
+
+
+class EmprestimoSerializer(_CamposEsparsosMixin, serializers.ModelSerializer):
+    livro_titulo = serializers.CharField(source='livro.titulo', read_only=True)
+    leitor_nome = serializers.CharField(source='leitor.nome', read_only=True)
+    leitor_matricula = serializers.CharField(source='leitor.matricula', read_only=True)
+
+    class Meta:
+        model = Emprestimo
+        fields = [
+            'id', 'livro', 'livro_titulo', 'leitor', 'leitor_nome', 'leitor_matricula',
+            'data_emprestimo', 'data_devolucao_prevista', 'data_devolucao_real', 'status', 'atualizado_em',
+        ]
+        read_only_fields = fields
+
+
+# --- Paginação ---
+
+class PaginacaoCursor(BasePagination):
+    """Paginação keyset de acervo/paginacao.py na resposta {'next', 'previous', 'results'}."""
+    page_size = 100
+    max_page_size = 500
+
+    def _tamanho(self, request):
+        try:
+            tamanho = int(request.query_params.get('page_size', self.page_size))
+        except ValueError:
+            return self.page_size
+        return min(max(tamanho, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.pagina = paginar_por_cursor(request, queryset, self._tamanho(request))
+        return list(self.pagina)
+
+    def _url(self, consulta):
+        return self.request.build_absolute_uri(self.request.path + consulta)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self._url(self.pagina.url_proxima()) if self.pagina.has_next() else None,
+            'previous': self._url(self.pagina.url_anterior()) if self.pagina.has_previous() else None,
+            'results': data,
+        })
+
+
+# --- Views ---
+
+class _APIViewSet(viewsets.ReadOnlyModelViewSet):
+    pagination_class = PaginacaoCursor
+    # Função de acervo/filtros.py usada na listagem
+    filtrar = None
+
+    def versao(self):
+        raise NotImplementedError
+
+    def ultima_modificacao(self, versao):
+        """Instante (em segundos) da versão, quando ela é um carimbo de tempo."""
+        return None
+
+    def _alterados_desde(self):
+        texto = self.request.query_params.get('changed_since')
+        if not texto:
+            return None
+        # Um '+' não codificado na URL chega como espaço
+        desde = parse_datetime(texto.strip().replace(' ', '+'))
+        if desde is None:
+            raise ValidationError({'changed_since': 'Use uma data ISO 8601, ex.: 2025-03-01T08:00:00-03:00.'})
+        if timezone.is_naive(desde):
+            desde = timezone.make_aware(desde)
+        return desde
+
+    def get_queryset(self):
+        modelo = self.get_serializer_class().Meta.model
+        if self.action != 'list':
+            queryset = modelo.objects.order_by('id')
+        else:
+            desde = self._alterados_desde()
+            if desde is not None:
+                # _base_manager: também os livros excluídos, para o cliente removê-los
+                queryset = modelo._base_manager.filter(atualizado_em__gt=desde).order_by('atualizado_em', 'id')
+            else:
+                queryset = self.filtrar(self.request.query_params)
+        return self._projetar(queryset)
+
+    def _projetar(self, queryset):
+        """Só as colunas dos campos pedidos (e as da ordenação, que o cursor lê)."""
+        colunas = {'id'}
+        relacionados = set()
+        for campo in self.get_serializer().fields.values():
+            caminho = campo.source.split('.')
+            colunas.add('__'.join(caminho))
+            if len(caminho) > 1:
+                relacionados.add('__'.join(caminho[:-1]))
+        # Anotações (ex.: 'relevancia' da busca) já vêm no SELECT
+        ordenacao = {campo.lstrip('-') for campo in queryset.query.order_by}
+        colunas |= ordenacao - set(queryset.query.annotations) - {'pk'}
+        if relacionados:
+            queryset = queryset.select_related(*relacionados)
+        return queryset.only(*colunas | relacionados)
+
+    def _condicional(self, handler, request, *args, **kwargs):
+        versao = self.versao()
+        # A mesma versão vale para todas as URLs; o caminho e o formato distinguem as respostas
+        chave = f'{request.version}:{versao}:{request.accepted_renderer.format}:{request.get_full_path()}'
+        etag = '"%s"' % hashlib.md5(chave.encode()).hexdigest()
+        ultima = self.ultima_modificacao(versao)
+        nao_modificado = get_conditional_response(request, etag=etag, last_modified=ultima)
+        if nao_modificado is not None:
+            return nao_modificado
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+            if ultima is not None:
+                response['Last-Modified'] = http_date(ultima)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Accept', 'Authorization', 'Cookie'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._condicional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._condicional(super().retrieve, request, *args, **kwargs)
+
+
+class LivroViewSet(_APIViewSet):
+    serializer_class = LivroSerializer
+    filtrar = staticmethod(filtros.filtrar_livros)
+
+    def versao(self):
+        return cache_catalogo.versao()
+
+    def ultima_modificacao(self, versao):
+        return versao // 10**9
+
+
+class LeitorViewSet(_APIViewSet):
+    serializer_class = LeitorSerializer
+    filtrar = staticmethod(filtros.filtrar_leitores)
+
+    def versao(self):
+        return cache_catalogo.versao(autocomplete.CHAVE_VERSAO_LEITORES)
+
+    def ultima_modificacao(self, versao):
+        return versao // 10**9
+
+
+class EmprestimoViewSet(_APIViewSet):
+    serializer_class = EmprestimoSerializer
+    filtrar = staticmethod(filtros.filtrar_emprestimos)
+
+    def versao(self):
+        # Contador (não é um instante): só ETag, sem Last-Modified
+        return estatisticas.versao_emprestimos()
+
+
+router = routers.SimpleRouter()
+router.register('livros', LivroViewSet, basename='livro')
+router.register('leitores', LeitorViewSet, basename='leitor')
+router.register('emprestimos', EmprestimoViewSet, basename='emprestimo')
@@ -1,6 +1,43 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate, post_save, post_delete
+
+
+def garantir_indices_busca(sender, using, **kwargs):
+    # Algumas migrações recriam tabelas no SQLite e levam os triggers do FTS5 junto;
+    # reinstalar aqui (operação idempotente) mantém o índice de busca consistente
+    from django.db import connections
+    from .busca import get_backend
+    connection = connections[using]
+    if 'acervo_livro' in connection.introspection.table_names():
+        get_backend(using).instalar(connection)
+
+
+def invalidar_catalogo(sender, **kwargs):
+    # Livro criado, editado, excluído ou com cópias emprestadas/devolvidas
+    from .cache_catalogo import invalidar
+    invalidar()
+
+
+def invalidar_leitores(sender, **kwargs):
+    # Nome, matrícula ou situação de um leitor mudou: autocomplete desatualizado
+    from .autocomplete import invalidar_leitores
+    invalidar_leitores()
 
 
 class AcervoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'acervo'
+
+    def ready(self):
+        from . import metricas, sinais
+        # Toda conexão nova recebe o execute_wrapper que conta as consultas das requisições medidas
+        connection_created.connect(metricas.instalar_em_conexao)
+        post_migrate.connect(garantir_indices_busca, sender=self)
+        Livro = self.get_model('Livro')
+        post_save.connect(invalidar_catalogo, sender=Livro)
+        post_delete.connect(invalidar_catalogo, sender=Livro)
+        sinais.copias_alteradas.connect(invalidar_catalogo)
+        Leitor = self.get_model('Leitor')
+        post_save.connect(invalidar_leitores, sender=Leitor)
+        post_delete.connect(invalidar_leitores, sender=Leitor)
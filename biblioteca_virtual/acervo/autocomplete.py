@@ -0,0 +1,146 @@
+# acervo/autocomplete.py
+#
+# Autocomplete dos campos Select2 de livro e leitor, chamado a cada tecla.
+#
+# - A busca usa o índice textual de acervo/busca.py (prefixo por palavra).
+# - Só as colunas do rótulo são lidas (values_list), sem instanciar modelos.
+# - O JSON pronto fica num LRU dentro do processo, por termo normalizado. A
+#   chave inclui a versão do catálogo (ou dos leitores), que muda a cada
+#   alteração, então um processo nunca serve um resultado anterior a ela.
+# - A resposta leva ETag: quem repete uma busca recebe 304, sem corpo.
+# - livros()/leitores() servem as views síncronas; alivros()/aleitores(), as
+#   views async (ASGI), com o mesmo LRU.
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from .models import Livro, Leitor
+from . import busca, cache_catalogo
+
+LIMITE = 10
+TAMANHO_LRU = 2048
+
+CHAVE_VERSAO_LEITORES = 'acervo:leitores:versao'
+
+
+def normalizar(termo):
+    """'  Dom   CASMURRO ' e 'dom casmurro' são a mesma busca."""
+    return ' '.join(busca.tokens((termo or '').lower()))
+
+
+def _empacotar(resultados):
+    conteudo = json.dumps(resultados, ensure_ascii=False).encode()
+    return conteudo, '"%s"' % hashlib.md5(conteudo).hexdigest()
+
+
+class _LRU:
+    """LRU por processo. Diferente do lru_cache, serve também às views async."""
+
+    def __init__(self, tamanho):
+        self.tamanho = tamanho
+        self.dados = OrderedDict()
+        self.trava = threading.Lock()
+
+    def get(self, chave):
+        with self.trava:
+            valor = self.dados.get(chave)
+            if valor is not None:
+                self.dados.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave, valor):
+        with self.trava:
+            self.dados[chave] = valor
+            self.dados.move_to_end(chave)
+            if len(self.dados) > self.tamanho:
+                self.dados.popitem(last=False)
+        return valor
+
+
+_resultados = _LRU(TAMANHO_LRU)
+
+
+def _consulta_livros(termo):
+    livros = Livro.objects.filter(copias_disponiveis__gt=0)
+    if termo:
+        livros = busca.buscar_livros(livros, termo).order_by('-relevancia', 'titulo')
+    else:
+        livros = livros.order_by('titulo')
+    return livros.values_list('id', 'titulo', 'copias_disponiveis', 'isbn')[:LIMITE]
+
+
+def _rotulos_livros(linhas):
+    return _empacotar([
+        {'id': pk, 'text': f'{titulo} ({copias} cópias) - ISBN: {isbn}'}
+        for pk, titulo, copias, isbn in linhas
+    ])
+
+
+def _consulta_leitores(termo):
+    leitores = Leitor.objects.filter(ativo=True)
+    if termo:
+        leitores = busca.buscar_leitores(leitores, termo).order_by('-relevancia', 'nome')
+    else:
+        leitores = leitores.order_by('nome')
+    return leitores.values_list('id', 'nome', 'matricula')[:LIMITE]
+
+
+def _rotulos_leitores(linhas):
+    return _empacotar([
+        {'id': pk, 'text': f'{nome} (Matrícula: {matricula})'}
+        for pk, nome, matricula in linhas
+    ])
+
+
+def livros(termo):
+    """(JSON, ETag) dos livros com cópias disponíveis que casam com 'termo'."""
+    termo = normalizar(termo)
+    chave = ('livros', termo, cache_catalogo.versao())
+    return _resultados.get(chave) or _resultados.guardar(chave, _rotulos_livros(_consulta_livros(termo)))
+
+
+def leitores(termo):
+    """(JSON, ETag) dos leitores ativos que casam com 'termo'."""
+    termo = normalizar(termo)
+    chave = ('leitores', termo, cache_catalogo.versao(CHAVE_VERSAO_LEITORES))
+    return _resultados.get(chave) or _resultados.guardar(chave, _rotulos_leitores(_consulta_leitores(termo)))
+
+
+async def alivros(termo):
+    """Versão assíncrona de livros()."""
+    termo = normalizar(termo)
+    chave = ('livros', termo, await cache_catalogo.aversao())
+    resultado = _resultados.get(chave)
+    if resultado is None:
+        linhas = [linha async for linha in _consulta_livros(termo)]
+        resultado = _resultados.guardar(chave, _rotulos_livros(linhas))
+    return resultado
+
+
+async def aleitores(termo):
+    """Versão assíncrona de leitores()."""
+    termo = normalizar(termo)
+    chave = ('leitores', termo, await cache_catalogo.aversao(CHAVE_VERSAO_LEITORES))
+    resultado = _resultados.get(chave)
+    if resultado is None:
+        linhas = [linha async for linha in _consulta_leitores(termo)]
+        resultado = _resultados.guardar(chave, _rotulos_leitores(linhas))
+    return resultado
+
+
+def invalidar_leitores():
+    cache_catalogo.invalidar(CHAVE_VERSAO_LEITORES)
+
+
+def resposta(request, resultado):
+    conteudo, etag = resultado
+    response = HttpResponse(conteudo, content_type='application/json')
+    response['ETag'] = etag
+    # O navegador guarda, mas sempre confirma com o servidor (o estoque muda)
+    patch_cache_control(response, private=True, no_cache=True)
+    return get_conditional_response(request, etag=etag, response=response)
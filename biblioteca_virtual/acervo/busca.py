@@ -0,0 +1,255 @@
+# acervo/busca.py
+#
+# Busca textual do acervo (catálogo, leitores e empréstimos).
+#
+# O backend é escolhido pelo banco em uso: PostgreSQL usa tsvector + índice GIN
+# com uma configuração portuguesa sem acentos, SQLite usa tabelas virtuais FTS5,
+# e qualquer outro banco cai no antigo 'icontains'. Para forçar um backend,
+# defina ACERVO_BUSCA_BACKEND no settings com o caminho da classe.
+
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.models import Q, Value, FloatField, BooleanField
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+
+BACKENDS_POR_BANCO = {
+    'postgresql': 'acervo.busca.PostgresBusca',
+    'sqlite': 'acervo.busca.SqliteFTS5Busca',
+}
+
+# Limita o tamanho da consulta para não montar expressões enormes
+MAX_TOKENS = 8
+
+
+def tokens(termo):
+    """Quebra o termo digitado em palavras (letras/números), descartando pontuação."""
+    return re.findall(r'\w+', termo or '')[:MAX_TOKENS]
+
+
+class BuscaBase:
+    """
+    Interface comum. Cada método recebe um queryset e o termo digitado, e devolve
+    o queryset filtrado e anotado com 'relevancia' (maior = mais relevante).
+    """
+
+    def instalar(self, connection):
+        """Cria índices/estruturas auxiliares. Deve ser idempotente."""
+
+    def desinstalar(self, connection):
+        """Remove o que 'instalar' criou (usado ao reverter a migração)."""
+
+    def buscar_livros(self, queryset, termo):
+        raise NotImplementedError
+
+    def buscar_leitores(self, queryset, termo):
+        raise NotImplementedError
+
+    def buscar_emprestimos(self, queryset, termo):
+        # Busca livros e leitores separadamente (cada um pelo seu índice) e filtra
+        # os empréstimos por chave estrangeira, em vez de cruzar as três tabelas.
+        # Livros excluídos entram: o histórico deles continua consultável
+        from .models import Livro, Leitor
+        livros = self.buscar_livros(Livro.todos.all(), termo).values('id')
+        leitores = self.buscar_leitores(Leitor.objects.all(), termo).values('id')
+        return queryset.filter(Q(livro_id__in=livros) | Q(leitor_id__in=leitores))
+
+
+class IcontainsBusca(BuscaBase):
+    """Comportamento original ('LIKE %termo%'), sem índice. Serve para qualquer banco."""
+
+    def buscar_livros(self, queryset, termo):
+        return queryset.filter(
+            Q(titulo__icontains=termo) | Q(autor__icontains=termo) | Q(isbn__icontains=termo)
+        ).annotate(relevancia=Value(0.0, output_field=FloatField()))
+
+    def buscar_leitores(self, queryset, termo):
+        return queryset.filter(
+            Q(nome__icontains=termo) | Q(matricula__icontains=termo) | Q(turma__icontains=termo)
+        ).annotate(relevancia=Value(0.0, output_field=FloatField()))
+
+
+class PostgresBusca(BuscaBase):
+    """
+    tsvector com a configuração 'pt_unaccent' (stemming português + unaccent),
+    então "historia" encontra "Histórias". Cada palavra é buscada como prefixo.
+    """
+
+    CONFIG = 'pt_unaccent'
+    # As expressões precisam ser idênticas às dos índices para o GIN ser usado
+    VETOR_LIVRO = (
+        "to_tsvector('pt_unaccent'::regconfig, coalesce(\"acervo_livro\".\"titulo\", '') || ' ' || "
+        "coalesce(\"acervo_livro\".\"autor\", '') || ' ' || coalesce(\"acervo_livro\".\"isbn\", ''))"
+    )
+    VETOR_LEITOR = (
+        "to_tsvector('pt_unaccent'::regconfig, coalesce(\"acervo_leitor\".\"nome\", '') || ' ' || "
+        "coalesce(\"acervo_leitor\".\"matricula\", '') || ' ' || coalesce(\"acervo_leitor\".\"turma\", ''))"
+    )
+
+    def instalar(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+            cursor.execute("""
+                DO $$
+                BEGIN
+                    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'pt_unaccent') THEN
+                        CREATE TEXT SEARCH CONFIGURATION pt_unaccent (COPY = portuguese);
+                        ALTER TEXT SEARCH CONFIGURATION pt_unaccent
+                            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem;
+                    END IF;
+                END
+                $$;
+            """)
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS acervo_livro_busca_gin ON acervo_livro USING gin (({self.VETOR_LIVRO}))"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS acervo_leitor_busca_gin ON acervo_leitor USING gin (({self.VETOR_LEITOR}))"
+            )
+
+    def desinstalar(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP INDEX IF EXISTS acervo_livro_busca_gin")
+            cursor.execute("DROP INDEX IF EXISTS acervo_leitor_busca_gin")
+            cursor.execute("DROP TEXT SEARCH CONFIGURATION IF EXISTS pt_unaccent")
+
+    def _consulta(self, termo):
+        return ' & '.join(f'{t}:*' for t in tokens(termo))
+
+    def _buscar(self, queryset, vetor, termo):
+        consulta = self._consulta(termo)
+        if not consulta:
+            return queryset.none()
+        tsquery = "to_tsquery('pt_unaccent'::regconfig, %s)"
+        return queryset.filter(
+            RawSQL(f"{vetor} @@ {tsquery}", [consulta], output_field=BooleanField())
+        ).annotate(
+            relevancia=RawSQL(f"ts_rank({vetor}, {tsquery})", [consulta], output_field=FloatField())
+        )
+
+    def buscar_livros(self, queryset, termo):
+        return self._buscar(queryset, self.VETOR_LIVRO, termo)
+
+    def buscar_leitores(self, queryset, termo):
+        return self._buscar(queryset, self.VETOR_LEITOR, termo)
+
+
+class SqliteFTS5Busca(BuscaBase):
+    """
+    Tabelas FTS5 de conteúdo externo, mantidas por triggers. O tokenizer
+    'unicode61 remove_diacritics 2' ignora acentos; o FTS5 não tem stemmer
+    português, então cada palavra é buscada como prefixo ("histor" -> "Histórias").
+    Os índices de prefixo (PREFIXOS) atendem direto as buscas de 2 a 4 letras
+    do autocomplete, sem varrer o vocabulário.
+    """
+
+    PREFIXOS = '2 3 4'
+
+    TABELAS = {
+        'acervo_livro': ('titulo', 'autor', 'isbn'),
+        'acervo_leitor': ('nome', 'matricula', 'turma'),
+    }
+
+    def _remover(self, cursor, fts):
+        for sufixo in ('ai', 'ad', 'au'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {fts}_{sufixo}")
+        cursor.execute(f"DROP TABLE IF EXISTS {fts}")
+
+    def instalar(self, connection):
+        with connection.cursor() as cursor:
+            for tabela, colunas in self.TABELAS.items():
+                fts = f'{tabela}_fts'
+                lista = ', '.join(colunas)
+                novos = ', '.join(f'new.{c}' for c in colunas)
+                antigos = ', '.join(f'old.{c}' for c in colunas)
+                cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = %s", [fts])
+                existente = cursor.fetchone()
+                if existente and 'prefix=' not in existente[0]:
+                    # Tabela criada antes dos índices de prefixo: recria (e reconstrói abaixo)
+                    self._remover(cursor, fts)
+                cursor.execute(
+                    "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                    [f'{fts}_%'],
+                )
+                triggers_ok = cursor.fetchone()[0] == 3
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                    f"{lista}, content='{tabela}', content_rowid='id', "
+                    f"tokenize='unicode61 remove_diacritics 2', prefix='{self.PREFIXOS}')"
+                )
+                cursor.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tabela} BEGIN "
+                    f"INSERT INTO {fts}(rowid, {lista}) VALUES (new.id, {novos}); END"
+                )
+                cursor.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tabela} BEGIN "
+                    f"INSERT INTO {fts}({fts}, rowid, {lista}) VALUES ('delete', old.id, {antigos}); END"
+                )
+                cursor.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {lista} ON {tabela} BEGIN "
+                    f"INSERT INTO {fts}({fts}, rowid, {lista}) VALUES ('delete', old.id, {antigos}); "
+                    f"INSERT INTO {fts}(rowid, {lista}) VALUES (new.id, {novos}); END"
+                )
+                # O SQLite recria a tabela em várias migrações (e os triggers somem
+                # junto); nesse caso o índice pode estar defasado e é reconstruído
+                if not triggers_ok:
+                    cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+    def desinstalar(self, connection):
+        with connection.cursor() as cursor:
+            for tabela in self.TABELAS:
+                self._remover(cursor, f'{tabela}_fts')
+
+    def _consulta(self, termo):
+        return ' '.join(f'"{t}"*' for t in tokens(termo))
+
+    def _buscar(self, queryset, tabela, termo):
+        consulta = self._consulta(termo)
+        if not consulta:
+            return queryset.none()
+        fts = f'{tabela}_fts'
+        return queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s", [consulta])
+        ).annotate(
+            # 'rank' é o bm25 do FTS5 (menor = melhor); invertido para seguir a convenção
+            relevancia=RawSQL(
+                f"SELECT -rank FROM {fts} WHERE {fts} MATCH %s AND rowid = \"{tabela}\".\"id\"",
+                [consulta],
+                output_field=FloatField(),
+            )
+        )
+
+    def buscar_livros(self, queryset, termo):
+        return self._buscar(queryset, 'acervo_livro', termo)
+
+    def buscar_leitores(self, queryset, termo):
+        return self._buscar(queryset, 'acervo_leitor', termo)
+
+
+@lru_cache(maxsize=None)
+def _carregar(caminho):
+    return import_string(caminho)()
+
+
+def get_backend(using=DEFAULT_DB_ALIAS):
+    caminho = getattr(settings, 'ACERVO_BUSCA_BACKEND', None)
+    if not caminho:
+        vendor = connections[using].vendor
+        caminho = BACKENDS_POR_BANCO.get(vendor, 'acervo.busca.IcontainsBusca')
+    return _carregar(caminho)
+
+
+def buscar_livros(queryset, termo):
+    return get_backend(queryset.db).buscar_livros(queryset, termo)
+
+
+def buscar_leitores(queryset, termo):
+    return get_backend(queryset.db).buscar_leitores(queryset, termo)
+
+
+def buscar_emprestimos(queryset, termo):
+    return get_backend(queryset.db).buscar_emprestimos(queryset, termo)
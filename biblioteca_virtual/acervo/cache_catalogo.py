@@ -0,0 +1,169 @@
+# acervo/cache_catalogo.py
+#
+# Cache das páginas públicas. A 'lista_livros' vista por visitantes anônimos é
+# guardada inteira no cache (uma entrada por query string) e servida sem tocar
+# no banco; qualquer alteração no acervo troca a "versão" do catálogo, o que
+# invalida de uma vez todas as entradas. As páginas estáticas (início, sobre,
+# contato) respondem com ETag/Last-Modified para o navegador revalidar com 304.
+
+import hashlib
+import os
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache, wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+CHAVE_VERSAO = 'acervo:catalogo:versao'
+
+
+def _timeout():
+    return getattr(settings, 'ACERVO_CATALOGO_CACHE_TIMEOUT', 300)
+
+
+def _nova_versao():
+    # Nunca repete uma versão antiga, mesmo que a chave seja despejada do cache
+    return time.time_ns()
+
+
+def versao(chave=CHAVE_VERSAO):
+    versao_atual = cache.get(chave)
+    if versao_atual is None:
+        cache.add(chave, _nova_versao(), None)
+        versao_atual = cache.get(chave) or _nova_versao()
+    return versao_atual
+
+
+async def aversao(chave=CHAVE_VERSAO):
+    versao_atual = await cache.aget(chave)
+    if versao_atual is None:
+        await cache.aadd(chave, _nova_versao(), None)
+        versao_atual = await cache.aget(chave) or _nova_versao()
+    return versao_atual
+
+
+def invalidar(chave=CHAVE_VERSAO):
+    """Descarta todas as entradas ligadas a 'chave' (após o commit da transação atual)."""
+    transaction.on_commit(lambda: cache.set(chave, _nova_versao(), None))
+
+
+def _chave(request, versao_atual):
+    # Mesmos parâmetros em outra ordem devem cair na mesma entrada
+    params = sorted((nome, valor) for nome, valores in request.GET.lists() for valor in valores)
+    resumo = hashlib.sha1(repr(params).encode()).hexdigest()
+    return f'acervo:catalogo:{versao_atual}:{request.path}:{resumo}'
+
+
+def _tem_mensagens(request):
+    """
+    Se há mensagens (ex.: "livro excluído") para esta resposta, em cookie ou
+    na sessão. len() não as consome: a página ainda as exibe.
+    """
+    return len(get_messages(request)) > 0
+
+
+def _pode_usar_cache(request):
+    return request.method in ('GET', 'HEAD')
+
+
+def _guardar(request, response):
+    """Conteúdo a guardar, ou None se a resposta não deve ir para o cache."""
+    if response.status_code != 200 or response.streaming:
+        return None
+    # Uma página com as mensagens de um visitante não pode ser servida a outro
+    if _tem_mensagens(request):
+        return None
+    etag = '"%s"' % hashlib.md5(response.content).hexdigest()
+    return (response.content, response['Content-Type'], etag)
+
+
+def _resposta(request, guardado):
+    conteudo, content_type, etag = guardado
+    response = HttpResponse(conteudo, content_type=content_type)
+    response['ETag'] = etag
+    # A mesma URL tem outro conteúdo para quem está logado
+    patch_vary_headers(response, ['Cookie'])
+    return get_conditional_response(request, etag=etag, response=response)
+
+
+def cache_catalogo(view):
+    """
+    Guarda a resposta da view para visitantes anônimos, por caminho + query
+    string. Usuários logados veem botões e dados próprios e sempre passam direto.
+    Funciona com views síncronas e async.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper_async(request, *args, **kwargs):
+            # Sem cookie de sessão, 'auser()' não faz nenhuma consulta. Com ele,
+            # carrega a sessão, e as mensagens guardadas nela são lidas sem outra
+            if not _pode_usar_cache(request) or (await request.auser()).is_authenticated or _tem_mensagens(request):
+                return await view(request, *args, **kwargs)
+
+            chave = _chave(request, await aversao())
+            guardado = await cache.aget(chave)
+            if guardado is None:
+                response = await view(request, *args, **kwargs)
+                guardado = _guardar(request, response)
+                if guardado is None:
+                    return response
+                await cache.aset(chave, guardado, _timeout())
+            return _resposta(request, guardado)
+        return wrapper_async
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        # Sem cookie de sessão, 'is_authenticated' não faz nenhuma consulta
+        if not _pode_usar_cache(request) or request.user.is_authenticated or _tem_mensagens(request):
+            return view(request, *args, **kwargs)
+
+        chave = _chave(request, versao())
+        guardado = cache.get(chave)
+        if guardado is None:
+            response = view(request, *args, **kwargs)
+            guardado = _guardar(request, response)
+            if guardado is None:
+                return response
+            cache.set(chave, guardado, _timeout())
+        return _resposta(request, guardado)
+    return wrapper
+
+
+@lru_cache(maxsize=None)
+def _modificacao_templates(nomes):
+    """Data da última alteração entre os arquivos de template (lida uma vez por processo)."""
+    instantes = [os.path.getmtime(get_template(nome).origin.name) for nome in nomes]
+    return datetime.fromtimestamp(max(instantes), tz=dt_timezone.utc).replace(microsecond=0)
+
+
+def pagina_estatica(*templates):
+    """
+    ETag/Last-Modified para páginas que só dependem dos próprios templates.
+    O ano entra no ETag porque o rodapé mostra '{% now "Y" %}'.
+    """
+    def ultima_modificacao(request, *args, **kwargs):
+        return _modificacao_templates(templates)
+
+    def etag(request, *args, **kwargs):
+        return f'{ultima_modificacao(request).timestamp():.0f}-{timezone.localdate().year}'
+
+    def decorator(view):
+        view_condicional = condition(etag_func=etag, last_modified_func=ultima_modificacao)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = view_condicional(request, *args, **kwargs)
+            # Guarda, mas sempre revalida (a revalidação custa um 304 sem corpo)
+            patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
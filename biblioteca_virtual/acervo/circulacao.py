@@ -0,0 +1,224 @@
+# acervo/circulacao.py
+#
+# Empréstimo e devolução. Cada operação é uma transação e a contagem de cópias
+# é alterada por um UPDATE condicional no próprio banco, então dois
+# bibliotecários emprestando a última cópia ao mesmo tempo não conseguem
+# ambos: só um UPDATE encontra 'copias_disponiveis > 0'.
+#
+# Os contadores do leitor (abertos/atrasados) e do livro (total de empréstimos,
+# último empréstimo) são ajustados nos mesmos caminhos, na mesma transação.
+# O 'status' gravado no empréstimo também: nasce 'aberto' (ou já 'atrasado',
+# com data prevista no passado) e vira 'devolvido' na devolução. Os UPDATEs
+# não passam pelo auto_now: 'atualizado_em' (usado pela API) é gravado junto.
+#
+# As datas (empréstimo, devolução, vencimento) são as do fuso do projeto
+# (timezone.localdate), as mesmas usadas pelo status e pela virada do dia.
+#
+# Só o empréstimo consulta Livro.objects (um livro excluído não é emprestado);
+# as outras alterações de cópias usam Livro.todos, que também vê os excluídos.
+
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Least
+from django.utils import timezone
+
+from .models import Livro, Emprestimo
+from . import estatisticas, sinais
+
+
+class ErroCirculacao(Exception):
+    """Erro de regra de negócio no empréstimo/devolução (mensagem pronta para o usuário)."""
+
+
+class SemCopiasDisponiveis(ErroCirculacao):
+    pass
+
+
+class EmprestimoJaDevolvido(ErroCirculacao):
+    pass
+
+
+@transaction.atomic
+def emprestar(livro, leitor, data_devolucao_prevista, bibliotecario):
+    """Retira uma cópia de 'livro' e registra o empréstimo. Retorna o Emprestimo criado."""
+    agora = timezone.now()
+    retiradas = Livro.objects.filter(pk=livro.pk, copias_disponiveis__gt=0).update(
+        copias_disponiveis=F('copias_disponiveis') - 1,
+        total_emprestimos=F('total_emprestimos') + 1,
+        ultimo_emprestimo=timezone.localdate(agora),
+        atualizado_em=agora,
+    )
+    if not retiradas:
+        raise SemCopiasDisponiveis(f'Não há cópias disponíveis do livro "{livro.titulo}" no momento.')
+
+    emprestimo = Emprestimo(
+        livro=livro,
+        leitor=leitor,
+        data_devolucao_prevista=data_devolucao_prevista,
+        bibliotecario=bibliotecario,
+    )
+    emprestimo.status = emprestimo.calcular_status()
+    emprestimo.save()
+    estatisticas.emprestimo_alterado(estatisticas.SEM_EMPRESTIMO, estatisticas.situacao(emprestimo))
+    estatisticas.leitor_alterado(leitor.pk, estatisticas.SEM_EMPRESTIMO, estatisticas.situacao(emprestimo))
+    sinais.copias_alteradas.send(sender=Livro, livro_ids=[livro.pk])
+    return emprestimo
+
+
+@transaction.atomic
+def devolver(emprestimo):
+    """Marca o empréstimo como devolvido e devolve a cópia à estante."""
+    antes = estatisticas.situacao(emprestimo)
+    agora = timezone.now()
+    hoje = timezone.localdate(agora)
+    # Só um dos pedidos concorrentes de devolução encontra a data ainda vazia
+    devolvidos = Emprestimo.objects.filter(pk=emprestimo.pk, data_devolucao_real__isnull=True).update(
+        data_devolucao_real=hoje, status=Emprestimo.DEVOLVIDO, atualizado_em=agora
+    )
+    if not devolvidos:
+        raise EmprestimoJaDevolvido(f'O livro "{emprestimo.livro.titulo}" já havia sido devolvido.')
+    emprestimo.data_devolucao_real = hoje
+    emprestimo.status = Emprestimo.DEVOLVIDO
+    emprestimo.atualizado_em = agora
+
+    # Aumenta as cópias disponíveis, garantindo que não ultrapasse o total
+    # Livro.todos: a cópia volta mesmo se o livro foi excluído com o empréstimo em aberto
+    Livro.todos.filter(pk=emprestimo.livro_id, copias_disponiveis__lt=F('numero_copias')).update(
+        copias_disponiveis=F('copias_disponiveis') + 1, atualizado_em=agora
+    )
+    sinais.copias_alteradas.send(sender=Livro, livro_ids=[emprestimo.livro_id])
+    estatisticas.emprestimo_alterado(antes, estatisticas.situacao(emprestimo))
+    estatisticas.leitor_alterado(emprestimo.leitor_id, antes, estatisticas.situacao(emprestimo))
+    return emprestimo
+
+
+def _resultado(descricao, ok, mensagem):
+    return {'item': descricao, 'ok': ok, 'mensagem': mensagem}
+
+
+@transaction.atomic
+def emprestar_em_lote(itens, data_devolucao_prevista, bibliotecario):
+    """
+    Registra vários empréstimos numa única transação. 'itens' é uma lista de
+    pares (livro, leitor); o retorno traz um resultado por item, na mesma ordem.
+    Pedidos além das cópias disponíveis falham individualmente sem desfazer os demais.
+    """
+    livro_ids = {livro.pk for livro, _ in itens}
+    # Trava as linhas dos livros envolvidos até o fim da transação
+    disponiveis = dict(
+        Livro.objects.select_for_update().filter(pk__in=livro_ids).values_list('id', 'copias_disponiveis')
+    )
+    retiradas = Counter()
+    novos = []
+    agora = timezone.now()
+    hoje = timezone.localdate(agora)
+    status = Emprestimo.ATRASADO if data_devolucao_prevista < hoje else Emprestimo.ABERTO
+    resultados = []
+    for livro, leitor in itens:
+        descricao = f'{livro.titulo} → {leitor.nome}'
+        if not leitor.ativo:
+            resultados.append(_resultado(descricao, False, 'Leitor inativo.'))
+        elif disponiveis.get(livro.pk, 0) - retiradas[livro.pk] <= 0:
+            resultados.append(_resultado(descricao, False, 'Não há cópias disponíveis.'))
+        else:
+            retiradas[livro.pk] += 1
+            novos.append(Emprestimo(
+                livro=livro,
+                leitor=leitor,
+                data_devolucao_prevista=data_devolucao_prevista,
+                bibliotecario=bibliotecario,
+                status=status,
+            ))
+            resultados.append(_resultado(descricao, True, 'Empréstimo registrado.'))
+
+    if novos:
+        # Um único UPDATE para todos os livros; o CHECK (copias_disponiveis >= 0)
+        # do campo positivo desfaz tudo se outra transação tiver levado as cópias
+        Livro.todos.filter(pk__in=retiradas).update(
+            copias_disponiveis=F('copias_disponiveis') - estatisticas.valor_por_id(retiradas),
+            total_emprestimos=F('total_emprestimos') + estatisticas.valor_por_id(retiradas),
+            ultimo_emprestimo=hoje,
+            atualizado_em=agora,
+        )
+        Emprestimo.objects.bulk_create(novos)
+        sinais.copias_alteradas.send(sender=Livro, livro_ids=list(retiradas))
+        atrasado = int(status == Emprestimo.ATRASADO)
+        estatisticas.ajustar(
+            emprestimos_abertos=len(novos),
+            emprestimos_atrasados=atrasado * len(novos),
+            versao_emprestimos=1,
+        )
+        por_leitor = Counter(e.leitor_id for e in novos)
+        estatisticas.leitores_alterados({pk: (n, atrasado * n) for pk, n in por_leitor.items()})
+    return resultados
+
+
+@transaction.atomic
+def devolver_em_lote(emprestimo_ids=(), isbns=()):
+    """
+    Devolve vários empréstimos de uma vez, pelos ids ou pelos ISBNs lidos no
+    leitor de código de barras (cada leitura de um ISBN devolve o empréstimo
+    aberto mais antigo daquele livro). Retorna um resultado por item.
+    """
+    resultados = []
+    selecionados = {}
+
+    abertos = (
+        Emprestimo.objects.select_for_update()
+        .select_related('livro')
+        .filter(data_devolucao_real__isnull=True)
+        .order_by('data_emprestimo', 'id')
+    )
+    if emprestimo_ids:
+        por_id = {e.pk: e for e in abertos.filter(pk__in=emprestimo_ids)}
+        for pk in emprestimo_ids:
+            emprestimo = por_id.get(pk)
+            if emprestimo is None or pk in selecionados:
+                resultados.append(_resultado(f'Empréstimo #{pk}', False, 'Empréstimo inexistente ou já devolvido.'))
+            else:
+                selecionados[pk] = emprestimo
+                resultados.append(_resultado(f'#{pk} {emprestimo.livro.titulo}', True, 'Devolvido.'))
+    if isbns:
+        fila = {}
+        for emprestimo in abertos.filter(livro__isbn__in=set(isbns)):
+            fila.setdefault(emprestimo.livro.isbn, []).append(emprestimo)
+        for isbn in isbns:
+            pendentes = [e for e in fila.get(isbn, []) if e.pk not in selecionados]
+            if not pendentes:
+                resultados.append(_resultado(f'ISBN {isbn}', False, 'Nenhum empréstimo aberto para este ISBN.'))
+            else:
+                emprestimo = pendentes[0]
+                selecionados[emprestimo.pk] = emprestimo
+                resultados.append(_resultado(f'ISBN {isbn} {emprestimo.livro.titulo}', True, 'Devolvido.'))
+
+    if selecionados:
+        agora = timezone.now()
+        hoje = timezone.localdate(agora)
+        devolvidos = Emprestimo.objects.filter(
+            pk__in=selecionados, data_devolucao_real__isnull=True
+        ).update(data_devolucao_real=hoje, status=Emprestimo.DEVOLVIDO, atualizado_em=agora)
+        if devolvidos != len(selecionados):
+            # Outra devolução concorrente passou na frente: desfaz o lote inteiro
+            raise ErroCirculacao('Alguns empréstimos foram devolvidos por outro usuário. Tente novamente.')
+
+        devolucoes = Counter(e.livro_id for e in selecionados.values())
+        Livro.todos.filter(pk__in=devolucoes).update(
+            copias_disponiveis=Least(
+                F('numero_copias'), F('copias_disponiveis') + estatisticas.valor_por_id(devolucoes)
+            ),
+            atualizado_em=agora,
+        )
+        sinais.copias_alteradas.send(sender=Livro, livro_ids=list(devolucoes))
+        estatisticas.ajustar(
+            emprestimos_abertos=-len(selecionados),
+            emprestimos_atrasados=-sum(1 for e in selecionados.values() if e.status == Emprestimo.ATRASADO),
+            versao_emprestimos=1,
+        )
+        por_leitor = {}
+        for emprestimo in selecionados.values():
+            abertos, atrasados = por_leitor.get(emprestimo.leitor_id, (0, 0))
+            por_leitor[emprestimo.leitor_id] = (abertos - 1, atrasados - int(emprestimo.status == Emprestimo.ATRASADO))
+        estatisticas.leitores_alterados(por_leitor)
+    return resultados
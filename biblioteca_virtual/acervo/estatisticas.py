@@ -0,0 +1,322 @@
+# acervo/estatisticas.py
+#
+# Contadores do dashboard. Em vez de cinco COUNTs a cada acesso, os números
+# ficam numa linha de EstatisticaAcervo, ajustada com UPDATE ... SET x = x + n
+# pelos pontos do código que os alteram, e o painel inteiro fica em cache.
+# A contagem de atrasados é recalculada uma vez por dia (na primeira leitura
+# ou no job noturno 'manage.py varrer_atrasados'), junto com a passagem dos
+# empréstimos vencidos para o status 'atrasado'.
+#
+# O mesmo vale para os contadores de cada leitor (empréstimos abertos e
+# atrasados) e de cada livro (total de empréstimos e data do último), que
+# ficam nas próprias linhas de Leitor e Livro.
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q, Count, Subquery, OuterRef, Func, Case, When, Value, IntegerField
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import EstatisticaAcervo, Livro, Leitor, Emprestimo, EmprestimoArquivado
+
+CHAVE_CACHE = 'acervo:dashboard'
+PK = 1
+
+# Situação de um empréstimo para os contadores: (aberto, atrasado)
+SEM_EMPRESTIMO = (0, 0)
+
+
+def _hoje():
+    return timezone.localdate()
+
+
+def _invalidar_cache():
+    transaction.on_commit(lambda: cache.delete(CHAVE_CACHE))
+
+
+def ajustar(**deltas):
+    """Soma 'deltas' aos contadores num único UPDATE atômico, ex.: ajustar(total_livros=1)."""
+    deltas = {campo: F(campo) + valor for campo, valor in deltas.items() if valor}
+    if not deltas:
+        return
+    # Se a linha ainda não existir, nada é feito: a primeira leitura recalcula tudo
+    EstatisticaAcervo.objects.filter(pk=PK).update(**deltas)
+    _invalidar_cache()
+
+
+def situacao(emprestimo):
+    """(aberto, atrasado) de um empréstimo, para comparar antes/depois de uma alteração."""
+    if emprestimo is None or emprestimo.data_devolucao_real is not None:
+        return SEM_EMPRESTIMO
+    # O status gravado, e não a data: um empréstimo que venceu depois da última
+    # virada do dia ainda não foi contado como atrasado (ver marcar_atrasados)
+    return (1, int(emprestimo.status == Emprestimo.ATRASADO))
+
+
+def emprestimo_alterado(antes, depois):
+    ajustar(
+        emprestimos_abertos=depois[0] - antes[0],
+        emprestimos_atrasados=depois[1] - antes[1],
+        versao_emprestimos=1,
+    )
+
+
+def valor_por_id(valores):
+    """CASE id WHEN x THEN n ... END, para aplicar valores diferentes por linha num só UPDATE."""
+    return Case(
+        *[When(pk=pk, then=Value(valor)) for pk, valor in valores.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def leitores_alterados(deltas):
+    """
+    Ajusta os contadores dos leitores num único UPDATE. 'deltas' mapeia
+    leitor_id -> (abertos, atrasados) a somar, como em 'situacao'.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    Leitor.objects.filter(pk__in=deltas).update(
+        emprestimos_abertos=F('emprestimos_abertos') + valor_por_id({pk: d[0] for pk, d in deltas.items()}),
+        emprestimos_atrasados=F('emprestimos_atrasados') + valor_por_id({pk: d[1] for pk, d in deltas.items()}),
+    )
+
+
+def leitor_alterado(leitor_id, antes, depois):
+    leitores_alterados({leitor_id: (depois[0] - antes[0], depois[1] - antes[1])})
+
+
+def emprestimos_removidos(queryset):
+    """Desconta os empréstimos de 'queryset' de todos os contadores (chamar antes de apagá-los)."""
+    # Pelo status gravado, como em 'situacao'
+    atrasado = Q(status=Emprestimo.ATRASADO)
+    abertos = queryset.filter(data_devolucao_real__isnull=True)
+    totais = abertos.aggregate(abertos=Count('id'), atrasados=Count('id', filter=atrasado))
+    ajustar(
+        emprestimos_abertos=-totais['abertos'],
+        emprestimos_atrasados=-totais['atrasados'],
+        versao_emprestimos=1,
+    )
+    por_leitor = abertos.order_by().values('leitor').annotate(abertos=Count('id'), atrasados=Count('id', filter=atrasado))
+    leitores_alterados({l['leitor']: (-l['abertos'], -l['atrasados']) for l in por_leitor})
+    por_livro = dict(queryset.order_by().values('livro').annotate(total=Count('id')).values_list('livro', 'total'))
+    if por_livro:
+        Livro.todos.filter(pk__in=por_livro).update(
+            total_emprestimos=F('total_emprestimos') - valor_por_id(por_livro)
+        )
+
+
+def versao_emprestimos():
+    """Número que muda sempre que algum empréstimo é criado, alterado ou apagado."""
+    versao = EstatisticaAcervo.objects.filter(pk=PK).values_list('versao_emprestimos', flat=True).first()
+    if versao is None:
+        versao = recalcular().versao_emprestimos
+    return versao
+
+
+def _contagem(queryset):
+    """Subquery com o COUNT de 'queryset' (sem GROUP BY), para usar dentro de um UPDATE."""
+    return Subquery(
+        queryset.order_by().annotate(total=Func(F('id'), function='COUNT')).values('total'),
+        output_field=IntegerField(),
+    )
+
+
+def _atualizar_atrasados_leitores(leitores, hoje):
+    abertos = Emprestimo.objects.filter(leitor=OuterRef('pk'), data_devolucao_real__isnull=True)
+    leitores.update(emprestimos_atrasados=_contagem(abertos.filter(data_devolucao_prevista__lt=hoje)))
+
+
+def recalcular_agregados(leitores=None, livros=None):
+    """
+    Recalcula do zero os contadores por leitor e por livro (e as cópias
+    disponíveis), cada um num único UPDATE com subconsultas. Sem argumentos
+    recalcula todos; com listas de ids recalcula só essas linhas.
+    """
+    hoje = _hoje()
+    leitores_qs = Leitor.objects.all() if leitores is None else Leitor.objects.filter(pk__in=leitores)
+    abertos = Emprestimo.objects.filter(leitor=OuterRef('pk'), data_devolucao_real__isnull=True)
+    leitores_qs.update(
+        emprestimos_abertos=_contagem(abertos),
+        emprestimos_atrasados=_contagem(abertos.filter(data_devolucao_prevista__lt=hoje)),
+    )
+    # Também os excluídos: ainda podem ter empréstimos em aberto (ver acervo/exclusao.py)
+    livros_qs = Livro.todos.all() if livros is None else Livro.todos.filter(pk__in=livros)
+    # O histórico antigo fica em EmprestimoArquivado (ver acervo/historico.py) e também conta
+    ultimos = []
+    totais = []
+    for modelo in (Emprestimo, EmprestimoArquivado):
+        do_livro = modelo.objects.filter(livro=OuterRef('pk'))
+        totais.append(_contagem(do_livro))
+        ultimos.append(Subquery(do_livro.order_by('-data_emprestimo').values('data_emprestimo')[:1]))
+    # Cada empréstimo em aberto é uma cópia fora da estante
+    copias = Greatest(F('numero_copias') - _contagem(Emprestimo.objects.filter(
+        livro=OuterRef('pk'), data_devolucao_real__isnull=True
+    )), 0)
+    livros_qs.update(
+        copias_disponiveis=copias,
+        # Só os livros corrigidos aparecem como alterados na API (?changed_since=)
+        atualizado_em=Case(When(copias_disponiveis=copias, then=F('atualizado_em')), default=Value(timezone.now())),
+        total_emprestimos=totais[0] + totais[1],
+        # Greatest dá NULL no SQLite se um dos lados for NULL: o Coalesce cobre o livro só com um deles
+        ultimo_emprestimo=Coalesce(Greatest(*ultimos), *ultimos),
+    )
+
+
+def _contar_atrasados(hoje):
+    return Emprestimo.objects.filter(
+        data_devolucao_real__isnull=True, data_devolucao_prevista__lt=hoje
+    ).count()
+
+
+@transaction.atomic
+def recalcular():
+    """Recalcula todos os contadores do zero (também cria a linha se não existir)."""
+    hoje = _hoje()
+    # O lock da linha faz os ajustes concorrentes esperarem o recálculo terminar
+    estatistica = EstatisticaAcervo.objects.select_for_update().filter(pk=PK).first()
+    if estatistica is None:
+        estatistica = EstatisticaAcervo(pk=PK)
+    estatistica.total_livros = Livro.objects.count()
+    estatistica.emprestimos_abertos = Emprestimo.objects.filter(data_devolucao_real__isnull=True).count()
+    estatistica.emprestimos_atrasados = _contar_atrasados(hoje)
+    estatistica.leitores_ativos = Leitor.objects.filter(ativo=True).count()
+    estatistica.atrasados_em = hoje
+    marcar_atrasados(hoje)
+    _atualizar_atrasados_leitores(Leitor.objects.filter(emprestimos_abertos__gt=0), hoje)
+    # Um recálculo pode refletir alterações feitas por fora destes ajustes
+    estatistica.versao_emprestimos += 1
+    estatistica.save()
+    _invalidar_cache()
+    return estatistica
+
+
+def marcar_atrasados(hoje):
+    """
+    Passa para 'atrasado' os empréstimos abertos vencidos antes de 'hoje', num
+    único UPDATE (pelo índice parcial dos abertos por data prevista). Retorna
+    quantos mudaram.
+    """
+    return Emprestimo.objects.filter(
+        data_devolucao_real__isnull=True, data_devolucao_prevista__lt=hoje, status=Emprestimo.ABERTO
+    ).update(status=Emprestimo.ATRASADO, atualizado_em=timezone.now())
+
+
+@transaction.atomic
+def _virar_dia(hoje):
+    """
+    Recalcula os atrasados uma vez por dia, num único UPDATE condicional.
+    Retorna quantos empréstimos passaram a 'atrasado' (None se o dia já tinha virado).
+    """
+    atrasados = Emprestimo.objects.filter(data_devolucao_real__isnull=True, data_devolucao_prevista__lt=hoje)
+    virou = EstatisticaAcervo.objects.filter(pk=PK).exclude(atrasados_em=hoje).update(
+        emprestimos_atrasados=_contagem(atrasados),
+        atrasados_em=hoje,
+        # Os status mudam abaixo: relatórios gerados antes da virada deixam de valer
+        versao_emprestimos=F('versao_emprestimos') + 1,
+    )
+    if not virou:
+        return None
+    # Só quem vence o UPDATE acima atualiza os empréstimos e os leitores (apenas os com empréstimos abertos)
+    marcados = marcar_atrasados(hoje)
+    _atualizar_atrasados_leitores(Leitor.objects.filter(emprestimos_abertos__gt=0), hoje)
+    return marcados
+
+
+def varrer_atrasados(hoje=None):
+    """
+    Virada do dia do job noturno. Retorna quantos empréstimos passaram a
+    'atrasado' (0 se o dia já tinha virado numa leitura do painel).
+    """
+    hoje = hoje or _hoje()
+    if not EstatisticaAcervo.objects.filter(pk=PK).exists():
+        # Sem a linha dos contadores, o recálculo completo também marca os atrasados
+        with transaction.atomic():
+            marcados = marcar_atrasados(hoje)
+            recalcular()
+        return marcados
+    marcados = _virar_dia(hoje) or 0
+    _invalidar_cache()
+    return marcados
+
+
+def _ultimos_emprestimos():
+    return Emprestimo.objects.order_by('-data_emprestimo', '-id').values_list(
+        'livro__titulo', 'leitor__nome', 'data_emprestimo'
+    )[:5]
+
+
+def _timeout_painel():
+    return getattr(settings, 'ACERVO_DASHBOARD_CACHE_TIMEOUT', 60)
+
+
+def _dados_painel(hoje, estatistica, ultimos):
+    return {
+        'dia': hoje,
+        'total_livros': estatistica.total_livros,
+        'livros_emprestados': estatistica.emprestimos_abertos,
+        'livros_disponiveis': estatistica.total_livros - estatistica.emprestimos_abertos,
+        'emprestimos_atrasados': estatistica.emprestimos_atrasados,
+        'total_leitores_ativos': estatistica.leitores_ativos,
+        'ultimos_emprestimos': [
+            {
+                'livro': {'titulo': titulo},
+                'leitor': {'nome': nome},
+                'data_emprestimo': data_emprestimo,
+            }
+            for titulo, nome, data_emprestimo in ultimos
+        ],
+    }
+
+
+def painel():
+    """Dados do dashboard. No caso comum é uma única leitura do cache."""
+    hoje = _hoje()
+    dados = cache.get(CHAVE_CACHE)
+    if dados is not None and dados['dia'] == hoje:
+        return dados
+
+    estatistica = EstatisticaAcervo.objects.filter(pk=PK).first()
+    if estatistica is None:
+        estatistica = recalcular()
+    elif estatistica.atrasados_em != hoje:
+        _virar_dia(hoje)
+        estatistica.refresh_from_db()
+
+    dados = _dados_painel(hoje, estatistica, list(_ultimos_emprestimos()))
+    cache.set(CHAVE_CACHE, dados, _timeout_painel())
+    return dados
+
+
+async def apainel():
+    """
+    Versão assíncrona de painel(), para a view async do dashboard. As duas
+    leituras independentes (contadores e últimos empréstimos) são disparadas
+    juntas; com os backends síncronos do Django elas ainda passam pela mesma
+    conexão, uma após a outra, mas sem prender o event loop. Recalcular ou
+    virar o dia (raro, com escrita) continua síncrono.
+    """
+    hoje = _hoje()
+    dados = await cache.aget(CHAVE_CACHE)
+    if dados is not None and dados['dia'] == hoje:
+        return dados
+
+    async def ultimos():
+        return [linha async for linha in _ultimos_emprestimos()]
+
+    estatistica, linhas = await asyncio.gather(EstatisticaAcervo.objects.filter(pk=PK).afirst(), ultimos())
+    if estatistica is None:
+        estatistica = await sync_to_async(recalcular)()
+    elif estatistica.atrasados_em != hoje:
+        await sync_to_async(_virar_dia)(hoje)
+        await estatistica.arefresh_from_db()
+
+    dados = _dados_painel(hoje, estatistica, linhas)
+    await cache.aset(CHAVE_CACHE, dados, _timeout_painel())
+    return dados
@@ -0,0 +1,101 @@
+# acervo/exclusao.py
+#
+# Exclusão de livros em duas etapas.
+#
+# - excluir() só grava 'excluido_em' (um UPDATE): o livro sai do catálogo, da
+#   busca, do autocomplete e das contagens do painel, porque o gerenciador
+#   padrão (Livro.objects) o ignora. Os empréstimos continuam no histórico e
+#   a resposta não depende de quantos são. restaurar() desfaz.
+# - A remoção física fica para 'manage.py purgar_livros', fora do horário de
+#   uso: para os livros excluídos há mais de ACERVO_EXCLUSAO_DIAS dias, apaga
+#   os empréstimos (tabela e arquivo) em lotes, cada lote na sua transação, e
+#   por último o livro. Nenhuma transação trava o histórico inteiro.
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Livro, Emprestimo, EmprestimoArquivado
+from . import cache_catalogo, estatisticas
+
+TAMANHO_LOTE = 2000
+
+
+def _dias():
+    return getattr(settings, 'ACERVO_EXCLUSAO_DIAS', 30)
+
+
+def limite_purga(dias=None):
+    """Livros excluídos antes deste instante podem ser removidos de vez."""
+    return timezone.now() - timedelta(days=_dias() if dias is None else dias)
+
+
+@transaction.atomic
+def excluir(livros):
+    """Exclui (logicamente) os livros do queryset. Retorna quantos foram excluídos."""
+    agora = timezone.now()
+    excluidos = livros.filter(excluido_em__isnull=True).update(excluido_em=agora, atualizado_em=agora)
+    if excluidos:
+        estatisticas.ajustar(total_livros=-excluidos)
+        # UPDATE não dispara post_save: o catálogo em cache é avisado aqui
+        cache_catalogo.invalidar()
+    return excluidos
+
+
+@transaction.atomic
+def restaurar(livros):
+    """Devolve ao catálogo os livros excluídos do queryset (de Livro.todos). Retorna quantos."""
+    restaurados = livros.filter(excluido_em__isnull=False).update(excluido_em=None, atualizado_em=timezone.now())
+    if restaurados:
+        estatisticas.ajustar(total_livros=restaurados)
+        cache_catalogo.invalidar()
+    return restaurados
+
+
+@transaction.atomic
+def _apagar_lote(modelo, livro_id, limite, tamanho_lote):
+    """
+    Apaga até 'tamanho_lote' empréstimos do livro. Retorna quantos (None se o
+    livro foi restaurado nesse meio-tempo: aí nada mais é apagado).
+    """
+    # Trava o livro: uma restauração concorrente espera este lote terminar
+    if not Livro.todos.select_for_update().filter(pk=livro_id, excluido_em__lt=limite).values_list('id'):
+        return None
+    ids = list(modelo.objects.filter(livro_id=livro_id).order_by('id').values_list('id', flat=True)[:tamanho_lote])
+    if not ids:
+        return 0
+    lote = modelo.objects.filter(livro_id=livro_id, id__gte=ids[0], id__lte=ids[-1])
+    if modelo is Emprestimo:
+        # Empréstimos ainda abertos saem dos contadores do painel e dos leitores
+        estatisticas.emprestimos_removidos(lote)
+    lote.delete()
+    return len(ids)
+
+
+def purgar(limite, tamanho_lote=TAMANHO_LOTE):
+    """
+    Remove de vez os livros excluídos antes de 'limite', com o histórico.
+    Gera (título, empréstimos apagados) para cada livro removido.
+    """
+    pendentes = list(
+        Livro.todos.filter(excluido_em__lt=limite).order_by('excluido_em', 'id').values_list('id', 'titulo')
+    )
+    for livro_id, titulo in pendentes:
+        apagados = 0
+        restaurado = False
+        for modelo in (Emprestimo, EmprestimoArquivado):
+            while not restaurado:
+                quantidade = _apagar_lote(modelo, livro_id, limite, tamanho_lote)
+                restaurado = quantidade is None
+                if not quantidade:
+                    break
+                apagados += quantidade
+        if restaurado:
+            continue
+        # Sem histórico, a cascata do DELETE não tem mais o que apagar
+        with transaction.atomic():
+            removido, _ = Livro.todos.filter(pk=livro_id, excluido_em__lt=limite).delete()
+        if removido:
+            yield titulo, apagados
@@ -0,0 +1,200 @@
+# acervo/exportacao.py
+#
+# Exportação das listagens em CSV e XLSX. As linhas são lidas do banco em lotes
+# (.iterator(chunk_size=...)) e escritas à medida que chegam, então a memória
+# fica estável seja a exportação de 100 ou de 1.000.000 de linhas.
+#
+# Só o CSV é enviado em streaming (o primeiro byte sai logo). O XLSX é um zip
+# que só fica válido depois de gravado inteiro: a planilha vai para um arquivo
+# temporário e o download começa quando ele termina, então numa exportação XLSX
+# muito grande o cliente espera a gravação toda (e pode passar do timeout do
+# Gunicorn, ver gunicorn.conf.py). Para volumes assim, use o CSV.
+#
+# No modo ASGI (SERVIDOR=asgi) o corpo precisa ser um iterador assíncrono: com um
+# iterador síncrono o Django lê a resposta inteira com list() antes de enviar o
+# primeiro byte. Ver _iterar_em_thread.
+
+import csv
+import tempfile
+from itertools import groupby, islice
+
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse, FileResponse
+from django.utils import timezone
+
+from .models import Emprestimo
+from . import filtros, historico
+
+TAMANHO_LOTE = 2000
+
+# Quantos pedaços do corpo (linhas do CSV, blocos do XLSX) cada ida à thread lê no ASGI
+PARTES_POR_ENVIO = 256
+
+
+class _Eco:
+    """Pseudo-arquivo: o csv.writer 'escreve' e a linha volta pronta para o yield."""
+
+    def write(self, valor):
+        return valor
+
+
+def resposta_csv(nome_arquivo, cabecalho, linhas):
+    escritor = csv.writer(_Eco(), delimiter=';')
+
+    def gerar():
+        # BOM para o Excel abrir com acentos corretos
+        yield '\ufeff'
+        yield escritor.writerow(cabecalho)
+        for linha in linhas:
+            yield escritor.writerow(linha)
+
+    response = StreamingHttpResponse(gerar(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}.csv"'
+    return response
+
+
+def resposta_xlsx(nome_arquivo, cabecalho, linhas):
+    # O openpyxl só é carregado quando alguém exporta XLSX (não no boot do worker)
+    from openpyxl import Workbook
+
+    # Modo write-only: as linhas vão direto para o arquivo temporário, sem montar
+    # a planilha na memória; o arquivo pronto é enviado em blocos pelo FileResponse.
+    # Nada é enviado antes de a planilha estar completa (ver o topo do módulo)
+    planilha = Workbook(write_only=True)
+    aba = planilha.create_sheet(title=nome_arquivo[:31])
+    aba.append(cabecalho)
+    for linha in linhas:
+        aba.append(linha)
+    arquivo = tempfile.TemporaryFile()
+    planilha.save(arquivo)
+    arquivo.seek(0)
+    return FileResponse(
+        arquivo,
+        as_attachment=True,
+        filename=f'{nome_arquivo}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+
+async def _iterar_em_thread(partes):
+    """
+    Entrega um corpo síncrono (que lê do banco) ao servidor ASGI aos poucos:
+    cada lote é lido por sync_to_async, na mesma thread das views síncronas (e
+    da conexão com o banco), e enviado antes de o próximo ser lido.
+    """
+    partes = iter(partes)
+    proximo_lote = sync_to_async(lambda: list(islice(partes, PARTES_POR_ENVIO)))
+    while lote := await proximo_lote():
+        for parte in lote:
+            yield parte
+
+
+def _linhas_emprestimos(params):
+    campos = (
+        'id', 'livro__titulo', 'livro__isbn', 'leitor__nome', 'leitor__matricula', 'leitor__turma',
+        'data_emprestimo', 'data_devolucao_prevista', 'data_devolucao_real', 'status',
+    )
+    rotulos = dict(Emprestimo.STATUS_CHOICES)
+    for linha in historico.valores(historico.emprestimos(params), *campos, tamanho_lote=TAMANHO_LOTE):
+        yield linha[:-1] + (rotulos[linha[-1]],)
+
+
+def _linhas_leitores_atrasados(params):
+    """
+    Uma linha por leitor com empréstimos atrasados, com o telefone para contato.
+    Lê só os empréstimos com status 'atrasado' (índice parcial), já ordenados
+    por leitor, e agrupa no caminho.
+    """
+    hoje = timezone.localdate()
+    atrasados = Emprestimo.objects.filter(status=Emprestimo.ATRASADO)
+    if params.get('turma'):
+        atrasados = atrasados.filter(leitor__turma=params['turma'])
+    linhas = atrasados.order_by('leitor__turma', 'leitor__nome', 'leitor_id', 'data_devolucao_prevista').values_list(
+        'leitor_id', 'leitor__matricula', 'leitor__nome', 'leitor__turma', 'leitor__telefone',
+        'livro__titulo', 'data_devolucao_prevista',
+    ).iterator(chunk_size=TAMANHO_LOTE)
+    for _, emprestimos in groupby(linhas, key=lambda linha: linha[0]):
+        emprestimos = list(emprestimos)
+        _, matricula, nome, turma, telefone, _, mais_antigo = emprestimos[0]
+        titulos = '; '.join(linha[5] for linha in emprestimos)
+        yield (matricula, nome, turma, telefone, len(emprestimos), titulos, mais_antigo, (hoje - mais_antigo).days)
+
+
+def _linhas_livros(params):
+    campos = (
+        'titulo', 'autor', 'editora', 'ano_publicacao', 'isbn', 'genero', 'numero_copias', 'copias_disponiveis',
+    )
+    yield from filtros.filtrar_livros(params).values_list(*campos).iterator(chunk_size=TAMANHO_LOTE)
+
+
+def _linhas_leitores(params):
+    campos = ('nome', 'matricula', 'turma', 'telefone', 'ativo')
+    for linha in filtros.filtrar_leitores(params).values_list(*campos).iterator(chunk_size=TAMANHO_LOTE):
+        yield linha[:-1] + ('Sim' if linha[-1] else 'Não',)
+
+
+EXPORTACOES = {
+    'emprestimos': (
+        ['Nº', 'Livro', 'ISBN', 'Leitor', 'Matrícula', 'Turma', 'Data Empréstimo',
+         'Devolução Prevista', 'Devolução Real', 'Status'],
+        _linhas_emprestimos,
+    ),
+    'livros': (
+        ['Título', 'Autor', 'Editora', 'Ano', 'ISBN', 'Gênero', 'Cópias Totais', 'Cópias Disponíveis'],
+        _linhas_livros,
+    ),
+    'leitores': (
+        ['Nome', 'Matrícula', 'Turma', 'Telefone', 'Ativo'],
+        _linhas_leitores,
+    ),
+    # Lista de cobrança (também gerada pelo 'manage.py varrer_atrasados')
+    'atrasados': (
+        ['Matrícula', 'Leitor', 'Turma', 'Telefone', 'Livros Atrasados', 'Títulos',
+         'Vencimento Mais Antigo', 'Dias de Atraso'],
+        _linhas_leitores_atrasados,
+    ),
+}
+
+FORMATOS = {
+    'csv': resposta_csv,
+    'xlsx': resposta_xlsx,
+}
+
+
+def exportar(tipo, formato, params, assincrono=False):
+    """
+    Resposta de download para 'tipo' (ver EXPORTACOES) no 'formato' pedido.
+    Com assincrono=True (requisição servida pelo ASGI) o corpo é um iterador async.
+    """
+    cabecalho, gerar_linhas = EXPORTACOES[tipo]
+    response = FORMATOS[formato](tipo, cabecalho, gerar_linhas(params))
+    if assincrono:
+        response.streaming_content = _iterar_em_thread(response.streaming_content)
+    return response
+
+
+def gravar(tipo, caminho, params):
+    """
+    Grava a exportação 'tipo' num arquivo (XLSX se o nome terminar em .xlsx,
+    senão CSV no mesmo formato do download). Retorna o número de linhas.
+    """
+    cabecalho, gerar_linhas = EXPORTACOES[tipo]
+    total = 0
+    if str(caminho).lower().endswith('.xlsx'):
+        from openpyxl import Workbook
+
+        planilha = Workbook(write_only=True)
+        aba = planilha.create_sheet(title=tipo[:31])
+        aba.append(cabecalho)
+        for linha in gerar_linhas(params):
+            aba.append(linha)
+            total += 1
+        planilha.save(caminho)
+        return total
+    with open(caminho, 'w', encoding='utf-8-sig', newline='') as arquivo:
+        escritor = csv.writer(arquivo, delimiter=';')
+        escritor.writerow(cabecalho)
+        for linha in gerar_linhas(params):
+            escritor.writerow(linha)
+            total += 1
+    return total
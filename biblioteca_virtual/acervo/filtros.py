@@ -0,0 +1,97 @@
+# acervo/filtros.py
+#
+# Filtros das listagens, compartilhados entre as páginas HTML, o relatório em
+# PDF, as exportações CSV/XLSX e a API (acervo/api.py). Cada função recebe os
+# parâmetros da URL (request.GET) e devolve o queryset já filtrado e ordenado.
+
+from django.db.models import F
+
+from .models import Livro, Leitor, Emprestimo
+from . import busca
+
+
+# Ordenações aceitas em ?ordem=, cada uma casando com um índice de Livro.Meta
+# (o 'id' no final desempata títulos iguais e mantém a paginação estável)
+ORDENACOES_LIVROS = {
+    'titulo': ('titulo', 'id'),
+    'autor': ('autor', 'titulo', 'id'),
+    'disponibilidade': ('-copias_disponiveis', 'titulo', 'id'),
+    # Mais emprestados (contador mantido em Livro, sem GROUP BY no histórico)
+    'populares': ('-total_emprestimos', 'titulo', 'id'),
+    # Só faz sentido quando há termo de busca
+    'relevancia': ('-relevancia', 'titulo', 'id'),
+}
+
+
+def ordem_livros(params):
+    """Ordenação efetiva de 'lista_livros' para os parâmetros informados."""
+    ordem = params.get('ordem')
+    if ordem not in ORDENACOES_LIVROS or (ordem == 'relevancia' and not params.get('q')):
+        # Com busca, os resultados mais relevantes vêm primeiro
+        ordem = 'relevancia' if params.get('q') else 'titulo'
+    return ordem
+
+
+def filtrar_livros(params):
+    termo_busca = params.get('q')
+    queryset = Livro.objects.all()
+    if termo_busca:
+        queryset = busca.buscar_livros(queryset, termo_busca)
+    queryset = queryset.order_by(*ORDENACOES_LIVROS[ordem_livros(params)])
+    # O antigo campo 'disponivel' foi removido na migração 0003,
+    # então o status é derivado de 'copias_disponiveis'
+    filtro_status = params.get('status')
+    if filtro_status == 'disponivel':
+        queryset = queryset.filter(copias_disponiveis__gt=0)
+    elif filtro_status == 'emprestado':
+        queryset = queryset.filter(copias_disponiveis=0)
+    elif filtro_status == 'parcial':
+        # Tem cópias na estante, mas alguma está emprestada
+        queryset = queryset.filter(copias_disponiveis__gt=0, copias_disponiveis__lt=F('numero_copias'))
+    return queryset
+
+
+def filtrar_emprestimos(params, modelo=Emprestimo):
+    # 'modelo' também pode ser EmprestimoArquivado (ver acervo/historico.py)
+    queryset = modelo.objects.order_by('-data_emprestimo', '-id')
+
+    # Pega todos os parâmetros da URL
+    termo_busca = params.get('q')
+    data_inicio = params.get('data_inicio')
+    data_fim = params.get('data_fim')
+    status = params.get('status')
+
+    # Aplica os filtros
+    if termo_busca:
+        queryset = busca.buscar_emprestimos(queryset, termo_busca)
+    if data_inicio:
+        queryset = queryset.filter(data_emprestimo__gte=data_inicio)
+    if data_fim:
+        queryset = queryset.filter(data_emprestimo__lte=data_fim)
+    if status == 'pendente':
+        queryset = queryset.filter(data_devolucao_real__isnull=True)
+    elif status == 'devolvido':
+        queryset = queryset.filter(data_devolucao_real__isnull=False)
+    elif status == 'atrasado':
+        # Status gravado (ver Emprestimo.status), com índice parcial próprio
+        queryset = queryset.filter(status=Emprestimo.ATRASADO)
+    return queryset
+
+
+def filtrar_leitores(params):
+    # Começa com todos os leitores
+    queryset = Leitor.objects.all().order_by('nome', 'id')
+
+    termo_busca = params.get('q')
+    if termo_busca:
+        queryset = busca.buscar_leitores(queryset, termo_busca)
+
+    filtro_status = params.get('status')
+    if filtro_status == 'inativo':
+        # Se o filtro for 'inativo', mostra apenas os inativos
+        queryset = queryset.filter(ativo=False)
+    else:
+        # PARA QUALQUER OUTRO CASO (filtro 'ativo' ou nenhum filtro),
+        # mostra apenas os leitores ATIVOS. Este é o novo padrão.
+        queryset = queryset.filter(ativo=True)
+    return queryset
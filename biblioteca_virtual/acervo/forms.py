@@ -1,7 +1,12 @@
 # acervo/forms.py
 
 from django import forms
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
 from .models import Livro, Emprestimo, Leitor
+from . import estatisticas
 from django.contrib.auth.forms import AuthenticationForm
 
 
@@ -35,19 +40,50 @@ class LivroForm(forms.ModelForm):
     # Lógica para garantir que 'copias_disponiveis' acompanhe 'numero_copias'
     def save(self, commit=True):
         instance = super().save(commit=False)
-        if not instance.pk: # Se for um livro novo
+        novo = not instance.pk
+        if novo: # Se for um livro novo
             instance.copias_disponiveis = instance.numero_copias
-        else: # Se estiver editando
-            livro_antigo = Livro.objects.get(pk=instance.pk)
-            # Ajusta cópias disponíveis pela diferença
-            diferenca = instance.numero_copias - livro_antigo.numero_copias
-            instance.copias_disponiveis = max(0, livro_antigo.copias_disponiveis + diferenca) # Garante que não fique negativo
-            
+        # Na edição, o número de cópias anterior já está em 'initial' (sem reler o livro)
+        diferenca = 0 if novo else instance.numero_copias - self.initial['numero_copias']
+
         if commit:
-            instance.save()
+            with transaction.atomic():
+                if novo:
+                    instance.save()
+                    estatisticas.ajustar(total_livros=1)
+                else:
+                    # Só os campos do form: cópias disponíveis e contadores de
+                    # empréstimos são mantidos pela circulação
+                    instance.save(update_fields=[*self._meta.fields, 'atualizado_em'])
+                if diferenca:
+                    # Ajusta cópias disponíveis pela diferença, sobre o valor atual do
+                    # banco (um empréstimo pode ter acontecido enquanto o form estava aberto)
+                    Livro.objects.filter(pk=instance.pk).update(
+                        copias_disponiveis=Greatest(F('copias_disponiveis') + diferenca, 0),
+                        atualizado_em=timezone.now(),
+                    )
+                    instance.refresh_from_db(fields=['copias_disponiveis'])
+        elif diferenca:
+            instance.copias_disponiveis = max(0, instance.copias_disponiveis + diferenca) # Garante que não fique negativo
         return instance
 
-class EmprestimoForm(forms.ModelForm):
+class _BuscaAjaxMixin:
+    """
+    Os campos de livro/leitor usam Select2 com busca AJAX, então só as opções
+    enviadas no POST precisam existir no queryset (e não o acervo inteiro no HTML).
+    """
+    campos_ajax = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for nome, model in self.campos_ajax.items():
+            ids = [i for i in self.data.getlist(self.add_prefix(nome)) if i.isdigit()] if self.is_bound else []
+            self.fields[nome].queryset = model.objects.filter(pk__in=ids)
+
+
+class EmprestimoForm(_BuscaAjaxMixin, forms.ModelForm):
+    campos_ajax = {'livro': Livro, 'leitor': Leitor}
+
     class Meta:
         model = Emprestimo
         fields = ['livro', 'leitor', 'data_devolucao_prevista']
@@ -67,4 +103,97 @@ class LeitorForm(forms.ModelForm):
             'matricula': forms.TextInput(attrs={'class': 'form-control'}),
             'turma': forms.TextInput(attrs={'class': 'form-control'}),
             'telefone': forms.TextInput(attrs={'class': 'form-control'}),
-        }
\ No newline at end of file
+        }
+
+    def save(self, commit=True):
+        instance = super().save(commit=False)
+        if commit:
+            if instance.pk:
+                # Só os campos do form: os contadores de empréstimos lidos ao abrir
+                # a página não sobrescrevem um empréstimo feito nesse meio-tempo
+                instance.save(update_fields=[*self._meta.fields, 'atualizado_em'])
+            else:
+                instance.save()
+        return instance
+
+class ImportacaoLivrosForm(forms.Form):
+    arquivo = forms.FileField(
+        label="Planilha (.csv ou .xlsx)",
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}),
+    )
+
+class SincronizacaoLeitoresForm(forms.Form):
+    arquivo = forms.FileField(
+        label="Lista de matrículas (.csv ou .xlsx)",
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}),
+    )
+    turmas = forms.CharField(
+        label="Turmas da lista (opcional, separadas por vírgula)",
+        required=False,
+        help_text="Se preenchido, só leitores dessas turmas podem ser inativados.",
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Ex.: 1A, 1B, 2A'}),
+    )
+    simular = forms.BooleanField(
+        label="Apenas simular (mostra as mudanças sem gravar)",
+        required=False,
+        initial=True,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+    )
+
+    def clean_turmas(self):
+        turmas = [t.strip() for t in self.cleaned_data['turmas'].split(',') if t.strip()]
+        return set(turmas) or None
+
+# ------------------- FORMULÁRIOS DE EMPRÉSTIMO/DEVOLUÇÃO EM LOTE -------------------
+
+class EmprestimoLivrosLoteForm(_BuscaAjaxMixin, forms.Form):
+    """Vários livros para um mesmo leitor."""
+    campos_ajax = {'leitor': Leitor, 'livros': Livro}
+
+    leitor = forms.ModelChoiceField(
+        queryset=Leitor.objects.none(),
+        widget=forms.Select(attrs={'class': 'form-control select2'}),
+    )
+    livros = forms.ModelMultipleChoiceField(
+        queryset=Livro.objects.none(),
+        widget=forms.SelectMultiple(attrs={'class': 'form-control select2'}),
+    )
+    data_devolucao_prevista = forms.DateField(
+        label="Data de devolução prevista",
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+    )
+
+
+class EmprestimoTurmaLoteForm(_BuscaAjaxMixin, forms.Form):
+    """Um livro para todos os leitores ativos de uma turma."""
+    campos_ajax = {'livro': Livro}
+
+    livro = forms.ModelChoiceField(
+        queryset=Livro.objects.none(),
+        widget=forms.Select(attrs={'class': 'form-control select2'}),
+    )
+    turma = forms.CharField(max_length=50, widget=forms.TextInput(attrs={'class': 'form-control'}))
+    data_devolucao_prevista = forms.DateField(
+        label="Data de devolução prevista",
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+    )
+
+
+class DevolucaoLoteForm(forms.Form):
+    TIPOS = [('isbn', 'ISBNs lidos'), ('id', 'Números dos empréstimos')]
+
+    tipo = forms.ChoiceField(choices=TIPOS, widget=forms.Select(attrs={'class': 'form-select'}))
+    codigos = forms.CharField(
+        label="Códigos (um por linha)",
+        widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 10, 'autofocus': True}),
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        codigos = [c.strip() for c in cleaned_data.get('codigos', '').split() if c.strip()]
+        if cleaned_data.get('tipo') == 'id':
+            if not all(c.isdigit() for c in codigos):
+                raise forms.ValidationError("Os números dos empréstimos devem conter apenas dígitos.")
+            codigos = [int(c) for c in codigos]
+        cleaned_data['lista_codigos'] = codigos
+        return cleaned_data
@@ -0,0 +1,119 @@
+# acervo/historico.py
+#
+# Histórico de empréstimos em duas camadas. A tabela de empréstimos guarda os
+# abertos e os devolvidos recentemente; os devolvidos há mais de
+# ACERVO_ARQUIVO_MESES meses vão para EmprestimoArquivado ('manage.py
+# arquivar_emprestimos', em lotes). Assim as consultas do dia a dia (abertos,
+# atrasados, painel, devolução) trabalham sobre uma tabela que não cresce a
+# cada semestre.
+#
+# Quem mostra o histórico inteiro ('lista_emprestimos', 'detalhes_livro', o
+# relatório em PDF e as exportações) lê as duas tabelas por aqui. Cada tabela
+# é consultada pelo seu índice de (-data_emprestimo, -id) e as linhas são
+# intercaladas em Python; como o arquivo mantém o id original, a ordem é a
+# mesma de antes do arquivamento.
+
+import calendar
+import heapq
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Emprestimo, EmprestimoArquivado
+from . import estatisticas, filtros
+
+ORDEM = ('-data_emprestimo', '-id')
+TAMANHO_LOTE = 5000
+
+
+def _meses():
+    return getattr(settings, 'ACERVO_ARQUIVO_MESES', 12)
+
+
+def limite_arquivo(meses=None, hoje=None):
+    """Empréstimos devolvidos antes desta data vão para o arquivo."""
+    hoje = hoje or timezone.localdate()
+    meses = _meses() if meses is None else meses
+    ano, mes = divmod(hoje.year * 12 + hoje.month - 1 - meses, 12)
+    # 31/03 menos um mês é 28/02 (ou 29/02)
+    dia = min(hoje.day, calendar.monthrange(ano, mes + 1)[1])
+    return hoje.replace(year=ano, month=mes + 1, day=dia)
+
+
+# --- Leitura ---
+
+def emprestimos(params):
+    """Consultas (tabela e arquivo) da 'lista_emprestimos' para os filtros de 'params'."""
+    consultas = [filtros.filtrar_emprestimos(params)]
+    if params.get('status') not in ('pendente', 'atrasado'):
+        # O arquivo só tem devolvidos: para esses filtros nem é consultado
+        consultas.append(filtros.filtrar_emprestimos(params, EmprestimoArquivado))
+    return consultas
+
+
+def do_livro(livro):
+    """Consultas do histórico de um livro, mais recentes primeiro."""
+    return [modelo.objects.filter(livro=livro).order_by(*ORDEM) for modelo in (Emprestimo, EmprestimoArquivado)]
+
+
+def valores(consultas, *campos, tamanho_lote=2000):
+    """
+    Linhas values_list(*campos) das consultas, intercaladas na ordem de ORDEM.
+    Cada consulta é lida em lotes (iterator), sem carregar o histórico inteiro.
+    """
+    iteradores = [
+        consulta.values_list('data_emprestimo', 'id', *campos).iterator(chunk_size=tamanho_lote)
+        for consulta in consultas
+    ]
+    for linha in heapq.merge(*iteradores, key=lambda linha: linha[:2], reverse=True):
+        yield linha[2:]
+
+
+# --- Arquivamento ---
+
+@transaction.atomic
+def _arquivar_lote(limite, depois_de, tamanho_lote):
+    lote = list(
+        Emprestimo.objects.select_for_update()
+        .filter(data_devolucao_real__lt=limite, id__gt=depois_de)
+        .order_by('id')[:tamanho_lote]
+    )
+    if not lote:
+        return None
+    EmprestimoArquivado.objects.bulk_create([
+        EmprestimoArquivado(
+            id=emprestimo.id,
+            livro_id=emprestimo.livro_id,
+            leitor_id=emprestimo.leitor_id,
+            data_emprestimo=emprestimo.data_emprestimo,
+            data_devolucao_prevista=emprestimo.data_devolucao_prevista,
+            data_devolucao_real=emprestimo.data_devolucao_real,
+            bibliotecario_id=emprestimo.bibliotecario_id,
+        )
+        for emprestimo in lote
+    ])
+    # Pelo intervalo de ids, não por uma lista de milhares de parâmetros: no
+    # intervalo, quem atende ao filtro é exatamente o lote travado acima
+    Emprestimo.objects.filter(
+        id__gte=lote[0].id, id__lte=lote[-1].id, data_devolucao_real__lt=limite
+    ).delete()
+    # Os contadores não mudam (só devolvidos saem), mas a API e os relatórios
+    # usam a versão dos empréstimos como ETag/chave de cache
+    estatisticas.ajustar(versao_emprestimos=1)
+    return lote[-1].id, len(lote)
+
+
+def arquivar(limite, tamanho_lote=TAMANHO_LOTE):
+    """
+    Move os empréstimos devolvidos antes de 'limite' para o arquivo, um lote
+    por transação (as travas duram só um lote). Gera quantos foram movidos em
+    cada lote.
+    """
+    ultimo = 0
+    while True:
+        resultado = _arquivar_lote(limite, ultimo, tamanho_lote)
+        if resultado is None:
+            return
+        ultimo, quantidade = resultado
+        yield quantidade
@@ -0,0 +1,248 @@
+# acervo/importacao.py
+#
+# Importação do catálogo a partir de planilhas (CSV ou XLSX). O arquivo é lido
+# linha a linha (csv / openpyxl read-only), cada linha é validada e as válidas
+# são gravadas em lotes com um único INSERT ... ON CONFLICT (isbn) DO UPDATE.
+# Livros que já existem mantêm os empréstimos em andamento: 'copias_disponiveis'
+# é ajustada pela diferença no número de cópias, num UPDATE por lote.
+#
+# As colunas aceitas são as mesmas da exportação de livros (Título, Autor,
+# Editora, Ano, ISBN, Gênero, Cópias Totais), então uma planilha exportada pode
+# ser editada e importada de volta.
+
+import csv
+import io
+import unicodedata
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Livro
+from . import cache_catalogo, estatisticas
+
+TAMANHO_LOTE = 2000
+
+# Cabeçalho (sem acentos, minúsculo) -> campo de Livro
+COLUNAS = {
+    'titulo': 'titulo',
+    'autor': 'autor',
+    'editora': 'editora',
+    'ano': 'ano_publicacao',
+    'ano publicacao': 'ano_publicacao',
+    'ano de publicacao': 'ano_publicacao',
+    'isbn': 'isbn',
+    'genero': 'genero',
+    'descricao': 'descricao',
+    'copias': 'numero_copias',
+    'copias totais': 'numero_copias',
+    'numero copias': 'numero_copias',
+    'numero de copias': 'numero_copias',
+}
+OBRIGATORIAS = ('titulo', 'autor', 'editora', 'ano_publicacao', 'isbn')
+LIMITES = {campo: Livro._meta.get_field(campo).max_length for campo in ('titulo', 'autor', 'editora', 'genero')}
+CAMPOS_ATUALIZADOS = [
+    'titulo', 'autor', 'editora', 'ano_publicacao', 'genero', 'descricao', 'numero_copias', 'atualizado_em',
+    # Um ISBN de livro excluído (ver acervo/exclusao.py) volta ao catálogo
+    'excluido_em',
+]
+
+
+class ErroImportacao(Exception):
+    """Problema no arquivo como um todo (formato, cabeçalho)."""
+
+
+def _normalizar_cabecalho(valor):
+    # 'Título', 'titulo' e ' TITULO ' são a mesma coluna; '_' vale como espaço
+    texto = unicodedata.normalize('NFKD', str(valor or '')).encode('ascii', 'ignore').decode()
+    return ' '.join(texto.lower().replace('_', ' ').split())
+
+
+def isbn_valido(isbn):
+    """Confere o dígito verificador de um ISBN-10 ou ISBN-13 (só dígitos, 'X' no ISBN-10)."""
+    if len(isbn) == 13 and isbn.isdigit():
+        soma = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(isbn[:12]))
+        return (10 - soma % 10) % 10 == int(isbn[12])
+    if len(isbn) == 10 and isbn[:9].isdigit() and (isbn[9].isdigit() or isbn[9] == 'X'):
+        soma = sum(int(d) * (10 - i) for i, d in enumerate(isbn[:9]))
+        soma += 10 if isbn[9] == 'X' else int(isbn[9])
+        return soma % 11 == 0
+    return False
+
+
+def _linhas_csv(arquivo):
+    texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+    amostra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=';,\t')
+    except csv.Error:
+        dialeto = csv.excel
+    try:
+        yield from csv.reader(texto, dialeto)
+    finally:
+        # Não fecha o arquivo de quem chamou junto com o wrapper
+        texto.detach()
+
+
+def _linhas_xlsx(arquivo):
+    # Só carregado quando chega uma planilha XLSX
+    from openpyxl import load_workbook
+
+    planilha = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        for linha in planilha.worksheets[0].iter_rows(values_only=True):
+            yield linha
+    finally:
+        planilha.close()
+
+
+LEITORES = {
+    'csv': _linhas_csv,
+    'xlsx': _linhas_xlsx,
+}
+
+
+def formato_do_arquivo(nome):
+    extensao = nome.rsplit('.', 1)[-1].lower() if '.' in nome else ''
+    if extensao not in LEITORES:
+        raise ErroImportacao(f'Formato não suportado: "{nome}". Envie um arquivo .csv ou .xlsx.')
+    return extensao
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        # Números inteiros vêm como float do Excel (ex.: ISBN, ano)
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def ler_planilha(arquivo, formato, colunas, obrigatorias):
+    """
+    Gera (número da linha, {campo: texto}) para cada linha não vazia da planilha.
+    'colunas' mapeia o cabeçalho normalizado para o nome do campo.
+    """
+    linhas = LEITORES[formato](arquivo)
+    cabecalho = next(linhas, None)
+    if cabecalho is None:
+        raise ErroImportacao('O arquivo está vazio.')
+    campos = [colunas.get(_normalizar_cabecalho(coluna)) for coluna in cabecalho]
+    faltando = [campo for campo in obrigatorias if campo not in campos]
+    if faltando:
+        raise ErroImportacao('Colunas obrigatórias ausentes no cabeçalho: ' + ', '.join(faltando))
+
+    for numero, valores in enumerate(linhas, start=2):
+        if not any(_texto(v) for v in valores):
+            continue
+        yield numero, {campo: _texto(valor) for campo, valor in zip(campos, valores) if campo}
+
+
+def _validar(dados):
+    """Converte e valida uma linha. Retorna (Livro, None) ou (None, mensagem de erro)."""
+    faltando = [campo for campo in OBRIGATORIAS if not dados.get(campo)]
+    if faltando:
+        return None, 'Campos obrigatórios vazios: ' + ', '.join(faltando)
+
+    isbn = dados['isbn'].replace('-', '').replace(' ', '').upper()
+    if not isbn_valido(isbn):
+        return None, f'ISBN inválido: {dados["isbn"]}'
+
+    try:
+        ano = int(dados['ano_publicacao'])
+        copias = int(dados.get('numero_copias') or 1)
+    except ValueError:
+        return None, 'Ano e cópias devem ser números inteiros.'
+    if ano < 0 or copias < 0:
+        return None, 'Ano e cópias não podem ser negativos.'
+
+    for campo, limite in LIMITES.items():
+        if len(dados.get(campo, '')) > limite:
+            return None, f'"{campo}" passa de {limite} caracteres.'
+
+    return Livro(
+        titulo=dados['titulo'],
+        autor=dados['autor'],
+        editora=dados['editora'],
+        ano_publicacao=ano,
+        isbn=isbn,
+        genero=dados.get('genero', ''),
+        descricao=dados.get('descricao', ''),
+        numero_copias=copias,
+        copias_disponiveis=copias,
+    ), None
+
+
+@transaction.atomic
+def _gravar_lote(livros):
+    """Upsert de um lote (ISBNs únicos). Retorna (criados, atualizados)."""
+    existentes = {
+        isbn: (pk, copias, excluido)
+        for isbn, pk, copias, excluido in Livro.todos.filter(isbn__in=livros).values_list(
+            'isbn', 'id', 'numero_copias', 'excluido_em'
+        )
+    }
+    Livro.objects.bulk_create(
+        livros.values(),
+        update_conflicts=True,
+        unique_fields=['isbn'],
+        # 'copias_disponiveis' fica de fora: quem já existe é ajustado abaixo
+        update_fields=CAMPOS_ATUALIZADOS,
+    )
+    diferencas = {
+        pk: livros[isbn].numero_copias - copias
+        for isbn, (pk, copias, _) in existentes.items()
+        if livros[isbn].numero_copias != copias
+    }
+    if diferencas:
+        Livro.todos.filter(pk__in=diferencas).update(
+            copias_disponiveis=Greatest(F('copias_disponiveis') + estatisticas.valor_por_id(diferencas), 0),
+            atualizado_em=timezone.now(),
+        )
+    criados = len(livros) - len(existentes)
+    restaurados = sum(1 for _, _, excluido in existentes.values() if excluido)
+    estatisticas.ajustar(total_livros=criados + restaurados)
+    return criados, len(existentes)
+
+
+def importar(arquivo, formato, tamanho_lote=TAMANHO_LOTE):
+    """
+    Importa o arquivo aberto em modo binário. Retorna um resumo:
+    {'criados', 'atualizados', 'erros': [{'linha', 'isbn', 'erro'}, ...]}.
+    """
+    linhas = ler_planilha(arquivo, formato, COLUNAS, OBRIGATORIAS)
+    resumo = {'criados': 0, 'atualizados': 0, 'erros': []}
+    lote = {}
+    linha_do_isbn = {}
+
+    def gravar():
+        criados, atualizados = _gravar_lote(lote)
+        resumo['criados'] += criados
+        resumo['atualizados'] += atualizados
+        lote.clear()
+        linha_do_isbn.clear()
+
+    try:
+        for numero, dados in linhas:
+            livro, erro = _validar(dados)
+            if erro:
+                resumo['erros'].append({'linha': numero, 'isbn': dados.get('isbn', ''), 'erro': erro})
+                continue
+            if livro.isbn in lote:
+                # O mesmo ISBN duas vezes num único INSERT ... ON CONFLICT não é permitido
+                resumo['erros'].append({
+                    'linha': linha_do_isbn[livro.isbn], 'isbn': livro.isbn,
+                    'erro': f'ISBN repetido no arquivo; vale a linha {numero}.',
+                })
+            lote[livro.isbn] = livro
+            linha_do_isbn[livro.isbn] = numero
+            if len(lote) >= tamanho_lote:
+                gravar()
+        if lote:
+            gravar()
+    finally:
+        if resumo['criados'] or resumo['atualizados']:
+            cache_catalogo.invalidar()
+    return resumo
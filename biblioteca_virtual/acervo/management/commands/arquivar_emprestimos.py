@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from acervo import historico
+
+
+class Command(BaseCommand):
+    help = (
+        "Move para o arquivo (EmprestimoArquivado) os empréstimos devolvidos há mais de N meses, "
+        "um lote por transação. Continuam visíveis na lista de empréstimos, no histórico do livro "
+        "e no relatório em PDF. Pode ser interrompido e executado de novo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--meses', type=int,
+            help="Arquiva os devolvidos há mais que isso (padrão: ACERVO_ARQUIVO_MESES).",
+        )
+        parser.add_argument(
+            '--lote', type=int, default=historico.TAMANHO_LOTE,
+            help=f"Empréstimos por transação (padrão: {historico.TAMANHO_LOTE}).",
+        )
+
+    def handle(self, *args, **options):
+        if options['meses'] is not None and options['meses'] < 0:
+            raise CommandError("--meses não pode ser negativo.")
+        if options['lote'] < 1:
+            raise CommandError("--lote precisa ser maior que zero.")
+
+        limite = historico.limite_arquivo(options['meses'])
+        total = 0
+        for quantidade in historico.arquivar(limite, options['lote']):
+            total += quantidade
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  {total} arquivado(s)...")
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} empréstimo(s) devolvidos antes de {limite:%d/%m/%Y} movidos para o arquivo."
+        ))
@@ -0,0 +1,145 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from acervo import filtros
+from acervo.models import Livro, Leitor, Emprestimo
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Popula o banco com um volume realista de empréstimos e mostra o plano e o tempo "
+        "das consultas mais frequentes sem e com os índices de Emprestimo. Tudo roda numa "
+        "transação desfeita ao final: nenhum dado fica no banco."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--livros', type=int, default=5000)
+        parser.add_argument('--leitores', type=int, default=3000)
+        parser.add_argument('--emprestimos', type=int, default=200000)
+        parser.add_argument(
+            '--repeticoes', type=int, default=5,
+            help="Execuções de cada consulta; o tempo informado é o melhor (padrão: 5).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.popular(options)
+                consultas = self.consultas()
+                indices = Emprestimo._meta.indexes
+
+                self.remover_indices(indices)
+                self.stdout.write(self.style.MIGRATE_HEADING("\n=== SEM os índices de Emprestimo ==="))
+                antes = self.medir(consultas, options['repeticoes'])
+
+                self.criar_indices(indices)
+                self.stdout.write(self.style.MIGRATE_HEADING("\n=== COM os índices de Emprestimo ==="))
+                depois = self.medir(consultas, options['repeticoes'])
+
+                self.stdout.write(self.style.MIGRATE_HEADING("\n=== Resumo (ms) ==="))
+                for nome in consultas:
+                    self.stdout.write(f"{nome:<32} {antes[nome]:>10.2f} {depois[nome]:>10.2f}")
+                raise Rollback
+        except Rollback:
+            self.stdout.write("\nDados de teste descartados.")
+
+    def popular(self, options):
+        self.stdout.write("Populando o banco...")
+        aleatorio = random.Random(42)
+        hoje = timezone.localdate()
+        bibliotecario = User.objects.order_by('pk').first() or User.objects.create_user('benchmark')
+
+        livros = Livro.objects.bulk_create(
+            Livro(
+                titulo=f'Livro {n}', autor=f'Autor {n % 700}', editora='Editora', ano_publicacao=2000,
+                isbn=f'B{n:012d}', numero_copias=3, copias_disponiveis=3,
+            )
+            for n in range(options['livros'])
+        )
+        leitores = Leitor.objects.bulk_create(
+            Leitor(nome=f'Leitor {n}', matricula=f'BENCH{n}', turma=f'{n % 9 + 1}A')
+            for n in range(options['leitores'])
+        )
+
+        emprestimos = []
+        for _ in range(options['emprestimos']):
+            # Dois anos de histórico; a grande maioria já devolvida
+            emprestado = hoje - timedelta(days=aleatorio.randint(0, 730))
+            prevista = emprestado + timedelta(days=14)
+            devolvido = None
+            if emprestado < hoje - timedelta(days=30) or aleatorio.random() < 0.5:
+                devolvido = emprestado + timedelta(days=aleatorio.randint(1, 20))
+            emprestimo = Emprestimo(
+                livro=aleatorio.choice(livros), leitor=aleatorio.choice(leitores),
+                data_emprestimo=emprestado, data_devolucao_prevista=prevista,
+                data_devolucao_real=devolvido, bibliotecario=bibliotecario,
+            )
+            emprestimo.status = emprestimo.calcular_status(hoje)
+            emprestimos.append(emprestimo)
+        Emprestimo.objects.bulk_create(emprestimos, batch_size=5000)
+
+        with connection.cursor() as cursor:
+            # Estatísticas atualizadas para o planejador
+            cursor.execute('ANALYZE')
+        self.livro = aleatorio.choice(livros)
+        self.leitor = aleatorio.choice(leitores)
+        self.stdout.write(
+            f"{len(livros)} livros, {len(leitores)} leitores, {len(emprestimos)} empréstimos."
+        )
+
+    def consultas(self):
+        hoje = timezone.localdate()
+        abertos = Emprestimo.objects.filter(data_devolucao_real__isnull=True)
+        return {
+            'atrasados (dashboard)': abertos.filter(data_devolucao_prevista__lt=hoje).order_by().values('id'),
+            'abertos do leitor (inativar)': abertos.filter(leitor=self.leitor).values('id')[:1],
+            'lista_emprestimos': filtros.filtrar_emprestimos({}).select_related('livro', 'leitor')[:11],
+            'pendentes (lista/PDF)': filtros.filtrar_emprestimos({'status': 'pendente'})[:11],
+            'atrasados (lista/PDF)': filtros.filtrar_emprestimos({'status': 'atrasado'})[:11],
+            'período (lista/PDF)': filtros.filtrar_emprestimos({
+                'data_inicio': (hoje - timedelta(days=60)).isoformat(),
+                'data_fim': (hoje - timedelta(days=30)).isoformat(),
+            })[:11],
+            'histórico do livro': Emprestimo.objects.filter(livro=self.livro).select_related('leitor')
+            .order_by('-data_emprestimo', '-id')[:21],
+        }
+
+    def medir(self, consultas, repeticoes):
+        tempos = {}
+        for nome, queryset in consultas.items():
+            self.stdout.write(self.style.SQL_TABLE(f"\n-- {nome}"))
+            self.stdout.write(queryset.explain())
+            melhor = None
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                list(queryset.all())
+                decorrido = (time.perf_counter() - inicio) * 1000
+                melhor = decorrido if melhor is None else min(melhor, decorrido)
+            tempos[nome] = melhor
+            self.stdout.write(f"{melhor:.2f} ms")
+        return tempos
+
+    def _executar(self, sqls):
+        with connection.cursor() as cursor:
+            for sql in sqls:
+                cursor.execute(str(sql))
+            cursor.execute('ANALYZE')
+
+    def remover_indices(self, indices):
+        self._executar(f'DROP INDEX {connection.ops.quote_name(indice.name)}' for indice in indices)
+
+    def criar_indices(self, indices):
+        # O schema_editor() do SQLite não pode ser aberto dentro de uma transação;
+        # aqui só é preciso o SQL de cada índice
+        editor = connection.schema_editor()
+        self._executar(indice.create_sql(Emprestimo, editor) for indice in indices)
@@ -0,0 +1,53 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from acervo import importacao
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa livros de uma planilha .csv ou .xlsx (mesmas colunas da exportação). "
+        "Livros com ISBN já cadastrado são atualizados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help="Caminho do arquivo .csv ou .xlsx.")
+        parser.add_argument(
+            '--lote', type=int, default=importacao.TAMANHO_LOTE,
+            help=f"Linhas gravadas por INSERT (padrão: {importacao.TAMANHO_LOTE}).",
+        )
+        parser.add_argument(
+            '--relatorio', metavar='CSV',
+            help="Grava as linhas rejeitadas (linha, isbn, erro) neste arquivo CSV.",
+        )
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        try:
+            formato = importacao.formato_do_arquivo(options['arquivo'])
+            with open(options['arquivo'], 'rb') as arquivo:
+                resumo = importacao.importar(arquivo, formato, options['lote'])
+        except (importacao.ErroImportacao, OSError) as erro:
+            raise CommandError(str(erro))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{resumo['criados']} livro(s) adicionado(s), {resumo['atualizados']} atualizado(s) "
+            f"em {time.monotonic() - inicio:.1f}s."
+        ))
+        erros = resumo['erros']
+        if not erros:
+            return
+        self.stdout.write(self.style.WARNING(f"{len(erros)} linha(s) rejeitada(s)."))
+        if options['relatorio']:
+            with open(options['relatorio'], 'w', newline='', encoding='utf-8') as saida:
+                escritor = csv.DictWriter(saida, fieldnames=['linha', 'isbn', 'erro'])
+                escritor.writeheader()
+                escritor.writerows(erros)
+            self.stdout.write(f"Relatório de erros gravado em {options['relatorio']}.")
+        else:
+            for erro in erros[:20]:
+                self.stdout.write(f"  linha {erro['linha']}: {erro['erro']}")
+            if len(erros) > 20:
+                self.stdout.write("  ... (use --relatorio para a lista completa)")
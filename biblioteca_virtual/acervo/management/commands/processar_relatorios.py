@@ -0,0 +1,82 @@
+import logging
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connections
+
+from acervo import relatorios
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Processa a fila de relatórios em PDF (TarefaRelatorio) fora dos workers web."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--uma-vez', action='store_true',
+            help="Esvazia a fila e termina, em vez de continuar aguardando novas tarefas.",
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=2.0,
+            help="Segundos de espera entre consultas quando a fila está vazia (padrão: 2).",
+        )
+
+    def _parar(self, signum, frame):
+        # SIGTERM do deploy: termina o relatório em andamento e sai do laço
+        self.parar = True
+
+    def handle(self, *args, **options):
+        self.parar = False
+        anteriores = {sinal: signal.signal(sinal, self._parar) for sinal in (signal.SIGTERM, signal.SIGINT)}
+        self.stdout.write("Worker de relatórios iniciado.")
+        try:
+            self._laco(options)
+        finally:
+            for sinal, tratador in anteriores.items():
+                signal.signal(sinal, tratador)
+        self.stdout.write("Worker de relatórios encerrado.")
+
+    def _laco(self, options):
+        ciclos_ociosos = 0
+        while not self.parar:
+            try:
+                tarefa = self._proxima(ciclos_ociosos)
+            except DatabaseError:
+                # Banco fora do ar ou conexão derrubada: descarta as conexões e tenta de novo
+                logger.exception("Erro de banco no worker de relatórios; nova tentativa em %ss", options['intervalo'])
+                connections.close_all()
+                time.sleep(options['intervalo'])
+                continue
+
+            if tarefa is None:
+                if options['uma_vez']:
+                    break
+                ciclos_ociosos += 1
+                time.sleep(options['intervalo'])
+                continue
+
+            ciclos_ociosos = 0
+            inicio = time.monotonic()
+            try:
+                gerado = relatorios.processar(tarefa)
+            except DatabaseError:
+                # A tarefa fica 'processando' e a manutenção a devolve à fila depois
+                logger.exception("Erro de banco ao gravar o relatório #%s", tarefa.pk)
+                connections.close_all()
+                continue
+            if gerado:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Relatório #{tarefa.pk} gerado em {time.monotonic() - inicio:.1f}s."
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f"Relatório #{tarefa.pk} falhou."))
+
+    def _proxima(self, ciclos_ociosos):
+        close_old_connections()
+        if ciclos_ociosos % 300 == 0:
+            reenfileiradas, apagadas = relatorios.manutencao()
+            if reenfileiradas or apagadas:
+                self.stdout.write(f"Manutenção: {reenfileiradas} reenfileirada(s), {apagadas} apagada(s).")
+        return relatorios.pegar_proxima()
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from acervo import exclusao
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove de vez os livros excluídos há mais de N dias, com o histórico de empréstimos. "
+        "Os empréstimos são apagados em lotes, um por transação, e o livro por último. "
+        "Pode ser interrompido e executado de novo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias', type=int,
+            help="Só os excluídos há mais que isso (padrão: ACERVO_EXCLUSAO_DIAS).",
+        )
+        parser.add_argument(
+            '--lote', type=int, default=exclusao.TAMANHO_LOTE,
+            help=f"Empréstimos apagados por transação (padrão: {exclusao.TAMANHO_LOTE}).",
+        )
+
+    def handle(self, *args, **options):
+        if options['dias'] is not None and options['dias'] < 0:
+            raise CommandError("--dias não pode ser negativo.")
+        if options['lote'] < 1:
+            raise CommandError("--lote precisa ser maior que zero.")
+
+        removidos = 0
+        for titulo, emprestimos in exclusao.purgar(exclusao.limite_purga(options['dias']), options['lote']):
+            removidos += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  {titulo}: {emprestimos} empréstimo(s) apagado(s)")
+        self.stdout.write(self.style.SUCCESS(f"{removidos} livro(s) removido(s) de vez."))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from acervo import estatisticas
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstrói os contadores mantidos incrementalmente: empréstimos abertos/atrasados "
+        "de cada leitor, total e último empréstimo e cópias disponíveis de cada livro e os "
+        "números do dashboard."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            estatisticas.recalcular_agregados()
+            estatisticas.recalcular()
+        self.stdout.write(self.style.SUCCESS("Contadores recalculados."))
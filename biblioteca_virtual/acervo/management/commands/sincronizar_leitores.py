@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from acervo import importacao, matriculas
+
+
+class Command(BaseCommand):
+    help = (
+        "Sincroniza os leitores com a lista de matrículas (.csv ou .xlsx): cadastra os novos, "
+        "atualiza turma/telefone e inativa quem saiu da lista e não tem empréstimos pendentes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help="Caminho do arquivo .csv ou .xlsx.")
+        parser.add_argument(
+            '--turma', action='append', dest='turmas', metavar='TURMA',
+            help="Restringe as inativações a esta turma (pode ser repetido).",
+        )
+        parser.add_argument(
+            '--simular', action='store_true',
+            help="Mostra as mudanças sem gravar nada.",
+        )
+
+    def handle(self, *args, **options):
+        turmas = set(options['turmas']) if options['turmas'] else None
+        try:
+            formato = importacao.formato_do_arquivo(options['arquivo'])
+            with open(options['arquivo'], 'rb') as arquivo:
+                plano, erros = matriculas.sincronizar(arquivo, formato, turmas, options['simular'])
+        except (importacao.ErroImportacao, OSError) as erro:
+            raise CommandError(str(erro))
+
+        # A simulação sempre mostra a lista de mudanças; ao aplicar, só com -v 2
+        verbose = options['simular'] or options['verbosity'] > 1
+        for aluno in plano['novos']:
+            self.linha(verbose, f"+ {aluno['matricula']} {aluno['nome']} ({aluno['turma']})")
+        for item in plano['atualizados'] + plano['reativados']:
+            mudancas = ', '.join(f"{campo}: {antes!r} -> {depois!r}" for campo, (antes, depois) in item['mudancas'].items())
+            prefixo = '* reativado' if item in plano['reativados'] else '*'
+            self.linha(verbose, f"{prefixo} {item['matricula']} {item['nome']} {mudancas}".rstrip())
+        for item in plano['inativados']:
+            self.linha(verbose, f"- {item['matricula']} {item['nome']} ({item['turma']})")
+        for item in plano['com_pendencias']:
+            self.linha(verbose, f"! {item['matricula']} {item['nome']}: empréstimos pendentes, continua ativo")
+        for erro in erros:
+            self.stdout.write(self.style.WARNING(f"linha {erro['linha']}: {erro['erro']}"))
+
+        resumo = (
+            f"{len(plano['novos'])} novo(s), {len(plano['atualizados'])} atualizado(s), "
+            f"{len(plano['reativados'])} reativado(s), {len(plano['inativados'])} inativado(s), "
+            f"{len(plano['com_pendencias'])} mantido(s) por pendências."
+        )
+        if options['simular']:
+            self.stdout.write(self.style.NOTICE(f"Simulação (nada gravado): {resumo}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(resumo))
+
+    def linha(self, verbose, texto):
+        if verbose:
+            self.stdout.write(texto)
@@ -0,0 +1,136 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Executado num interpretador novo com -X importtime: as importações vão para o
+# stderr, separadas por marcadores de fase; os tempos de cada fase, para o stdout
+SCRIPT = r'''
+import json, sys, time
+inicio = time.perf_counter()
+tempos = {}
+
+def fase(nome):
+    print(f'#fase {nome}', file=sys.stderr, flush=True)
+
+fase('setup')
+import django
+django.setup()
+tempos['setup'] = time.perf_counter()
+
+fase('urls')
+from django.urls import get_resolver
+get_resolver().url_patterns
+tempos['urls'] = time.perf_counter()
+
+fase('requisicao')
+from django.core.handlers.wsgi import WSGIHandler
+from io import BytesIO
+respostas = []
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': URL, 'QUERY_STRING': '', 'SERVER_NAME': HOST,
+    'SERVER_PORT': '443', 'HTTP_HOST': HOST, 'wsgi.url_scheme': 'https', 'wsgi.input': BytesIO(),
+    'wsgi.errors': sys.stderr, 'SERVER_PROTOCOL': 'HTTP/1.1',
+}
+corpo = b''.join(WSGIHandler()(environ, lambda status, headers: respostas.append(status)))
+tempos['requisicao'] = time.perf_counter()
+print(json.dumps({
+    'inicio': inicio, 'tempos': tempos, 'status': respostas[0], 'bytes': len(corpo),
+}))
+'''
+
+FASES = [
+    ('setup', 'django.setup() (settings, apps, modelos)'),
+    ('urls', 'URLconf e views'),
+    ('requisicao', 'primeira requisição'),
+]
+LINHA_IMPORTTIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)')
+
+
+def _host():
+    for host in settings.ALLOWED_HOSTS:
+        if host == '*':
+            break
+        return f'startup{host}' if host.startswith('.') else host
+    return 'localhost'
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede o cold start de um worker: o custo de importação (-X importtime) por pacote e "
+        "por módulo do projeto em cada fase, e o tempo até a primeira resposta."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/', help="Caminho da primeira requisição (padrão: /).")
+        parser.add_argument('--top', type=int, default=12, help="Pacotes listados por fase (padrão: 12).")
+
+    def handle(self, *args, **options):
+        script = f"URL = {options['url']!r}\nHOST = {_host()!r}\n" + SCRIPT
+        ambiente = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+        inicio = time.perf_counter()
+        processo = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            capture_output=True, text=True, env=ambiente, cwd=settings.BASE_DIR,
+        )
+        total = time.perf_counter() - inicio
+        if processo.returncode != 0:
+            raise CommandError(processo.stderr.strip().splitlines()[-1] if processo.stderr else 'falhou')
+        resultado = json.loads(processo.stdout.strip().splitlines()[-1])
+
+        pacotes, modulos = self.importacoes(processo.stderr)
+        # Apps do projeto: as que moram dentro do BASE_DIR (não as do Django nem as de terceiros)
+        base = str(settings.BASE_DIR)
+        projeto = {config.name.split('.')[0] for config in apps.get_app_configs() if config.path.startswith(base)}
+        projeto.add(settings.ROOT_URLCONF.split('.')[0])
+
+        anterior = resultado['inicio']
+        for fase, titulo in FASES:
+            duracao = resultado['tempos'][fase] - anterior
+            anterior = resultado['tempos'][fase]
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{titulo}: {duracao * 1000:.0f} ms"))
+            ranking = sorted(pacotes[fase].items(), key=lambda item: -item[1])[:options['top']]
+            for nome, micros in ranking:
+                self.stdout.write(f"  {micros / 1000:8.1f} ms  {nome}")
+            proprios = [(nome, m) for nome, m in modulos[fase] if nome.split('.')[0] in projeto]
+            if proprios:
+                self.stdout.write("  módulos do projeto (próprio / acumulado):")
+                for nome, (proprio, acumulado) in proprios:
+                    self.stdout.write(f"  {proprio / 1000:8.1f} / {acumulado / 1000:6.1f} ms  {nome}")
+
+        interpretador = total - (resultado['tempos']['requisicao'] - resultado['inicio'])
+        self.stdout.write(self.style.MIGRATE_HEADING("\nResumo"))
+        self.stdout.write(f"  início do Python:            {interpretador * 1000:7.0f} ms")
+        self.stdout.write(
+            f"  primeira resposta ({options['url']}): {resultado['status']}, {resultado['bytes']} bytes"
+        )
+        self.stdout.write(self.style.SUCCESS(f"  total até a primeira resposta: {total * 1000:.0f} ms"))
+
+    def importacoes(self, stderr):
+        """
+        Por fase: {pacote: microssegundos} das importações de primeiro nível
+        (o acumulado inclui tudo o que elas puxaram) e a lista de módulos com
+        (próprio, acumulado).
+        """
+        pacotes = defaultdict(lambda: defaultdict(int))
+        modulos = defaultdict(list)
+        fase = None
+        for linha in stderr.splitlines():
+            if linha.startswith('#fase '):
+                fase = linha.split()[1]
+                continue
+            encontrado = LINHA_IMPORTTIME.match(linha)
+            if not encontrado or fase is None:
+                continue
+            proprio, acumulado, recuo, nome = encontrado.groups()
+            modulos[fase].append((nome, (int(proprio), int(acumulado))))
+            if not recuo:
+                pacotes[fase][nome.split('.')[0]] += int(acumulado)
+        return pacotes, modulos
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from acervo import estatisticas, exportacao
+
+
+class Command(BaseCommand):
+    help = (
+        "Job noturno: passa os empréstimos vencidos para 'atrasado' (um UPDATE), atualiza os "
+        "contadores de atrasados e, com --saida, gera a lista de cobrança dos leitores em atraso."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--saida', metavar='ARQUIVO',
+            help="Grava a lista de leitores em atraso, com telefone (.csv ou .xlsx). "
+                 "'{data}' no nome vira a data de hoje.",
+        )
+        parser.add_argument('--turma', help="Só os leitores desta turma na lista.")
+
+    def handle(self, *args, **options):
+        hoje = timezone.localdate()
+        marcados = estatisticas.varrer_atrasados(hoje)
+        self.stdout.write(f"{marcados} empréstimo(s) passaram a atrasados.")
+
+        if options['saida']:
+            caminho = options['saida'].replace('{data}', hoje.isoformat())
+            params = {'turma': options['turma']} if options['turma'] else {}
+            try:
+                leitores = exportacao.gravar('atrasados', caminho, params)
+            except OSError as erro:
+                raise CommandError(str(erro))
+            self.stdout.write(f"{leitores} leitor(es) com atraso em {caminho}.")
+        self.stdout.write(self.style.SUCCESS("Virada do dia concluída."))
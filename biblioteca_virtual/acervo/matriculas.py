@@ -0,0 +1,169 @@
+# acervo/matriculas.py
+#
+# Sincronização dos leitores com a lista de matrículas do período letivo.
+# A lista (CSV ou XLSX, uma linha por aluno, chave 'matricula') é comparada
+# com o cadastro e vira um plano:
+#
+# - novos: matrículas que não existem -> criados;
+# - atualizados: turma/telefone diferentes -> atualizados;
+# - reativados: leitores inativos que voltaram à lista -> reativados;
+# - inativados: leitores ativos fora da lista e sem empréstimos em aberto;
+# - com_pendencias: fora da lista, mas com empréstimos em aberto -> continuam
+#   ativos (mesma regra do InativarLeitor).
+#
+# O plano sai de uma única leitura do cadastro, com a pendência de cada leitor
+# calculada no próprio SELECT (EXISTS correlacionado, que usa o índice parcial
+# de empréstimos abertos por leitor). Aplicar o plano são poucos comandos em
+# lote: um INSERT, um UPDATE em lote e um UPDATE ... WHERE NOT EXISTS, que
+# confere de novo a pendência no momento da escrita.
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import Leitor, Emprestimo
+from . import autocomplete, estatisticas
+from .importacao import ler_planilha
+
+TAMANHO_LOTE = 1000
+
+COLUNAS = {
+    'matricula': 'matricula',
+    'nome': 'nome',
+    'aluno': 'nome',
+    'turma': 'turma',
+    'telefone': 'telefone',
+}
+OBRIGATORIAS = ('matricula', 'nome')
+CAMPOS_ATUALIZADOS = ('turma', 'telefone')
+
+
+def _emprestimos_abertos():
+    return Emprestimo.objects.filter(leitor=OuterRef('pk'), data_devolucao_real__isnull=True)
+
+
+def ler_lista(arquivo, formato):
+    """
+    Lê a lista de matrículas. Retorna ({matricula: dados}, erros), com erros
+    no mesmo formato da importação de livros ({'linha', 'matricula', 'erro'}).
+    """
+    limites = {campo: Leitor._meta.get_field(campo).max_length for campo in COLUNAS.values()}
+    alunos = {}
+    linha_da_matricula = {}
+    erros = []
+    for numero, dados in ler_planilha(arquivo, formato, COLUNAS, OBRIGATORIAS):
+        matricula = dados.get('matricula', '')
+        faltando = [campo for campo in OBRIGATORIAS if not dados.get(campo)]
+        grandes = [campo for campo, valor in dados.items() if len(valor) > limites[campo]]
+        if faltando or grandes:
+            erro = ('Campos obrigatórios vazios: ' + ', '.join(faltando)) if faltando else (
+                'Valores acima do tamanho máximo: ' + ', '.join(grandes))
+            erros.append({'linha': numero, 'matricula': matricula, 'erro': erro})
+            continue
+        if matricula in alunos:
+            erros.append({
+                'linha': linha_da_matricula[matricula], 'matricula': matricula,
+                'erro': f'Matrícula repetida na lista; vale a linha {numero}.',
+            })
+        alunos[matricula] = {campo: dados.get(campo, '') for campo in COLUNAS.values()}
+        linha_da_matricula[matricula] = numero
+    return alunos, erros
+
+
+def planejar(alunos, turmas=None):
+    """
+    Compara a lista com o cadastro, sem alterar nada. Com 'turmas', só leitores
+    dessas turmas podem ser inativados (lista parcial, de algumas turmas).
+    Cada item do plano é um dicionário com 'matricula', 'nome' e, nos
+    atualizados, 'mudancas' = {campo: (antes, depois)}.
+    """
+    plano = {'novos': [], 'atualizados': [], 'reativados': [], 'inativados': [], 'com_pendencias': []}
+    cadastro = Leitor.objects.annotate(pendente=Exists(_emprestimos_abertos())).values_list(
+        'id', 'matricula', 'nome', 'turma', 'telefone', 'ativo', 'pendente'
+    )
+    vistos = set()
+    for pk, matricula, nome, turma, telefone, ativo, pendente in cadastro.iterator(chunk_size=TAMANHO_LOTE):
+        aluno = alunos.get(matricula)
+        if aluno is None:
+            if ativo and (turmas is None or turma in turmas):
+                destino = 'com_pendencias' if pendente else 'inativados'
+                plano[destino].append({'id': pk, 'matricula': matricula, 'nome': nome, 'turma': turma})
+            continue
+        vistos.add(matricula)
+        atuais = {'turma': turma, 'telefone': telefone}
+        # Célula vazia não apaga o que já está cadastrado
+        mudancas = {
+            campo: (atuais[campo], aluno[campo])
+            for campo in CAMPOS_ATUALIZADOS
+            if aluno[campo] and aluno[campo] != atuais[campo]
+        }
+        item = {'id': pk, 'matricula': matricula, 'nome': nome, 'mudancas': mudancas}
+        if not ativo:
+            plano['reativados'].append(item)
+        elif mudancas:
+            plano['atualizados'].append(item)
+
+    plano['novos'] = [aluno for matricula, aluno in alunos.items() if matricula not in vistos]
+    return plano
+
+
+def _em_lotes(itens):
+    for inicio in range(0, len(itens), TAMANHO_LOTE):
+        yield itens[inicio:inicio + TAMANHO_LOTE]
+
+
+@transaction.atomic
+def aplicar(plano):
+    """Executa um plano de 'planejar'. Retorna quantos leitores foram de fato inativados."""
+    Leitor.objects.bulk_create(
+        (Leitor(**aluno) for aluno in plano['novos']), batch_size=TAMANHO_LOTE
+    )
+
+    # bulk_update e update não passam pelo auto_now de 'atualizado_em'
+    agora = timezone.now()
+    alterados = []
+    for item in plano['atualizados'] + plano['reativados']:
+        leitor = Leitor(pk=item['id'], ativo=True, atualizado_em=agora)
+        for campo, (_, depois) in item['mudancas'].items():
+            setattr(leitor, campo, depois)
+        alterados.append((leitor, ['ativo', 'atualizado_em', *item['mudancas']]))
+    # Um UPDATE (com CASE por linha) para cada combinação de campos alterados
+    por_campos = {}
+    for leitor, campos in alterados:
+        por_campos.setdefault(tuple(campos), []).append(leitor)
+    for campos, leitores in por_campos.items():
+        Leitor.objects.bulk_update(leitores, campos, batch_size=TAMANHO_LOTE)
+
+    # A pendência é conferida de novo na escrita: um empréstimo feito depois do
+    # plano mantém o leitor ativo
+    inativados = 0
+    for lote in _em_lotes([item['id'] for item in plano['inativados']]):
+        inativados += (
+            Leitor.objects.filter(pk__in=lote, ativo=True)
+            .filter(~Exists(_emprestimos_abertos()))
+            .update(ativo=False, atualizado_em=agora)
+        )
+
+    estatisticas.ajustar(leitores_ativos=len(plano['novos']) + len(plano['reativados']) - inativados)
+    # Escritas em lote não disparam post_save: o autocomplete é avisado aqui
+    autocomplete.invalidar_leitores()
+    return inativados
+
+
+def sincronizar(arquivo, formato, turmas=None, simular=False):
+    """
+    Lê a lista, monta o plano e (a menos que 'simular') o aplica.
+    Retorna (plano, erros de leitura).
+    """
+    alunos, erros = ler_lista(arquivo, formato)
+    plano = planejar(alunos, turmas)
+    if not simular:
+        inativados = aplicar(plano)
+        if inativados < len(plano['inativados']):
+            # Leitores que pegaram livros entre o plano e a escrita
+            ids = set()
+            for lote in _em_lotes([item['id'] for item in plano['inativados']]):
+                ids.update(Leitor.objects.filter(pk__in=lote, ativo=True).values_list('id', flat=True))
+            plano['com_pendencias'] += [item for item in plano['inativados'] if item['id'] in ids]
+            plano['inativados'] = [item for item in plano['inativados'] if item['id'] not in ids]
+    return plano, erros
@@ -0,0 +1,243 @@
+# acervo/metricas.py
+#
+# Medição por requisição, leve o bastante para ficar ligada em produção.
+#
+# - MetricasMiddleware sorteia uma fração das requisições
+#   (ACERVO_METRICAS_AMOSTRAGEM, padrão 10%); as demais passam sem custo.
+# - Numa requisição sorteada são medidos: tempo total, número e tempo das
+#   consultas SQL (um execute_wrapper instalado em cada conexão), tempo de
+#   renderização de templates (backend DjangoTemplatesMedidos) e tamanho da
+#   resposta. A consulta mais repetida também é contada: dezenas da mesma SQL
+#   numa página é o sinal de um N+1.
+# - O resultado vai para o cabeçalho Server-Timing (aparece no DevTools), para
+#   uma linha JSON no logger 'acervo.metricas' e para uma janela das últimas
+#   amostras de cada view, de onde /metrics tira os percentis.
+#
+# A medição em andamento fica numa ContextVar, que acompanha a requisição
+# também nas views async (e nas chamadas ao ORM via sync_to_async). As janelas
+# são por processo: cada worker do Gunicorn mostra as suas amostras.
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_JANELA = 500
+PERCENTIS = (50, 90, 99)
+
+_medicao = ContextVar('acervo_medicao', default=None)
+
+
+def _amostragem():
+    return getattr(settings, 'ACERVO_METRICAS_AMOSTRAGEM', 0.1)
+
+
+class Medicao:
+    __slots__ = ('inicio', 'consultas', 'tempo_sql', 'tempo_template', 'profundidade_template', 'sqls')
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tempo_sql = 0.0
+        self.tempo_template = 0.0
+        self.profundidade_template = 0
+        self.sqls = Counter()
+
+
+# --- SQL ---
+
+def medir_sql(execute, sql, params, many, context):
+    medicao = _medicao.get()
+    if medicao is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicao.tempo_sql += time.perf_counter() - inicio
+        medicao.consultas += 1
+        medicao.sqls[sql] += 1
+
+
+def instalar_em_conexao(sender, connection, **kwargs):
+    """Receptor de connection_created: o wrapper fica na conexão enquanto ela existir."""
+    if medir_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(medir_sql)
+
+
+# --- Templates ---
+
+class _TemplateMedido(Template):
+    def render(self, context=None, request=None):
+        medicao = _medicao.get()
+        if medicao is None:
+            return super().render(context, request)
+        # Só a renderização mais externa conta (render_to_string dentro de uma tag não soma duas vezes)
+        medicao.profundidade_template += 1
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            medicao.profundidade_template -= 1
+            if not medicao.profundidade_template:
+                medicao.tempo_template += time.perf_counter() - inicio
+
+
+class DjangoTemplatesMedidos(DjangoTemplates):
+    """O backend padrão do Django, com o tempo de render() contado na medição corrente."""
+
+    def from_string(self, template_code):
+        return _TemplateMedido(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return _TemplateMedido(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+# --- Janelas e percentis ---
+
+class _Janelas:
+    """Últimas TAMANHO_JANELA amostras de cada view, deste processo."""
+
+    def __init__(self):
+        self.trava = threading.Lock()
+        self.amostras = {}
+        self.desde = time.time()
+
+    def registrar(self, view, amostra):
+        with self.trava:
+            janela = self.amostras.get(view)
+            if janela is None:
+                janela = self.amostras[view] = deque(maxlen=TAMANHO_JANELA)
+            janela.append(amostra)
+
+    def copiar(self):
+        with self.trava:
+            return {view: list(janela) for view, janela in self.amostras.items()}
+
+    def limpar(self):
+        with self.trava:
+            self.amostras.clear()
+            self.desde = time.time()
+
+
+janelas = _Janelas()
+
+
+def percentil(valores, p):
+    """Percentil pelo método do posto mais próximo ('valores' já ordenados)."""
+    if not valores:
+        return None
+    posicao = max(0, -(-len(valores) * p // 100) - 1)
+    return valores[posicao]
+
+
+def resumo():
+    """{view: {'amostras', métrica: {'p50', 'p90', 'p99'}}} das janelas deste processo."""
+    resultado = {}
+    for view, amostras in sorted(janelas.copiar().items()):
+        metricas = {'amostras': len(amostras)}
+        for campo in ('tempo_ms', 'sql', 'sql_ms', 'sql_repetidas', 'template_ms', 'bytes'):
+            valores = sorted(amostra[campo] for amostra in amostras if amostra[campo] is not None)
+            metricas[campo] = {f'p{p}': percentil(valores, p) for p in PERCENTIS}
+        resultado[view] = metricas
+    return resultado
+
+
+# --- Middleware ---
+
+def _nome_da_view(request):
+    rota = getattr(request, 'resolver_match', None)
+    if rota is None:
+        return '<sem rota>'
+    return rota.view_name or rota.route
+
+
+def _concluir(request, response, medicao):
+    tempo = time.perf_counter() - medicao.inicio
+    tamanho = None if response.streaming else len(response.content)
+    amostra = {
+        'tempo_ms': round(tempo * 1000, 2),
+        'sql': medicao.consultas,
+        'sql_ms': round(medicao.tempo_sql * 1000, 2),
+        'sql_repetidas': max(medicao.sqls.values(), default=0),
+        'template_ms': round(medicao.tempo_template * 1000, 2),
+        'bytes': tamanho,
+    }
+    view = _nome_da_view(request)
+    janelas.registrar(view, amostra)
+    response['Server-Timing'] = ', '.join([
+        f'app;dur={amostra["tempo_ms"]}',
+        f'sql;dur={amostra["sql_ms"]};desc="{medicao.consultas} consultas"',
+        f'tpl;dur={amostra["template_ms"]}',
+    ])
+    logger.info(json.dumps({
+        'view': view, 'metodo': request.method, 'status': response.status_code, **amostra,
+    }))
+
+
+class MetricasMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _sortear(self):
+        taxa = _amostragem()
+        return taxa >= 1 or (taxa > 0 and random.random() < taxa)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._sortear():
+            return self.get_response(request)
+        medicao = Medicao()
+        token = _medicao.set(medicao)
+        try:
+            response = self.get_response(request)
+        finally:
+            _medicao.reset(token)
+        _concluir(request, response, medicao)
+        return response
+
+    async def __acall__(self, request):
+        if not self._sortear():
+            return await self.get_response(request)
+        medicao = Medicao()
+        token = _medicao.set(medicao)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicao.reset(token)
+        _concluir(request, response, medicao)
+        return response
+
+
+@staff_member_required
+def metricas(request):
+    """Percentis das últimas amostras de cada view (só para a equipe)."""
+    return JsonResponse({
+        'processo': os.getpid(),
+        'desde': janelas.desde,
+        'amostragem': _amostragem(),
+        'janela': TAMANHO_JANELA,
+        'views': resumo(),
+    }, json_dumps_params={'ensure_ascii': False, 'indent': 2})
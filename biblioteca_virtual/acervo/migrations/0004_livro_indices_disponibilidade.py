@@ -0,0 +1,29 @@
+# Generated by Django 5.1.5 on 2026-10-18 15:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acervo', '0003_remove_livro_disponivel_livro_copias_disponiveis_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='livro',
+            index=models.Index(fields=['titulo', 'id'], name='livro_titulo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='livro',
+            index=models.Index(fields=['autor', 'titulo', 'id'], name='livro_autor_titulo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='livro',
+            index=models.Index(fields=['-copias_disponiveis', 'titulo', 'id'], name='livro_copias_titulo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='livro',
+            index=models.Index(condition=models.Q(('copias_disponiveis__gt', 0)), fields=['titulo', 'id'], name='livro_disponivel_titulo_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Índices de busca textual (GIN/tsvector no PostgreSQL, FTS5 no SQLite)
+
+from django.db import migrations
+
+
+def instalar(apps, schema_editor):
+    from acervo.busca import get_backend
+    get_backend(schema_editor.connection.alias).instalar(schema_editor.connection)
+
+
+def desinstalar(apps, schema_editor):
+    from acervo.busca import get_backend
+    get_backend(schema_editor.connection.alias).desinstalar(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acervo', '0004_livro_indices_disponibilidade'),
+    ]
+
+    operations = [
+        migrations.RunPython(instalar, desinstalar),
+    ]
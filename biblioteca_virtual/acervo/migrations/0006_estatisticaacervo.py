@@ -0,0 +1,28 @@
+# Generated by Django 5.1.5 on 2026-10-18 16:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acervo', '0005_busca_textual'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstatisticaAcervo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_livros', models.IntegerField(default=0)),
+                ('emprestimos_abertos', models.IntegerField(default=0)),
+                ('emprestimos_atrasados', models.IntegerField(default=0)),
+                ('leitores_ativos', models.IntegerField(default=0)),
+                ('atrasados_em', models.DateField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Estatística do Acervo',
+                'verbose_name_plural': 'Estatísticas do Acervo',
+            },
+        ),
+    ]
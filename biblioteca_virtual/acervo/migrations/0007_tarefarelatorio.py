@@ -0,0 +1,37 @@
+# Generated by Django 5.1.5 on 2026-10-18 16:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acervo', '0006_estatisticaacervo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TarefaRelatorio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filtros', models.JSONField(default=dict)),
+                ('chave', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('pendente', 'Na fila'), ('processando', 'Gerando'), ('concluido', 'Concluído'), ('erro', 'Erro')], default='pendente', max_length=20)),
+                ('pdf', models.BinaryField(blank=True, null=True)),
+                ('erro', models.TextField(blank=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True)),
+                ('concluido_em', models.DateTimeField(blank=True, null=True)),
+                ('solicitado_por', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='relatorios', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Tarefa de Relatório',
+                'verbose_name_plural': 'Tarefas de Relatório',
+                'indexes': [models.Index(fields=['status', 'criado_em'], name='relatorio_fila_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ['pendente', 'processando'])), fields=('chave',), name='relatorio_unico_em_andamento')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 16:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acervo', '0007_tarefarelatorio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estatisticaacervo',
+            name='versao_emprestimos',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
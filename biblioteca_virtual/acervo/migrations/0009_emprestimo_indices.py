@@ -0,0 +1,31 @@
+# Generated by Django 5.1.5 on 2026-10-18 16:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acervo', '0008_estatisticaacervo_versao_emprestimos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emprestimo',
+            index=models.Index(condition=models.Q(('data_devolucao_real__isnull', True)), fields=['data_devolucao_prevista'], name='emprestimo_abertos_prev_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emprestimo',
+            index=models.Index(condition=models.Q(('data_devolucao_real__isnull', True)), fields=['leitor', 'data_devolucao_prevista'], name='emprestimo_leitor_abertos_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emprestimo',
+            index=models.Index(fields=['-data_emprestimo', '-id'], name='emprestimo_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emprestimo',
+            index=models.Index(fields=['livro', '-data_emprestimo', '-id'], name='emprestimo_livro_data_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.1.5 on 2026-10-18 16:11
+
+from django.db import migrations, models
+from django.db.models import F, Func, OuterRef, Subquery, IntegerField
+from django.utils import timezone
+
+
+def _contagem(queryset):
+    return Subquery(
+        queryset.annotate(total=Func(F('id'), function='COUNT')).values('total'), output_field=IntegerField()
+    )
+
+
+def preencher_agregados(apps, schema_editor):
+    Livro = apps.get_model('acervo', 'Livro')
+    Leitor = apps.get_model('acervo', 'Leitor')
+    Emprestimo = apps.get_model('acervo', 'Emprestimo')
+    abertos = Emprestimo.objects.filter(leitor=OuterRef('pk'), data_devolucao_real__isnull=True).order_by()
+    Leitor.objects.update(
+        emprestimos_abertos=_contagem(abertos),
+        emprestimos_atrasados=_contagem(abertos.filter(data_devolucao_prevista__lt=timezone.localdate())),
+    )
+    do_livro = Emprestimo.objects.filter(livro=OuterRef('pk')).order_by()
+    Livro.objects.update(
+        total_emprestimos=_contagem(do_livro),
+        ultimo_emprestimo=Subquery(do_livro.order_by('-data_emprestimo').values('data_emprestimo')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acervo', '0009_emprestimo_indices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leitor',
+            name='emprestimos_abertos',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='leitor',
+            name='emprestimos_atrasados',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='livro',
+            name='total_emprestimos',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Total de Empréstimos'),
+        ),
+        migrations.AddField(
+            model_name='livro',
+            name='ultimo_emprestimo',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Último Empréstimo'),
+        ),
+        migrations.AddIndex(
+            model_name='livro',
+            index=models.Index(fields=['-total_emprestimos', 'titulo', 'id'], name='livro_populares_idx'),
+        ),
+        migrations.RunPython(preencher_agregados, migrations.RunPython.noop),
+    ]
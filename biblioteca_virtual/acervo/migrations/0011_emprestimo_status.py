@@ -0,0 +1,34 @@
+# Generated by Django 5.1.5 on 2026-10-18 16:34
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def preencher_status(apps, schema_editor):
+    Emprestimo = apps.get_model('acervo', 'Emprestimo')
+    Emprestimo.objects.filter(data_devolucao_real__isnull=False).update(status='devolvido')
+    Emprestimo.objects.filter(
+        data_devolucao_real__isnull=True, data_devolucao_prevista__lt=timezone.localdate()
+    ).update(status='atrasado')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acervo', '0010_agregados_emprestimos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emprestimo',
+            name='status',
+            field=models.CharField(choices=[('aberto', 'Emprestado'), ('atrasado', 'Atrasado'), ('devolvido', 'Devolvido')], default='aberto', editable=False, max_length=10),
+        ),
+        migrations.RunPython(preencher_status, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='emprestimo',
+            index=models.Index(condition=models.Q(('status', 'atrasado')), fields=['-data_emprestimo', '-id'], name='emprestimo_atrasados_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.5 on 2026-10-18 16:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acervo', '0011_emprestimo_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emprestimo',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='leitor',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='livro',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='emprestimo',
+            index=models.Index(fields=['atualizado_em', 'id'], name='emprestimo_atualizado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leitor',
+            index=models.Index(fields=['atualizado_em', 'id'], name='leitor_atualizado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='livro',
+            index=models.Index(fields=['atualizado_em', 'id'], name='livro_atualizado_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.5 on 2026-10-18 16:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acervo', '0012_atualizado_em'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmprestimoArquivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('data_emprestimo', models.DateField()),
+                ('data_devolucao_prevista', models.DateField()),
+                ('data_devolucao_real', models.DateField()),
+                ('status', models.CharField(choices=[('aberto', 'Emprestado'), ('atrasado', 'Atrasado'), ('devolvido', 'Devolvido')], default='devolvido', editable=False, max_length=10)),
+                ('arquivado_em', models.DateTimeField(auto_now_add=True)),
+                ('bibliotecario', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='emprestimos_arquivados', to=settings.AUTH_USER_MODEL)),
+                ('leitor', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='emprestimos_arquivados', to='acervo.leitor')),
+                ('livro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='emprestimos_arquivados', to='acervo.livro')),
+            ],
+            options={
+                'verbose_name': 'Empréstimo Arquivado',
+                'verbose_name_plural': 'Empréstimos Arquivados',
+                'indexes': [models.Index(fields=['-data_emprestimo', '-id'], name='arquivado_data_idx'), models.Index(fields=['livro', '-data_emprestimo', '-id'], name='arquivado_livro_data_idx'), models.Index(fields=['leitor', '-data_emprestimo', '-id'], name='arquivado_leitor_data_idx')],
+            },
+        ),
+    ]
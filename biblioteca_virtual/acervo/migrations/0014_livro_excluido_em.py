@@ -0,0 +1,22 @@
+# Generated by Django 5.1.5 on 2026-10-18 16:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acervo', '0013_emprestimoarquivado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='livro',
+            name='excluido_em',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Excluído em'),
+        ),
+        migrations.AddIndex(
+            model_name='livro',
+            index=models.Index(condition=models.Q(('excluido_em__isnull', False)), fields=['excluido_em'], name='livro_excluidos_idx'),
+        ),
+    ]
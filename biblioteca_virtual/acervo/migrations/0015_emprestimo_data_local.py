@@ -0,0 +1,19 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:17
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acervo', '0014_livro_excluido_em'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emprestimo',
+            name='data_emprestimo',
+            field=models.DateField(default=django.utils.timezone.localdate, editable=False),
+        ),
+    ]
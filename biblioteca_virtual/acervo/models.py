@@ -3,6 +3,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone 
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator 
 
 # ADICIONE O NOVO MODELO AQUI
@@ -12,11 +13,30 @@ class Leitor(models.Model):
     turma = models.CharField(max_length=50, blank=True)
     telefone = models.CharField(max_length=20, blank=True)
     ativo = models.BooleanField(default=True)
+    # Contadores mantidos por acervo/circulacao.py e acervo/estatisticas.py
+    # (reconstruídos com 'manage.py recalcular_agregados')
+    emprestimos_abertos = models.PositiveIntegerField(default=0, editable=False)
+    emprestimos_atrasados = models.PositiveIntegerField(default=0, editable=False)
+    # Última alteração dos campos expostos pela API (consulta ?changed_since=).
+    # UPDATEs em lote não passam pelo auto_now e gravam o campo explicitamente
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['atualizado_em', 'id'], name='leitor_atualizado_idx'),
+        ]
 
     def __str__(self):
         return self.nome
 
 
+class LivrosAtivosManager(models.Manager):
+    """Só os livros que não foram excluídos (ver acervo/exclusao.py)."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(excluido_em__isnull=True)
+
+
 class Livro(models.Model):
     titulo = models.CharField(max_length=200)
     autor = models.CharField(max_length=200)
@@ -35,13 +55,61 @@ class Livro(models.Model):
         validators=[MinValueValidator(0)],
         verbose_name="Cópias Disponíveis"
     )
+    # Popularidade, mantida junto com a contagem de cópias (ver acervo/circulacao.py)
+    total_emprestimos = models.PositiveIntegerField(default=0, editable=False, verbose_name="Total de Empréstimos")
+    ultimo_emprestimo = models.DateField(null=True, blank=True, editable=False, verbose_name="Último Empréstimo")
+    # Última alteração dos campos expostos pela API (ver Leitor.atualizado_em)
+    atualizado_em = models.DateTimeField(auto_now=True)
+    # Exclusão lógica: o livro sai do catálogo, mas o histórico de empréstimos
+    # fica até 'manage.py purgar_livros' (ver acervo/exclusao.py)
+    excluido_em = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Excluído em")
+
+    # O gerenciador padrão ignora os excluídos; 'todos' (e o acesso por
+    # chave estrangeira, como emprestimo.livro) também os enxerga
+    objects = LivrosAtivosManager()
+    todos = models.Manager()
 
     # REMOVA O CAMPO ANTIGO 'disponivel'
     # disponivel = models.BooleanField(default=True) <-- REMOVA ESTA LINHA
 
+    class Meta:
+        # Índices que atendem aos filtros e ordenações de 'lista_livros'
+        indexes = [
+            models.Index(fields=['titulo', 'id'], name='livro_titulo_idx'),
+            models.Index(fields=['autor', 'titulo', 'id'], name='livro_autor_titulo_idx'),
+            models.Index(fields=['-copias_disponiveis', 'titulo', 'id'], name='livro_copias_titulo_idx'),
+            models.Index(fields=['-total_emprestimos', 'titulo', 'id'], name='livro_populares_idx'),
+            # Índice parcial: só os livros com cópias na estante (filtro 'disponivel')
+            models.Index(
+                fields=['titulo', 'id'],
+                condition=models.Q(copias_disponiveis__gt=0),
+                name='livro_disponivel_titulo_idx',
+            ),
+            # Consulta de alterações da API (?changed_since=)
+            models.Index(fields=['atualizado_em', 'id'], name='livro_atualizado_idx'),
+            # Excluídos à espera da remoção física (índice parcial: são poucos)
+            models.Index(
+                fields=['excluido_em'],
+                condition=models.Q(excluido_em__isnull=False),
+                name='livro_excluidos_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.titulo
 
+    def validate_unique(self, exclude=None):
+        super().validate_unique(exclude)
+        # A checagem do Django usa o gerenciador padrão, que não enxerga os excluídos
+        if 'isbn' in (exclude or ()):
+            return
+        excluido = Livro.todos.filter(isbn=self.isbn, excluido_em__isnull=False).exclude(pk=self.pk).first()
+        if excluido is not None:
+            raise ValidationError({'isbn': (
+                f'Este ISBN é do livro "{excluido.titulo}", excluído em '
+                f'{timezone.localtime(excluido.excluido_em):%d/%m/%Y}. Ele pode ser restaurado pelo admin.'
+            )})
+
     # MÉTODO AUXILIAR (ÚTIL NO FUTURO)
     def tem_copias_disponiveis(self):
         return self.copias_disponiveis > 0
@@ -56,18 +124,175 @@ class Livro(models.Model):
 class Emprestimo(models.Model):
     livro = models.ForeignKey(Livro, on_delete=models.CASCADE)
     leitor = models.ForeignKey(Leitor, on_delete=models.PROTECT, related_name='emprestimos')
-    data_emprestimo = models.DateField(auto_now_add=True)
+    # Data local (TIME_ZONE), como o status e os contadores; o auto_now_add usaria o relógio do servidor
+    data_emprestimo = models.DateField(default=timezone.localdate, editable=False)
     data_devolucao_prevista = models.DateField()
     data_devolucao_real = models.DateField(null=True, blank=True)
     bibliotecario = models.ForeignKey(User, on_delete=models.PROTECT, related_name='emprestimos_realizados')
 
+    ABERTO = 'aberto'
+    ATRASADO = 'atrasado'
+    DEVOLVIDO = 'devolvido'
+    STATUS_CHOICES = [
+        (ABERTO, 'Emprestado'),
+        (ATRASADO, 'Atrasado'),
+        (DEVOLVIDO, 'Devolvido'),
+    ]
+    # Mantido pela circulação (empréstimo/devolução) e pela virada do dia, que
+    # passa os abertos vencidos para 'atrasado' (ver estatisticas.marcar_atrasados)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=ABERTO, editable=False)
+    # Última alteração dos campos expostos pela API (ver Leitor.atualizado_em)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
     def __str__(self):
         return f"{self.livro.titulo} emprestado para {self.leitor}"
-    
+
+    def calcular_status(self, hoje=None):
+        """Status que as datas indicam para 'hoje' (o valor que 'status' deve guardar)."""
+        if self.data_devolucao_real is not None:
+            return self.DEVOLVIDO
+        if self.data_devolucao_prevista < (hoje or timezone.localdate()):
+            return self.ATRASADO
+        return self.ABERTO
+
     @property
     def esta_atrasado(self):
-        # A condição só se aplica se o livro ainda não foi devolvido
-        if self.data_devolucao_real is None:
-            # Retorna True se a data de hoje for maior que a data de devolução prevista
-            return timezone.now().date() > self.data_devolucao_prevista
-        return False
\ No newline at end of file
+        # Lido do status gravado, sem consultar o relógio a cada linha listada
+        return self.status == self.ATRASADO
+
+    class Meta:
+        # Índices das consultas mais frequentes sobre empréstimos (dashboard,
+        # 'lista_emprestimos', inativação de leitor, relatório em PDF)
+        indexes = [
+            # Empréstimos em aberto por data prevista: contagem de atrasados
+            models.Index(
+                fields=['data_devolucao_prevista'],
+                condition=models.Q(data_devolucao_real__isnull=True),
+                name='emprestimo_abertos_prev_idx',
+            ),
+            # Empréstimos em aberto de um leitor
+            models.Index(
+                fields=['leitor', 'data_devolucao_prevista'],
+                condition=models.Q(data_devolucao_real__isnull=True),
+                name='emprestimo_leitor_abertos_idx',
+            ),
+            # Listagem (mais recentes primeiro) e filtros por período
+            models.Index(fields=['-data_emprestimo', '-id'], name='emprestimo_data_idx'),
+            # Histórico de um livro em 'detalhes_livro'
+            models.Index(fields=['livro', '-data_emprestimo', '-id'], name='emprestimo_livro_data_idx'),
+            # Filtro 'status=atrasado' de 'lista_emprestimos' (índice parcial: só os atrasados)
+            models.Index(
+                fields=['-data_emprestimo', '-id'],
+                condition=models.Q(status='atrasado'),
+                name='emprestimo_atrasados_idx',
+            ),
+            # Consulta de alterações da API (?changed_since=)
+            models.Index(fields=['atualizado_em', 'id'], name='emprestimo_atualizado_idx'),
+        ]
+
+class EmprestimoArquivado(models.Model):
+    """
+    Empréstimo devolvido há mais de ACERVO_ARQUIVO_MESES meses, movido da tabela
+    de empréstimos por 'manage.py arquivar_emprestimos'. Mantém o id original,
+    então a ordem (-data_emprestimo, -id) das listagens é a mesma de antes.
+    As leituras que juntam as duas tabelas ficam em acervo/historico.py.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    livro = models.ForeignKey(Livro, on_delete=models.CASCADE, related_name='emprestimos_arquivados')
+    leitor = models.ForeignKey(Leitor, on_delete=models.PROTECT, related_name='emprestimos_arquivados')
+    data_emprestimo = models.DateField()
+    data_devolucao_prevista = models.DateField()
+    data_devolucao_real = models.DateField()
+    bibliotecario = models.ForeignKey(User, on_delete=models.PROTECT, related_name='emprestimos_arquivados')
+    # Sempre 'devolvido'; existe para ter as mesmas colunas de Emprestimo
+    status = models.CharField(
+        max_length=10, choices=Emprestimo.STATUS_CHOICES, default=Emprestimo.DEVOLVIDO, editable=False
+    )
+    arquivado_em = models.DateTimeField(auto_now_add=True)
+
+    # Um empréstimo arquivado nunca está em aberto
+    esta_atrasado = False
+
+    class Meta:
+        verbose_name = "Empréstimo Arquivado"
+        verbose_name_plural = "Empréstimos Arquivados"
+        indexes = [
+            models.Index(fields=['-data_emprestimo', '-id'], name='arquivado_data_idx'),
+            models.Index(fields=['livro', '-data_emprestimo', '-id'], name='arquivado_livro_data_idx'),
+            models.Index(fields=['leitor', '-data_emprestimo', '-id'], name='arquivado_leitor_data_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.livro.titulo} emprestado para {self.leitor} (arquivado)"
+
+
+class EstatisticaAcervo(models.Model):
+    """
+    Linha única com os contadores do dashboard, mantidos incrementalmente
+    por acervo.estatisticas (ver 'ajustar' e 'emprestimo_alterado').
+    """
+    total_livros = models.IntegerField(default=0)
+    emprestimos_abertos = models.IntegerField(default=0)
+    emprestimos_atrasados = models.IntegerField(default=0)
+    leitores_ativos = models.IntegerField(default=0)
+    # Dia em que 'emprestimos_atrasados' foi calculado; muda de um dia para o outro
+    atrasados_em = models.DateField(null=True, blank=True)
+    # Incrementado a cada alteração em empréstimos (usado como chave de cache dos relatórios)
+    versao_emprestimos = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Estatística do Acervo"
+        verbose_name_plural = "Estatísticas do Acervo"
+
+    def __str__(self):
+        return "Estatísticas do acervo"
+
+
+class TarefaRelatorio(models.Model):
+    """
+    Pedido de relatório em PDF, processado fora da requisição pelo comando
+    'manage.py processar_relatorios' (ver acervo/relatorios.py).
+    """
+    PENDENTE = 'pendente'
+    PROCESSANDO = 'processando'
+    CONCLUIDO = 'concluido'
+    ERRO = 'erro'
+    STATUS_CHOICES = [
+        (PENDENTE, 'Na fila'),
+        (PROCESSANDO, 'Gerando'),
+        (CONCLUIDO, 'Concluído'),
+        (ERRO, 'Erro'),
+    ]
+
+    # Filtros normalizados da 'lista_emprestimos' e o hash deles (para evitar duplicatas)
+    filtros = models.JSONField(default=dict)
+    chave = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDENTE)
+    pdf = models.BinaryField(null=True, blank=True, editable=False)
+    erro = models.TextField(blank=True)
+    solicitado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='relatorios')
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Tarefa de Relatório"
+        verbose_name_plural = "Tarefas de Relatório"
+        indexes = [
+            models.Index(fields=['status', 'criado_em'], name='relatorio_fila_idx'),
+        ]
+        constraints = [
+            # Só pode haver um pedido em andamento para o mesmo conjunto de filtros
+            models.UniqueConstraint(
+                fields=['chave'],
+                condition=models.Q(status__in=['pendente', 'processando']),
+                name='relatorio_unico_em_andamento',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Relatório #{self.pk} ({self.get_status_display()})"
+
+    @property
+    def em_andamento(self):
+        return self.status in (self.PENDENTE, self.PROCESSANDO)
@@ -0,0 +1,284 @@
+# acervo/paginacao.py
+#
+# Paginação por cursor (keyset). Em vez de 'COUNT(*)' + 'OFFSET', cada página
+# continua a partir dos valores de ordenação da última linha vista, então a
+# página N custa o mesmo que a página 1 (desde que exista índice na ordenação).
+# paginar_juntos faz o mesmo sobre várias tabelas com a mesma ordenação.
+
+import base64
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+# Acima disso a contagem aproximada aparece como "1000+"
+LIMITE_CONTAGEM = 1000
+
+
+class _CodificadorCursor(DjangoJSONEncoder):
+    # O DjangoJSONEncoder corta os microssegundos, e o cursor precisa do valor
+    # exato (senão a última linha da página reaparece na seguinte)
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _codificar(valores, direcao):
+    dados = json.dumps({'v': valores, 'd': direcao}, cls=_CodificadorCursor)
+    return base64.urlsafe_b64encode(dados.encode()).decode()
+
+
+def _decodificar(cursor):
+    try:
+        dados = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return dados['v'], dados['d']
+    except (ValueError, KeyError, TypeError):
+        # Cursor inválido ou adulterado: volta para a primeira página
+        return None, None
+
+
+def _ordenacao(queryset):
+    """Campos de ordenação do queryset, sempre terminando na chave primária."""
+    campos = list(queryset.query.order_by) or ['pk']
+    nomes = [c.lstrip('-') for c in campos]
+    if 'pk' not in nomes and 'id' not in nomes:
+        # Desempate pela chave primária, na mesma direção do primeiro campo
+        campos.append('-pk' if campos[0].startswith('-') else 'pk')
+    return campos
+
+
+def _valor(obj, campo):
+    for parte in campo.lstrip('-').split('__'):
+        obj = getattr(obj, parte)
+    return obj
+
+
+def _filtro_keyset(campos, valores, invertido):
+    """
+    Monta (a > x) OR (a = x AND b > y) OR ... respeitando a direção de cada campo.
+    'invertido' é usado para buscar a página anterior.
+    """
+    filtro = Q()
+    iguais = {}
+    for campo, valor in zip(campos, valores):
+        nome = campo.lstrip('-')
+        descendente = campo.startswith('-') != invertido
+        lookup = 'lt' if descendente else 'gt'
+        filtro |= Q(**iguais, **{f'{nome}__{lookup}': valor})
+        iguais[nome] = valor
+    return filtro
+
+
+def contagem_aproximada(queryset):
+    """
+    Estimativa barata do total de resultados. No PostgreSQL usa a estimativa do
+    planejador (EXPLAIN, sem executar a consulta); nos outros bancos conta no
+    máximo LIMITE_CONTAGEM linhas. Retorna (numero, rotulo para exibir).
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        plano = json.loads(queryset.order_by().explain(format='json'))
+        total = int(plano[0]['Plan']['Plan Rows'])
+        return total, f'~{total}'
+    total = queryset.order_by()[:LIMITE_CONTAGEM + 1].count()
+    if total > LIMITE_CONTAGEM:
+        return LIMITE_CONTAGEM, f'{LIMITE_CONTAGEM}+'
+    return total, str(total)
+
+
+async def acontagem_aproximada(queryset):
+    """Versão assíncrona de contagem_aproximada."""
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        plano = json.loads(await queryset.order_by().aexplain(format='json'))
+        total = int(plano[0]['Plan']['Plan Rows'])
+        return total, f'~{total}'
+    total = await queryset.order_by()[:LIMITE_CONTAGEM + 1].acount()
+    if total > LIMITE_CONTAGEM:
+        return LIMITE_CONTAGEM, f'{LIMITE_CONTAGEM}+'
+    return total, str(total)
+
+
+class PaginadorEstimado(Paginator):
+    """
+    Paginator com OFFSET (o do admin) que, no PostgreSQL, não faz COUNT(*) de
+    tabelas grandes: acima de LIMITE_CONTAGEM o total é a estimativa do
+    planejador e as últimas páginas podem sobrar ou faltar. Nos outros bancos
+    (desenvolvimento) a contagem continua exata.
+    """
+
+    @cached_property
+    def count(self):
+        if connections[self.object_list.db].vendor == 'postgresql':
+            total, _ = contagem_aproximada(self.object_list)
+            if total >= LIMITE_CONTAGEM:
+                return total
+        return self.object_list.count()
+
+
+class PaginaCursor:
+    """Página de resultados com a mesma 'cara' do Page do Django usada nos templates."""
+
+    usa_cursor = True
+
+    def __init__(self, object_list, has_next, has_previous, cursor_proximo, cursor_anterior, request,
+                 total=None, total_rotulo=None):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.cursor_proximo = cursor_proximo
+        self.cursor_anterior = cursor_anterior
+        self.request = request
+        self.total = total
+        self.total_rotulo = total_rotulo
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def _url(self, cursor):
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        params['cursor'] = cursor
+        return '?' + params.urlencode()
+
+    def url_proxima(self):
+        return self._url(self.cursor_proximo)
+
+    def url_anterior(self):
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        params.pop('cursor', None)
+        if self.cursor_anterior is None:
+            return '?' + params.urlencode()
+        return self._url(self.cursor_anterior)
+
+
+def _preparar(request, queryset, por_pagina):
+    """
+    Consulta da página pedida em ?cursor=. Retorna (campos de ordenação,
+    queryset fatiado, direção), sem executar nada.
+    """
+    campos = _ordenacao(queryset)
+    queryset = queryset.order_by(*campos)
+    valores, direcao = _decodificar(request.GET.get('cursor', ''))
+
+    if not isinstance(valores, list) or len(valores) != len(campos):
+        return campos, queryset[:por_pagina + 1], None
+    try:
+        consulta = queryset.filter(_filtro_keyset(campos, valores, invertido=direcao == 'a'))
+    except (ValidationError, ValueError, TypeError):
+        # Valores que não servem para os campos (cursor adulterado): primeira página
+        return campos, queryset[:por_pagina + 1], None
+    if direcao == 'a':
+        # Página anterior: percorre a ordenação ao contrário e desinverte no final
+        invertidos = [c[1:] if c.startswith('-') else f'-{c}' for c in campos]
+        return campos, consulta.order_by(*invertidos)[:por_pagina + 1], 'a'
+    return campos, consulta[:por_pagina + 1], 'p'
+
+
+def _montar(request, campos, linhas, direcao, por_pagina, total=None, total_rotulo=None):
+    if direcao == 'a':
+        has_previous = len(linhas) > por_pagina
+        linhas = linhas[:por_pagina][::-1]
+        has_next = True
+    else:
+        has_next = len(linhas) > por_pagina
+        linhas = linhas[:por_pagina]
+        has_previous = direcao is not None
+
+    cursor_proximo = cursor_anterior = None
+    if linhas and has_next:
+        cursor_proximo = _codificar([_valor(linhas[-1], c) for c in campos], 'p')
+    if linhas and has_previous:
+        cursor_anterior = _codificar([_valor(linhas[0], c) for c in campos], 'a')
+
+    return PaginaCursor(linhas, has_next, has_previous, cursor_proximo, cursor_anterior, request,
+                        total=total, total_rotulo=total_rotulo)
+
+
+def paginar_por_cursor(request, queryset, por_pagina, contar=False):
+    """
+    Pagina 'queryset' (que já deve estar ordenado) a partir de ?cursor=.
+    Com contar=True a página traz uma contagem aproximada do total.
+    """
+    campos, consulta, direcao = _preparar(request, queryset, por_pagina)
+    linhas = list(consulta)
+    total = total_rotulo = None
+    if contar:
+        total, total_rotulo = contagem_aproximada(queryset)
+    return _montar(request, campos, linhas, direcao, por_pagina, total, total_rotulo)
+
+
+async def apaginar_por_cursor(request, queryset, por_pagina, contar=False):
+    """Versão assíncrona de paginar_por_cursor, para as views async."""
+    campos, consulta, direcao = _preparar(request, queryset, por_pagina)
+    linhas = [obj async for obj in consulta]
+    total = total_rotulo = None
+    if contar:
+        total, total_rotulo = await acontagem_aproximada(queryset)
+    return _montar(request, campos, linhas, direcao, por_pagina, total, total_rotulo)
+
+
+def _intercalar(campos, listas, direcao):
+    """Junta as linhas de consultas com a mesma ordenação numa lista, nessa ordem."""
+    linhas = [linha for lista in listas for linha in lista]
+    # Ordenações estáveis do último campo para o primeiro equivalem a ordenar pela tupla
+    for campo in reversed(campos):
+        descendente = campo.startswith('-') != (direcao == 'a')
+        linhas.sort(key=lambda obj, campo=campo: _valor(obj, campo), reverse=descendente)
+    return linhas
+
+
+def _somar_contagens(contagens):
+    total = sum(numero for numero, _ in contagens)
+    rotulos = [rotulo for _, rotulo in contagens]
+    if any(rotulo.endswith('+') for rotulo in rotulos):
+        return total, f'{total}+'
+    if any(rotulo.startswith('~') for rotulo in rotulos):
+        return total, f'~{total}'
+    return total, str(total)
+
+
+def paginar_juntos(request, querysets, por_pagina, contar=False):
+    """
+    Pagina várias consultas com a mesma ordenação (ex.: empréstimos e arquivo,
+    ver acervo/historico.py) como se fossem uma só: cada uma busca no máximo
+    uma página a partir do cursor e as linhas são intercaladas em Python.
+    """
+    preparados = [_preparar(request, queryset, por_pagina) for queryset in querysets]
+    campos, _, direcao = preparados[0]
+    linhas = _intercalar(campos, [list(consulta) for _, consulta, _ in preparados], direcao)
+    total = total_rotulo = None
+    if contar:
+        total, total_rotulo = _somar_contagens([contagem_aproximada(queryset) for queryset in querysets])
+    return _montar(request, campos, linhas, direcao, por_pagina, total, total_rotulo)
+
+
+async def apaginar_juntos(request, querysets, por_pagina, contar=False):
+    """Versão assíncrona de paginar_juntos, para as views async."""
+    preparados = [_preparar(request, queryset, por_pagina) for queryset in querysets]
+    campos, _, direcao = preparados[0]
+    listas = [[obj async for obj in consulta] for _, consulta, _ in preparados]
+    linhas = _intercalar(campos, listas, direcao)
+    total = total_rotulo = None
+    if contar:
+        total, total_rotulo = _somar_contagens([await acontagem_aproximada(queryset) for queryset in querysets])
+    return _montar(request, campos, linhas, direcao, por_pagina, total, total_rotulo)
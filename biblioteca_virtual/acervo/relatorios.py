@@ -0,0 +1,226 @@
+# acervo/relatorios.py
+#
+# Geração assíncrona do relatório de empréstimos em PDF. A view apenas
+# registra uma TarefaRelatorio; o comando 'manage.py processar_relatorios'
+# pega as tarefas da fila e gera o PDF com o WeasyPrint, deixando os workers
+# web livres para os empréstimos.
+#
+# O custo de layout do WeasyPrint cresce mais que linearmente com o tamanho da
+# tabela, então relatórios grandes são divididos em partes de LINHAS_POR_PARTE
+# linhas, renderizadas em paralelo num pool de processos e unidas com o PyPDF2.
+# PDFs prontos são reaproveitados enquanto os empréstimos não mudarem.
+
+import hashlib
+import io
+import json
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Emprestimo, TarefaRelatorio
+from . import estatisticas, filtros, historico
+
+logger = logging.getLogger(__name__)
+
+# Parâmetros da 'lista_emprestimos' que influenciam o relatório
+PARAMETROS = ('q', 'data_inicio', 'data_fim', 'status')
+
+# Tarefas 'processando' há mais tempo que isso são consideradas abandonadas
+# (worker reiniciado no meio da geração) e voltam para a fila
+TEMPO_MAXIMO_PROCESSAMENTO = timedelta(minutes=30)
+# Relatórios prontos ficam disponíveis para download (e como cache) por este período
+RETENCAO = timedelta(days=7)
+
+LINHAS_POR_PARTE = 500
+
+
+def normalizar_filtros(params):
+    """Somente os parâmetros relevantes, sem espaços e sem valores vazios."""
+    normalizados = {}
+    for nome in PARAMETROS:
+        valor = (params.get(nome) or '').strip()
+        if valor:
+            normalizados[nome] = valor
+    return normalizados
+
+
+def chave_filtros(filtros_normalizados):
+    """
+    Identifica o conteúdo do relatório: filtros + versão da tabela de empréstimos.
+    Se o resultado tiver empréstimos em aberto, o dia também entra na chave,
+    porque o status "Atrasado" depende da data de hoje.
+    """
+    chave = dict(filtros_normalizados)
+    chave['_versao'] = estatisticas.versao_emprestimos()
+    if filtros.filtrar_emprestimos(filtros_normalizados).filter(data_devolucao_real__isnull=True).exists():
+        chave['_dia'] = timezone.localdate().isoformat()
+    texto = json.dumps(chave, sort_keys=True)
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+
+def solicitar(params, usuario):
+    """
+    Coloca um relatório na fila. Se o mesmo relatório já foi gerado (e nada
+    mudou desde então) devolve o pronto; se já existe um pedido em andamento
+    com os mesmos filtros, devolve esse pedido em vez de criar outro.
+    """
+    filtros_normalizados = normalizar_filtros(params)
+    chave = chave_filtros(filtros_normalizados)
+    pronta = (
+        TarefaRelatorio.objects.defer('pdf')
+        .filter(chave=chave, status=TarefaRelatorio.CONCLUIDO)
+        .order_by('-concluido_em')
+        .first()
+    )
+    if pronta is not None:
+        return pronta
+    em_andamento = TarefaRelatorio.objects.filter(
+        chave=chave, status__in=[TarefaRelatorio.PENDENTE, TarefaRelatorio.PROCESSANDO]
+    )
+    tarefa = em_andamento.first()
+    if tarefa is not None:
+        return tarefa
+    try:
+        with transaction.atomic():
+            return TarefaRelatorio.objects.create(
+                filtros=filtros_normalizados, chave=chave, solicitado_por=usuario
+            )
+    except IntegrityError:
+        # Outro clique criou o mesmo pedido ao mesmo tempo (restrição única parcial)
+        return em_andamento.first()
+
+
+def _iniciar_processo():
+    # Em plataformas sem 'fork' o processo filho começa do zero
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def renderizar_parte(emprestimos, primeira):
+    """Renderiza um pedaço da tabela. Roda nos processos do pool (sem acesso ao banco)."""
+    # Importado só aqui: o WeasyPrint (pango, fontTools, pydyf) é pesado e só
+    # o worker de relatórios precisa dele, não os workers web
+    from weasyprint import HTML
+
+    # Renderiza um template HTML com os dados filtrados
+    html_string = render_to_string(
+        'acervo/partials/_relatorio_pdf.html', {'emprestimos': emprestimos, 'primeira_parte': primeira}
+    )
+    # Cria o PDF a partir do HTML
+    return HTML(string=html_string).write_pdf()
+
+
+def _partes(params):
+    """Lê os empréstimos em lotes e devolve listas de LINHAS_POR_PARTE linhas já prontas para o template."""
+    campos = (
+        'livro__titulo', 'leitor__nome', 'leitor__matricula',
+        'data_emprestimo', 'data_devolucao_prevista', 'data_devolucao_real', 'status',
+    )
+    parte = []
+    linhas = historico.valores(historico.emprestimos(params), *campos, tamanho_lote=LINHAS_POR_PARTE)
+    for titulo, nome, matricula, emprestimo, prevista, devolucao, status in linhas:
+        parte.append({
+            'livro': {'titulo': titulo},
+            'leitor': {'nome': nome, 'matricula': matricula},
+            'data_emprestimo': emprestimo,
+            'data_devolucao_prevista': prevista,
+            'data_devolucao_real': devolucao,
+            'esta_atrasado': status == Emprestimo.ATRASADO,
+        })
+        if len(parte) == LINHAS_POR_PARTE:
+            yield parte
+            parte = []
+    if parte:
+        yield parte
+
+
+def _varias_partes(params):
+    """Se o relatório passa de uma parte (lê no máximo LINHAS_POR_PARTE + 1 ids de cada tabela)."""
+    lidos = sum(len(consulta.values_list('id')[:LINHAS_POR_PARTE + 1]) for consulta in historico.emprestimos(params))
+    return lidos > LINHAS_POR_PARTE
+
+
+def gerar_pdf(params):
+    """Renderiza o relatório de empréstimos para os filtros informados."""
+    from PyPDF2 import PdfMerger
+
+    if not _varias_partes(params):
+        return renderizar_parte(next(_partes(params), []), True)
+
+    processos = getattr(settings, 'ACERVO_RELATORIO_PROCESSOS', None) or min(4, os.cpu_count() or 1)
+    # As conexões abertas não podem ser herdadas pelos processos filhos
+    connections.close_all()
+    juncao = PdfMerger()
+    with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_processo) as pool:
+        # Com 'fork' o pool cria todos os processos no primeiro submit: isso
+        # acontece aqui, antes de a leitura das partes abrir uma conexão
+        pool.submit(os.getpid).result()
+        # As partes são lidas conforme a renderização avança: no máximo
+        # 2 * processos ficam na fila, e as linhas nunca estão todas na memória
+        pendentes = deque()
+        for indice, parte in enumerate(_partes(params)):
+            pendentes.append(pool.submit(renderizar_parte, parte, indice == 0))
+            if len(pendentes) >= 2 * processos:
+                juncao.append(io.BytesIO(pendentes.popleft().result()))
+        while pendentes:
+            juncao.append(io.BytesIO(pendentes.popleft().result()))
+    saida = io.BytesIO()
+    juncao.write(saida)
+    return saida.getvalue()
+
+
+def pegar_proxima():
+    """
+    Reserva a tarefa pendente mais antiga para este worker. A reserva é um
+    UPDATE condicional: se dois workers pegarem a mesma tarefa, só um vence.
+    """
+    while True:
+        tarefa_id = (
+            TarefaRelatorio.objects.filter(status=TarefaRelatorio.PENDENTE)
+            .order_by('criado_em', 'id')
+            .values_list('id', flat=True)
+            .first()
+        )
+        if tarefa_id is None:
+            return None
+        reservadas = TarefaRelatorio.objects.filter(pk=tarefa_id, status=TarefaRelatorio.PENDENTE).update(
+            status=TarefaRelatorio.PROCESSANDO, iniciado_em=timezone.now()
+        )
+        if reservadas:
+            return TarefaRelatorio.objects.get(pk=tarefa_id)
+
+
+def processar(tarefa):
+    try:
+        pdf = gerar_pdf(tarefa.filtros)
+    except Exception as erro:
+        logger.exception("Falha ao gerar o relatório #%s", tarefa.pk)
+        TarefaRelatorio.objects.filter(pk=tarefa.pk).update(
+            status=TarefaRelatorio.ERRO, erro=str(erro), concluido_em=timezone.now()
+        )
+        return False
+    TarefaRelatorio.objects.filter(pk=tarefa.pk).update(
+        status=TarefaRelatorio.CONCLUIDO, pdf=pdf, concluido_em=timezone.now()
+    )
+    return True
+
+
+def manutencao():
+    """Devolve à fila tarefas abandonadas e apaga relatórios antigos."""
+    agora = timezone.now()
+    reenfileiradas = TarefaRelatorio.objects.filter(
+        status=TarefaRelatorio.PROCESSANDO, iniciado_em__lt=agora - TEMPO_MAXIMO_PROCESSAMENTO
+    ).update(status=TarefaRelatorio.PENDENTE, iniciado_em=None)
+    apagadas, _ = TarefaRelatorio.objects.filter(
+        status__in=[TarefaRelatorio.CONCLUIDO, TarefaRelatorio.ERRO], concluido_em__lt=agora - RETENCAO
+    ).delete()
+    return reenfileiradas, apagadas
@@ -0,0 +1,8 @@
+# acervo/sinais.py
+
+from django.dispatch import Signal
+
+# Enviado quando a contagem de cópias muda por UPDATE direto no banco (os
+# UPDATEs condicionais da circulação não passam por save() e não disparam
+# post_save). Argumento: livro_ids.
+copias_alteradas = Signal()
@@ -1,3 +1,1172 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from functools import partial
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.session import SessionStorage
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction, OperationalError
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import EstatisticaAcervo, Livro, Leitor, Emprestimo, EmprestimoArquivado, TarefaRelatorio
+from . import (
+    autocomplete, busca, circulacao, estatisticas, exclusao, exportacao, filtros, forms, historico, importacao, matriculas,
+    metricas, relatorios, urls,
+)
+from .paginacao import paginar_juntos, paginar_por_cursor
+
+
+def criar_livro(**kwargs):
+    dados = {
+        'titulo': 'Dom Casmurro',
+        'autor': 'Machado de Assis',
+        'editora': 'Garnier',
+        'ano_publicacao': 1899,
+        'isbn': '9788535910667',
+        'numero_copias': 1,
+        'copias_disponiveis': 1,
+    }
+    dados.update(kwargs)
+    return Livro.objects.create(**dados)
+
+
+def criar_leitor(**kwargs):
+    dados = {'nome': 'Ana Souza', 'matricula': '2024001', 'turma': '3A'}
+    dados.update(kwargs)
+    return Leitor.objects.create(**dados)
+
+
+class CirculacaoTests(TestCase):
+
+    def setUp(self):
+        self.bibliotecario = User.objects.create_user('bibliotecaria', password='senha')
+        self.livro = criar_livro(numero_copias=2, copias_disponiveis=2)
+        self.leitor = criar_leitor()
+        self.prevista = timezone.localdate() + timedelta(days=7)
+
+    def test_emprestar_retira_uma_copia(self):
+        emprestimo = circulacao.emprestar(self.livro, self.leitor, self.prevista, self.bibliotecario)
+        self.livro.refresh_from_db()
+        self.assertEqual(self.livro.copias_disponiveis, 1)
+        self.assertEqual(emprestimo.bibliotecario, self.bibliotecario)
+
+    def test_emprestar_sem_copias_nao_cria_emprestimo(self):
+        Livro.objects.filter(pk=self.livro.pk).update(copias_disponiveis=0)
+        with self.assertRaises(circulacao.SemCopiasDisponiveis):
+            circulacao.emprestar(self.livro, self.leitor, self.prevista, self.bibliotecario)
+        self.assertFalse(Emprestimo.objects.exists())
+
+    def test_devolver_duas_vezes(self):
+        emprestimo = circulacao.emprestar(self.livro, self.leitor, self.prevista, self.bibliotecario)
+        circulacao.devolver(emprestimo)
+        with self.assertRaises(circulacao.EmprestimoJaDevolvido):
+            circulacao.devolver(Emprestimo.objects.get(pk=emprestimo.pk))
+        self.livro.refresh_from_db()
+        self.assertEqual(self.livro.copias_disponiveis, 2)
+
+    def test_datas_sao_as_do_fuso_do_projeto(self):
+        # Um fuso em que agora já é outro dia que em UTC (ou ainda é o anterior)
+        fuso = 'Etc/GMT-14' if timezone.now().hour >= 10 else 'Etc/GMT+12'
+        with override_settings(TIME_ZONE=fuso):
+            hoje = timezone.localdate()
+            self.assertNotEqual(hoje, timezone.now().date())
+            emprestimo = circulacao.emprestar(self.livro, self.leitor, hoje, self.bibliotecario)
+            self.assertEqual((emprestimo.data_emprestimo, emprestimo.status), (hoje, Emprestimo.ABERTO))
+            circulacao.devolver(emprestimo)
+            lote = circulacao.emprestar(self.livro, self.leitor, hoje, self.bibliotecario)
+            circulacao.devolver_em_lote(emprestimo_ids=[lote.pk])
+        self.assertEqual(set(Emprestimo.objects.values_list('data_devolucao_real', flat=True)), {hoje})
+        self.livro.refresh_from_db()
+        self.assertEqual(self.livro.ultimo_emprestimo, hoje)
+
+
+class CirculacaoLoteTests(TestCase):
+
+    def setUp(self):
+        self.bibliotecario = User.objects.create_user('bibliotecaria', password='senha')
+        self.prevista = timezone.localdate() + timedelta(days=7)
+
+    def test_emprestar_em_lote_respeita_copias_por_livro(self):
+        livro = criar_livro(numero_copias=2, copias_disponiveis=2)
+        leitores = [criar_leitor(matricula=f'M{i}', turma='5B') for i in range(3)]
+        resultados = circulacao.emprestar_em_lote(
+            [(livro, leitor) for leitor in leitores], self.prevista, self.bibliotecario
+        )
+        self.assertEqual([r['ok'] for r in resultados], [True, True, False])
+        livro.refresh_from_db()
+        self.assertEqual(livro.copias_disponiveis, 0)
+        self.assertEqual(Emprestimo.objects.count(), 2)
+
+    def test_devolver_em_lote_por_isbn(self):
+        livro = criar_livro(numero_copias=2, copias_disponiveis=2)
+        outro = criar_livro(isbn='9788572326972', titulo='Vidas Secas')
+        leitor = criar_leitor()
+        circulacao.emprestar_em_lote([(livro, leitor), (livro, leitor)], self.prevista, self.bibliotecario)
+        resultados = circulacao.devolver_em_lote(isbns=[livro.isbn, livro.isbn, livro.isbn, outro.isbn])
+        self.assertEqual([r['ok'] for r in resultados], [True, True, False, False])
+        livro.refresh_from_db()
+        self.assertEqual(livro.copias_disponiveis, 2)
+        self.assertFalse(Emprestimo.objects.filter(data_devolucao_real__isnull=True).exists())
+
+
+class AgregadosTests(TestCase):
+
+    def setUp(self):
+        self.bibliotecario = User.objects.create_user('bibliotecaria', password='senha')
+        self.livro = criar_livro(numero_copias=3, copias_disponiveis=3)
+        self.leitor = criar_leitor()
+        self.hoje = timezone.localdate()
+
+    def test_contadores_acompanham_emprestimos_e_devolucoes(self):
+        atrasado = circulacao.emprestar(self.livro, self.leitor, self.hoje - timedelta(days=1), self.bibliotecario)
+        circulacao.emprestar_em_lote([(self.livro, self.leitor)], self.hoje + timedelta(days=7), self.bibliotecario)
+        self.leitor.refresh_from_db()
+        self.livro.refresh_from_db()
+        self.assertEqual((self.leitor.emprestimos_abertos, self.leitor.emprestimos_atrasados), (2, 1))
+        self.assertEqual((self.livro.total_emprestimos, self.livro.ultimo_emprestimo), (2, self.hoje))
+
+        circulacao.devolver(atrasado)
+        circulacao.devolver_em_lote(isbns=[self.livro.isbn])
+        self.leitor.refresh_from_db()
+        self.assertEqual((self.leitor.emprestimos_abertos, self.leitor.emprestimos_atrasados), (0, 0))
+
+    def test_edicao_do_leitor_nao_desfaz_um_emprestimo_concorrente(self):
+        admin = User.objects.create_superuser('admin', password='senha')
+        self.client.force_login(admin)
+        form = forms.LeitorForm({'nome': 'Ana S.', 'matricula': '2024001', 'turma': '3B'}, instance=self.leitor)
+        # Empréstimo feito enquanto as páginas de edição estavam abertas
+        circulacao.emprestar(self.livro, Leitor.objects.get(pk=self.leitor.pk), self.hoje, self.bibliotecario)
+        form.save()
+        self.client.post(reverse('admin:acervo_leitor_change', args=[self.leitor.pk]), {
+            'nome': 'Ana Souza', 'matricula': '2024001', 'turma': '3B', 'telefone': '', 'ativo': 'on',
+        })
+        self.leitor.refresh_from_db()
+        self.assertEqual((self.leitor.nome, self.leitor.turma, self.leitor.emprestimos_abertos), ('Ana Souza', '3B', 1))
+
+    def test_recalcular_agregados(self):
+        circulacao.emprestar(self.livro, self.leitor, self.hoje - timedelta(days=1), self.bibliotecario)
+        Leitor.objects.update(emprestimos_abertos=9, emprestimos_atrasados=9)
+        Livro.objects.update(total_emprestimos=0, ultimo_emprestimo=None)
+        estatisticas.recalcular_agregados()
+        self.leitor.refresh_from_db()
+        self.livro.refresh_from_db()
+        self.assertEqual((self.leitor.emprestimos_abertos, self.leitor.emprestimos_atrasados), (1, 1))
+        self.assertEqual((self.livro.total_emprestimos, self.livro.ultimo_emprestimo), (1, self.hoje))
+
+
+class StatusEmprestimoTests(TestCase):
+
+    def setUp(self):
+        self.bibliotecario = User.objects.create_user('bibliotecaria', password='senha')
+        self.livro = criar_livro(numero_copias=3, copias_disponiveis=3)
+        self.leitor = criar_leitor(telefone='81 99999-0000')
+        self.hoje = timezone.localdate()
+
+    def test_status_acompanha_circulacao_e_virada_do_dia(self):
+        vencido = circulacao.emprestar(self.livro, self.leitor, self.hoje - timedelta(days=1), self.bibliotecario)
+        vence_hoje = circulacao.emprestar(self.livro, self.leitor, self.hoje, self.bibliotecario)
+        self.assertEqual((vencido.status, vence_hoje.status), (Emprestimo.ATRASADO, Emprestimo.ABERTO))
+        circulacao.devolver(vencido)
+        self.assertEqual(Emprestimo.objects.get(pk=vencido.pk).status, Emprestimo.DEVOLVIDO)
+
+        estatisticas.recalcular()
+        amanha = self.hoje + timedelta(days=1)
+        with self.assertNumQueries(6):  # existência, virada condicional, status e leitores (+ savepoint)
+            self.assertEqual(estatisticas.varrer_atrasados(amanha), 1)
+        self.assertEqual(estatisticas.varrer_atrasados(amanha), 0)  # o dia já virou
+        self.assertEqual(list(filtros.filtrar_emprestimos({'status': 'atrasado'})), [vence_hoje])
+        self.leitor.refresh_from_db()
+        self.assertEqual(self.leitor.emprestimos_atrasados, 1)
+
+    def test_devolucao_de_emprestimo_vencido_desde_a_ultima_virada(self):
+        # Vencidos depois da virada do dia: o status e os contadores ainda não foram atualizados
+        self.client.force_login(self.bibliotecario)
+        estatisticas.recalcular()
+        emprestimos = [
+            circulacao.emprestar(self.livro, self.leitor, self.hoje, self.bibliotecario) for _ in range(3)
+        ]
+        Emprestimo.objects.update(data_devolucao_prevista=self.hoje - timedelta(days=1))
+        self.assertEqual(Emprestimo.objects.filter(status=Emprestimo.ABERTO).count(), 3)
+
+        response = self.client.get(reverse('devolver_livro', args=[emprestimos[0].pk]))
+        self.assertEqual(response.status_code, 302)
+        circulacao.devolver_em_lote(emprestimo_ids=[emprestimos[1].pk])
+        exclusao.excluir(Livro.objects.filter(pk=self.livro.pk))
+        call_command('purgar_livros', dias=0, stdout=io.StringIO())
+
+        self.leitor.refresh_from_db()
+        self.assertEqual((self.leitor.emprestimos_abertos, self.leitor.emprestimos_atrasados), (0, 0))
+        estatistica = EstatisticaAcervo.objects.get()
+        self.assertEqual((estatistica.emprestimos_abertos, estatistica.emprestimos_atrasados), (0, 0))
+
+    def test_lista_de_cobranca_tem_uma_linha_por_leitor(self):
+        ontem = self.hoje - timedelta(days=1)
+        circulacao.emprestar_em_lote([(self.livro, self.leitor), (self.livro, self.leitor)], ontem, self.bibliotecario)
+        circulacao.emprestar(self.livro, criar_leitor(matricula='2024002'), self.hoje, self.bibliotecario)
+        cabecalho, gerar_linhas = exportacao.EXPORTACOES['atrasados']
+        linhas = list(gerar_linhas({}))
+        self.assertEqual(len(linhas), 1)
+        self.assertEqual(linhas[0][:5], ('2024001', 'Ana Souza', '3A', '81 99999-0000', 2))
+        self.assertEqual(linhas[0][-1], 1)
+
+
+class PainelTests(TestCase):
+
+    def setUp(self):
+        self.bibliotecario = User.objects.create_user('bibliotecaria', password='senha')
+        self.client.force_login(self.bibliotecario)
+        self.livros = [criar_livro(numero_copias=2, copias_disponiveis=2, isbn=f'978853591000{i}') for i in range(2)]
+        self.leitores = [criar_leitor(matricula=f'2024{i:03d}') for i in range(2)]
+        self.hoje = timezone.localdate()
+        estatisticas.recalcular()
+
+    def conferir(self):
+        """Os números do painel, mantidos por ajustes, batem com um recálculo do zero (desfeito em seguida)."""
+        cache.clear()
+        painel = self.client.get(reverse('dashboard')).context
+        with transaction.atomic():
+            esperado = estatisticas.recalcular()
+            transaction.set_rollback(True)
+        self.assertEqual(
+            (painel['total_livros'], painel['livros_emprestados'], painel['emprestimos_atrasados'], painel['total_leitores_ativos']),
+            (esperado.total_livros, esperado.emprestimos_abertos, esperado.emprestimos_atrasados, esperado.leitores_ativos),
+        )
+        return painel
+
+    def test_painel_bate_com_o_recalculo_apos_circulacao_e_virada_do_dia(self):
+        self.client.post(reverse('adicionar_livro'), {
+            'titulo': 'Vidas Secas', 'autor': 'Graciliano Ramos', 'editora': 'Record', 'ano_publicacao': 1938,
+            'isbn': '9788501000001', 'numero_copias': 1,
+        })
+        self.client.post(reverse('adicionar_leitor'), {'nome': 'Bruno Lima', 'matricula': '2024009', 'turma': '1B'})
+        novo = Livro.objects.get(isbn='9788501000001')
+        vence_hoje = circulacao.emprestar(self.livros[0], self.leitores[0], self.hoje, self.bibliotecario)
+        vencido = circulacao.emprestar(self.livros[1], self.leitores[1], self.hoje - timedelta(days=1), self.bibliotecario)
+        circulacao.emprestar_em_lote([(novo, self.leitores[0])], self.hoje + timedelta(days=7), self.bibliotecario)
+        painel = self.conferir()
+        self.assertEqual((painel['total_livros'], painel['livros_emprestados'], painel['emprestimos_atrasados']), (3, 3, 1))
+
+        self.client.get(reverse('devolver_livro', args=[vencido.pk]))
+        circulacao.devolver_em_lote(isbns=[novo.isbn])
+        self.client.post(reverse('inativar_leitor', args=[Leitor.objects.get(matricula='2024009').pk]))
+        painel = self.conferir()
+        self.assertEqual((painel['livros_emprestados'], painel['emprestimos_atrasados'], painel['total_leitores_ativos']), (1, 0, 2))
+
+        # Virada na primeira leitura do painel do dia seguinte
+        amanha = self.hoje + timedelta(days=1)
+        with mock.patch.object(estatisticas, '_hoje', return_value=amanha):
+            self.assertEqual(self.conferir()['emprestimos_atrasados'], 1)
+            circulacao.devolver(Emprestimo.objects.get(pk=vence_hoje.pk))
+            circulacao.emprestar(self.livros[0], self.leitores[1], amanha, self.bibliotecario)
+            self.assertEqual(self.conferir()['emprestimos_atrasados'], 0)
+
+        # E no job noturno, antes de qualquer leitura
+        depois = amanha + timedelta(days=1)
+        with mock.patch.object(estatisticas, '_hoje', return_value=depois):
+            self.assertEqual(estatisticas.varrer_atrasados(), 1)
+            self.assertEqual(self.conferir()['emprestimos_atrasados'], 1)
+
+
+class ArquivoEmprestimosTests(TestCase):
+
+    def setUp(self):
+        self.bibliotecario = User.objects.create_user('bibliotecaria', password='senha')
+        self.client.force_login(self.bibliotecario)
+        self.livro = criar_livro(numero_copias=10, copias_disponiveis=10)
+        self.leitor = criar_leitor()
+        hoje = timezone.localdate()
+        # 7 empréstimos: os 5 primeiros devolvidos há dois anos, os outros ainda abertos
+        for numero in range(7):
+            emprestimo = circulacao.emprestar(self.livro, self.leitor, hoje + timedelta(days=7), self.bibliotecario)
+            if numero < 5:
+                circulacao.devolver(emprestimo)
+        antigos = Emprestimo.objects.filter(data_devolucao_real__isnull=False)
+        antigos.update(data_emprestimo=hoje - timedelta(days=760), data_devolucao_real=hoje - timedelta(days=750))
+        self.ordem = list(Emprestimo.objects.order_by('-data_emprestimo', '-id').values_list('id', flat=True))
+
+    def test_arquiva_em_lotes_e_o_historico_continua_igual(self):
+        call_command('arquivar_emprestimos', lote=2, stdout=io.StringIO())
+        self.assertEqual(Emprestimo.objects.count(), 2)
+        self.assertEqual(EmprestimoArquivado.objects.count(), 5)
+
+        campos = ('livro__titulo', 'leitor__nome', 'status')
+        linhas = list(historico.valores(historico.emprestimos({}), 'id', *campos))
+        self.assertEqual([linha[0] for linha in linhas], self.ordem)
+        self.assertEqual(linhas[-1][1:], ('Dom Casmurro', 'Ana Souza', 'devolvido'))
+        self.assertEqual(len(historico.emprestimos({'status': 'pendente'})), 1)  # o arquivo nem é consultado
+
+        # Páginas de 3 atravessando as duas tabelas, para frente e de volta
+        def pagina(cursor):
+            request = RequestFactory().get('/', {'cursor': cursor} if cursor else {})
+            return paginar_juntos(request, historico.do_livro(self.livro), 3)
+
+        ids, atual = [], pagina(None)
+        ids += [emprestimo.id for emprestimo in atual]
+        while atual.has_next():
+            atual = pagina(atual.cursor_proximo)
+            ids += [emprestimo.id for emprestimo in atual]
+        self.assertEqual(ids, self.ordem)
+        self.assertEqual([emprestimo.id for emprestimo in pagina(atual.cursor_anterior)], self.ordem[3:6])
+
+        response = self.client.get(reverse('detalhes_livro', args=[self.livro.pk]))
+        self.assertEqual(len(response.context['page_obj']), 7)
+        self.assertEqual(self.client.get(reverse('lista_emprestimos'), {'status': 'devolvido'}).context['page_obj'].total, 5)
+
+        estatisticas.recalcular_agregados()
+        self.livro.refresh_from_db()
+        self.assertEqual(self.livro.total_emprestimos, 7)
+
+    def test_limite_do_arquivo_em_meses(self):
+        self.assertEqual(historico.limite_arquivo(1, date(2025, 3, 31)), date(2025, 2, 28))
+        self.assertEqual(historico.limite_arquivo(14, date(2025, 1, 15)), date(2023, 11, 15))
+
+
+class ExclusaoLivrosTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.bibliotecario = User.objects.create_user('bibliotecaria', password='senha', is_staff=True, is_superuser=True)
+        self.client.force_login(self.bibliotecario)
+        self.livro = criar_livro(numero_copias=10, copias_disponiveis=10)
+        self.leitor = criar_leitor()
+        hoje = timezone.localdate()
+        for _ in range(5):
+            circulacao.devolver(circulacao.emprestar(self.livro, self.leitor, hoje + timedelta(days=7), self.bibliotecario))
+        estatisticas.recalcular()
+
+    def test_excluir_so_marca_e_mantem_o_historico(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.post(reverse('excluir_livro', args=[self.livro.pk]))
+        self.assertEqual(sum(sql['sql'].startswith('DELETE') for sql in consultas.captured_queries), 0)
+
+        self.assertFalse(Livro.objects.filter(pk=self.livro.pk).exists())
+        self.assertIsNotNone(Livro.todos.get(pk=self.livro.pk).excluido_em)
+        self.assertEqual(EstatisticaAcervo.objects.get().total_livros, 0)
+        self.assertEqual(len(self.client.get(reverse('lista_livros'), {'q': 'Casmurro'}).context['page_obj']), 0)
+        # O histórico continua, inclusive na busca pelo título
+        self.assertEqual(self.client.get(reverse('lista_emprestimos')).context['page_obj'].total, 5)
+        self.assertEqual(self.client.get(reverse('lista_emprestimos'), {'q': 'Casmurro'}).context['page_obj'].total, 5)
+
+        # O ISBN continua reservado, e o admin restaura
+        form = forms.LivroForm(data={**{campo: getattr(self.livro, campo) for campo in forms.LivroForm.Meta.fields}})
+        self.assertIn('isbn', form.errors)
+        self.client.post(reverse('admin:acervo_livro_changelist') + '?situacao=excluidos', {
+            'action': 'restaurar_livros', '_selected_action': [self.livro.pk],
+        })
+        self.assertTrue(Livro.objects.filter(pk=self.livro.pk).exists())
+        self.assertEqual(EstatisticaAcervo.objects.get().total_livros, 1)
+
+    def test_copia_emprestada_volta_ao_livro_excluido(self):
+        livro = criar_livro(isbn='9788572326972', titulo='Vidas Secas', numero_copias=2, copias_disponiveis=2)
+        emprestimos = [
+            circulacao.emprestar(livro, self.leitor, timezone.localdate(), self.bibliotecario) for _ in range(2)
+        ]
+        exclusao.excluir(Livro.objects.filter(pk=livro.pk))
+        circulacao.devolver(emprestimos[0])
+        circulacao.devolver_em_lote(emprestimo_ids=[emprestimos[1].pk])
+        exclusao.restaurar(Livro.todos.filter(pk=livro.pk))
+        livro.refresh_from_db()
+        self.assertEqual((livro.copias_disponiveis, livro.numero_copias), (2, 2))
+
+        # O recálculo também alcança os excluídos e corrige as cópias
+        exclusao.excluir(Livro.objects.filter(pk=livro.pk))
+        Livro.todos.filter(pk=livro.pk).update(copias_disponiveis=0, total_emprestimos=0)
+        estatisticas.recalcular_agregados(livros=[livro.pk])
+        livro = Livro.todos.get(pk=livro.pk)
+        self.assertEqual((livro.copias_disponiveis, livro.total_emprestimos), (2, 2))
+
+    def test_purga_em_lotes_so_depois_do_prazo(self):
+        # 2 dos 5 empréstimos no arquivo: a purga limpa as duas tabelas
+        antigos = Emprestimo.objects.order_by('id').values_list('id', flat=True)[:2]
+        Emprestimo.objects.filter(id__in=list(antigos)).update(data_devolucao_real=date(2020, 1, 10))
+        call_command('arquivar_emprestimos', stdout=io.StringIO())
+        self.assertEqual(EmprestimoArquivado.objects.count(), 2)
+        exclusao.excluir(Livro.objects.filter(pk=self.livro.pk))
+
+        call_command('purgar_livros', stdout=io.StringIO())  # ainda dentro dos 30 dias
+        self.assertTrue(Livro.todos.filter(pk=self.livro.pk).exists())
+
+        saida = io.StringIO()
+        call_command('purgar_livros', dias=0, lote=2, verbosity=2, stdout=saida)
+        self.assertIn('Dom Casmurro: 5 empréstimo(s)', saida.getvalue())
+        self.assertFalse(Livro.todos.filter(pk=self.livro.pk).exists())
+        self.assertFalse(Emprestimo.objects.exists())
+        self.assertFalse(EmprestimoArquivado.objects.exists())
+
+
+class CacheCatalogoTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.livro = criar_livro()
+        self.url = reverse('lista_livros')
+
+    def test_visitante_anonimo_nao_consulta_o_banco_no_acerto(self):
+        self.client.get(self.url, {'q': 'dom', 'ordem': 'titulo'})
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'ordem': 'titulo', 'q': 'dom'})
+        self.assertContains(response, 'Dom Casmurro')
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.url, {'q': 'dom', 'ordem': 'titulo'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    @override_settings(MESSAGE_STORAGE='django.contrib.messages.storage.session.SessionStorage')
+    def test_mensagem_na_sessao_nao_vai_para_o_cache(self):
+        request = RequestFactory().get(self.url)
+        request.session = self.client.session
+        mensagens = SessionStorage(request)
+        mensagens.add(messages.SUCCESS, 'Até logo!')
+        mensagens.update(HttpResponse())
+        request.session.save()
+
+        self.assertContains(self.client.get(self.url), 'Até logo!')
+        self.assertNotContains(self.client_class().get(self.url), 'Até logo!')
+        self.assertNotContains(self.client.get(self.url), 'Até logo!')  # exibida uma vez só
+
+    def test_emprestimo_invalida_o_catalogo(self):
+        self.assertContains(self.client.get(self.url), '1 / 1')
+        usuario = User.objects.create_user('bibliotecaria', password='senha')
+        with self.captureOnCommitCallbacks(execute=True):
+            circulacao.emprestar(self.livro, criar_leitor(), timezone.localdate(), usuario)
+        self.assertContains(self.client.get(self.url), '0 / 1')
+
+
+class BuscaTests(TestCase):
+
+    def setUp(self):
+        self.historias = criar_livro(titulo='Histórias Extraordinárias', autor='Edgar Allan Poe', isbn='9788535911121')
+        self.memorias = criar_livro(titulo='Memórias Póstumas de Brás Cubas', isbn='9788535910682')
+
+    def titulos(self, termo):
+        return list(busca.buscar_livros(Livro.objects.all(), termo).values_list('titulo', flat=True))
+
+    def test_ignora_acentos_e_maiusculas(self):
+        self.assertEqual(self.titulos('historias'), ['Histórias Extraordinárias'])
+        self.assertEqual(self.titulos('MEMORIAS postumas'), ['Memórias Póstumas de Brás Cubas'])
+        leitor = criar_leitor(nome='João Conceição')
+        encontrados = busca.buscar_leitores(Leitor.objects.all(), 'joao conceicao')
+        self.assertEqual([encontrado.pk for encontrado in encontrados], [leitor.pk])
+
+    def test_cada_palavra_e_buscada_como_prefixo(self):
+        self.assertEqual(self.titulos('histor'), ['Histórias Extraordinárias'])
+        self.assertEqual(self.titulos('mem bra'), ['Memórias Póstumas de Brás Cubas'])
+        self.assertEqual(self.titulos('ma'), ['Memórias Póstumas de Brás Cubas'])  # Machado de Assis
+        self.assertEqual(self.titulos('istorias'), [])  # só prefixo, não trecho do meio
+        self.assertEqual(self.titulos('!!'), [])
+
+    def test_resultados_mais_relevantes_primeiro(self):
+        criar_livro(titulo='Uma História do Brasil Colonial e Imperial', autor='Vários', isbn='9788535900001')
+        criar_livro(titulo='História da História', autor='Vários', isbn='9788535900002')
+        ordenados = filtros.filtrar_livros({'q': 'historia'})
+        self.assertEqual(
+            [livro.titulo for livro in ordenados],
+            ['História da História', 'Histórias Extraordinárias', 'Uma História do Brasil Colonial e Imperial'],
+        )
+        relevancias = [livro.relevancia for livro in ordenados]
+        self.assertEqual(relevancias, sorted(relevancias, reverse=True))
+
+    @skipUnless(connection.vendor == 'sqlite', 'índice FTS5 só existe no SQLite')
+    def test_indice_fts_acompanha_insercao_edicao_e_exclusao(self):
+        def indexados(termo):
+            # Direto na tabela FTS: o filtro por id em buscar_livros esconderia
+            # uma entrada esquecida no índice de um livro apagado
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT rowid FROM acervo_livro_fts WHERE acervo_livro_fts MATCH %s",
+                    [busca.get_backend()._consulta(termo)],
+                )
+                return [rowid for rowid, in cursor.fetchall()]
+
+        livro = criar_livro(titulo='Vidas Secas', autor='Graciliano Ramos', isbn='9788501000001')
+        self.assertEqual(indexados('graciliano'), [livro.pk])
+        self.assertEqual(self.titulos('vidas'), ['Vidas Secas'])
+
+        livro.titulo = 'São Bernardo'
+        livro.save()
+        self.assertEqual(indexados('vidas'), [])
+        self.assertEqual(self.titulos('sao bernardo'), ['São Bernardo'])
+        Livro.objects.filter(pk=livro.pk).update(autor='G. Ramos')  # sem passar pelo save()
+        self.assertEqual(indexados('graciliano'), [])
+        self.assertEqual(indexados('ramos'), [livro.pk])
+
+        Livro.todos.filter(pk=livro.pk).delete()
+        self.assertEqual(indexados('bernardo'), [])
+        self.assertEqual(indexados('ramos'), [])
+        self.assertEqual(indexados('historias'), [self.historias.pk])
+
+
+class FiltrosLivrosTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.esgotado = criar_livro(titulo='A Hora da Estrela', isbn='9788532508126', numero_copias=2,
+                                    copias_disponiveis=0, total_emprestimos=5)
+        self.parcial = criar_livro(titulo='Capitães da Areia', isbn='9788535914061', numero_copias=3,
+                                   copias_disponiveis=1, total_emprestimos=9)
+        self.inteiro = criar_livro(titulo='Vidas Secas', isbn='9788501000001', numero_copias=2,
+                                   copias_disponiveis=2, total_emprestimos=0)
+
+    def ids(self, **params):
+        return [livro.pk for livro in filtros.filtrar_livros(params)]
+
+    def test_status_pela_disponibilidade(self):
+        self.assertEqual(self.ids(status='disponivel'), [self.parcial.pk, self.inteiro.pk])
+        self.assertEqual(self.ids(status='emprestado'), [self.esgotado.pk])
+        self.assertEqual(self.ids(status='parcial'), [self.parcial.pk])
+        self.assertEqual(self.ids(status='qualquer'), [self.esgotado.pk, self.parcial.pk, self.inteiro.pk])
+
+    def test_ordenacoes(self):
+        self.assertEqual(self.ids(ordem='disponibilidade'), [self.inteiro.pk, self.parcial.pk, self.esgotado.pk])
+        self.assertEqual(self.ids(ordem='populares'), [self.parcial.pk, self.esgotado.pk, self.inteiro.pk])
+        self.assertEqual(self.ids(ordem='populares', status='disponivel'), [self.parcial.pk, self.inteiro.pk])
+        # Sem termo de busca não há relevância: volta para o título
+        self.assertEqual(self.ids(ordem='relevancia'), [self.esgotado.pk, self.parcial.pk, self.inteiro.pk])
+
+        # A lista do catálogo usa os mesmos filtros
+        response = self.client.get(reverse('lista_livros'), {'status': 'disponivel', 'ordem': 'disponibilidade'})
+        self.assertEqual([livro.pk for livro in response.context['page_obj']], [self.inteiro.pk, self.parcial.pk])
+
+
+class PaginacaoCursorTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('bibliotecaria', password='senha')
+        # Autores e títulos repetidos: vários livros só se distinguem pelo id
+        for i in range(7):
+            criar_livro(titulo=f'Título {i % 3}', autor=f'Autor {i % 2}', isbn=f'97800000000{i:02d}')
+        self.ids = list(Livro.objects.order_by('autor', 'titulo', 'id').values_list('id', flat=True))
+
+    def pagina(self, queryset, cursor=None):
+        request = RequestFactory().get('/', {'cursor': cursor} if cursor else {})
+        return paginar_por_cursor(request, queryset, 2)
+
+    def test_proximas_e_anteriores_com_empates_na_ordenacao(self):
+        for ordenacao, esperado in [
+            (('autor', 'titulo'), self.ids),
+            # Todos empatados no único campo: desempata o '-pk' acrescentado
+            (('-numero_copias',), sorted(self.ids, reverse=True)),
+        ]:
+            with self.subTest(ordenacao=ordenacao):
+                queryset = Livro.objects.order_by(*ordenacao)
+                paginas = [self.pagina(queryset)]
+                while paginas[-1].has_next():
+                    paginas.append(self.pagina(queryset, paginas[-1].cursor_proximo))
+                ids = [[livro.pk for livro in pagina] for pagina in paginas]
+                self.assertEqual(ids, [esperado[i:i + 2] for i in range(0, 7, 2)])
+                self.assertEqual([pagina.has_previous() for pagina in paginas], [False, True, True, True])
+
+                # De volta, a partir da última página
+                atual, voltando = paginas[-1], []
+                while atual.has_previous():
+                    atual = self.pagina(queryset, atual.cursor_anterior)
+                    voltando.append([livro.pk for livro in atual])
+                self.assertEqual(voltando, ids[-2::-1])
+                self.assertTrue(atual.has_next())
+
+    def test_cursor_adulterado_volta_para_a_primeira_pagina(self):
+        self.client.force_login(self.usuario)
+        circulacao.emprestar(Livro.objects.first(), criar_leitor(), timezone.localdate(), self.usuario)
+
+        def codificar(dados):
+            return base64.urlsafe_b64encode(json.dumps(dados).encode()).decode()
+
+        cursores = [
+            'lixo', 'çã', codificar('texto'), codificar([1, 2]), codificar({'v': 5, 'd': 'p'}),
+            codificar({'v': 'ab', 'd': 'p'}), codificar({'v': ['abc', 'x'], 'd': 'p'}),
+            codificar({'v': [None, None], 'd': 'a'}), codificar({'v': [[1], {'a': 1}], 'd': 'p'}),
+        ]
+        paginas = {
+            reverse('lista_livros'): lambda response: [livro.pk for livro in response.context['page_obj']],
+            reverse('lista_emprestimos'): lambda response: [emprestimo.pk for emprestimo in response.context['page_obj']],
+            reverse('v1:livro-list'): lambda response: [item['id'] for item in response.json()['results']],
+            reverse('v1:emprestimo-list'): lambda response: [item['id'] for item in response.json()['results']],
+        }
+        for url, ids in paginas.items():
+            primeira = ids(self.client.get(url))
+            for cursor in cursores:
+                with self.subTest(url=url, cursor=cursor):
+                    response = self.client.get(url, {'cursor': cursor})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(ids(response), primeira)
+
+
+class AutocompleteTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('bibliotecaria', password='senha')
+        self.client.force_login(self.usuario)
+        self.livro = criar_livro()
+
+    def test_termo_repetido_usa_o_lru_e_o_etag(self):
+        url = reverse('search_livros')
+        response = self.client.get(url, {'term': 'Dom'})
+        self.assertEqual(response.json()[0]['id'], self.livro.pk)
+        with self.assertNumQueries(2):  # só sessão e usuário
+            repetida = self.client.get(url, {'term': ' dom  '}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repetida.status_code, 304)
+
+    def test_emprestimo_tira_o_livro_esgotado_da_lista(self):
+        self.assertNotEqual(autocomplete.livros('dom')[0], b'[]')
+        with self.captureOnCommitCallbacks(execute=True):
+            circulacao.emprestar(self.livro, criar_leitor(), timezone.localdate(), self.usuario)
+        self.assertEqual(autocomplete.livros('dom')[0], b'[]')
+
+    async def test_views_async_usam_o_mesmo_lru(self):
+        resultado = await autocomplete.alivros('dom')
+        self.assertIn(b'Dom Casmurro', resultado[0])
+        self.assertIs(await sync_to_async(autocomplete.livros)(' DOM '), resultado)
+
+
+@override_settings(ACERVO_METRICAS_AMOSTRAGEM=1)
+class MetricasTests(TestCase):
+
+    def setUp(self):
+        metricas.janelas.limpar()
+        self.usuario = User.objects.create_user('bibliotecaria', password='senha')
+        self.client.force_login(self.usuario)
+        criar_livro()
+
+    def test_requisicao_medida_gera_server_timing_log_e_percentis(self):
+        with self.assertLogs('acervo.metricas') as logs, CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('lista_livros'))
+        total = len(consultas)  # a próxima requisição limpa o log de consultas
+        self.assertIn(f'desc="{total} consultas"', response['Server-Timing'])
+        self.assertIn('tpl;dur=', response['Server-Timing'])
+        self.assertIn('"view": "lista_livros"', logs.output[0])
+
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 302)  # só equipe
+        self.usuario.is_staff = True
+        self.usuario.save()
+        with self.assertLogs('acervo.metricas'):
+            views = self.client.get(reverse('metricas')).json()['views']
+        self.assertEqual(views['lista_livros']['amostras'], 1)
+        self.assertEqual(views['lista_livros']['sql']['p99'], total)
+        self.assertGreater(views['lista_livros']['template_ms']['p50'], 0)
+
+    @override_settings(ACERVO_METRICAS_AMOSTRAGEM=0)
+    def test_requisicao_fora_da_amostra_nao_e_medida(self):
+        response = self.client.get(reverse('lista_livros'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(metricas.resumo(), {})
+
+
+class ExportacaoTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('bibliotecaria', password='senha')
+        self.livro = criar_livro(numero_copias=3, copias_disponiveis=3)
+        hoje = timezone.localdate()
+        self.emprestimos = [
+            circulacao.emprestar(self.livro, criar_leitor(matricula=f'M{i}'), hoje, self.usuario) for i in range(3)
+        ]
+        circulacao.devolver(self.emprestimos[0])
+
+    @mock.patch.object(exportacao, 'PARTES_POR_ENVIO', 2)
+    async def test_no_asgi_o_corpo_e_lido_aos_poucos_pelo_event_loop(self):
+        lidas = []
+
+        def partes():
+            for parte in range(5):
+                lidas.append(parte)
+                yield parte
+
+        corpo = exportacao._iterar_em_thread(partes())
+        self.assertEqual(await anext(corpo), 0)
+        self.assertEqual(lidas, [0, 1])  # só o primeiro lote
+
+        await self.async_client.aforce_login(self.usuario)
+        for formato in ('csv', 'xlsx'):
+            with self.subTest(formato=formato), warnings.catch_warnings():
+                # "StreamingHttpResponse must consume synchronous iterators..." vira erro
+                warnings.simplefilter('error')
+                response = await self.async_client.get(reverse('exportar', args=['emprestimos', formato]))
+                self.assertTrue(response.is_async)
+                conteudo = b''.join([parte async for parte in response])
+                if formato == 'csv':
+                    self.assertEqual(len(conteudo.decode('utf-8-sig').splitlines()), 4)
+                else:
+                    self.assertTrue(conteudo.startswith(b'PK'))
+
+    def test_xlsx_com_os_filtros_da_lista_de_emprestimos(self):
+        from openpyxl import load_workbook
+
+        params = {'status': 'devolvido'}
+        response = exportacao.exportar('emprestimos', 'xlsx', params)
+        planilha = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        linhas = list(planilha.active.iter_rows(values_only=True))
+        response.close()
+
+        cabecalho, _ = exportacao.EXPORTACOES['emprestimos']
+        self.assertEqual(list(linhas[0]), cabecalho)
+        self.client.force_login(self.usuario)
+        listados = self.client.get(reverse('lista_emprestimos'), params).context['page_obj']
+        self.assertEqual([linha[0] for linha in linhas[1:]], [emprestimo.pk for emprestimo in listados])
+        self.assertEqual(
+            (linhas[1][0], linhas[1][3], linhas[1][-1]), (self.emprestimos[0].pk, 'Ana Souza', 'Devolvido')
+        )
+
+    def test_no_wsgi_o_corpo_continua_sincrono(self):
+        self.client.force_login(self.usuario)
+        response = self.client.get(reverse('exportar', args=['emprestimos', 'csv']))
+        self.assertFalse(response.is_async)
+        self.assertEqual(len(b''.join(response.streaming_content).decode('utf-8-sig').splitlines()), 4)
+
+
+class ImportacaoTests(TestCase):
+
+    def importar(self, texto, **kwargs):
+        return importacao.importar(io.BytesIO(texto.encode()), 'csv', **kwargs)
+
+    def test_cria_atualiza_e_relata_erros(self):
+        livro = criar_livro(numero_copias=3, copias_disponiveis=1)
+        estatisticas.recalcular()
+        resumo = self.importar(
+            'Título;Autor;Editora;Ano;ISBN;Cópias Totais\n'
+            'Dom Casmurro;Machado de Assis;Garnier;1899;978-85-359-1066-7;5\n'
+            'Iracema;José de Alencar;Ática;1865;8508040571;2\n'
+            'Sem ISBN válido;Autor;Editora;2000;1234567890123;1\n',
+            tamanho_lote=1,
+        )
+        self.assertEqual((resumo['criados'], resumo['atualizados']), (1, 1))
+        self.assertEqual([erro['linha'] for erro in resumo['erros']], [4])
+
+        livro.refresh_from_db()
+        # Duas cópias a mais no total: as emprestadas continuam emprestadas
+        self.assertEqual((livro.numero_copias, livro.copias_disponiveis), (5, 3))
+        self.assertEqual(Livro.objects.get(isbn='8508040571').copias_disponiveis, 2)
+        self.assertEqual(EstatisticaAcervo.objects.get().total_livros, 2)
+
+    def test_cabecalho_sem_colunas_obrigatorias(self):
+        with self.assertRaises(importacao.ErroImportacao):
+            self.importar('titulo,autor\nDom Casmurro,Machado de Assis\n')
+
+
+class SincronizacaoLeitoresTests(TestCase):
+
+    def setUp(self):
+        self.bibliotecario = User.objects.create_user('bibliotecaria', password='senha')
+        self.mantido = criar_leitor(matricula='1', turma='1A')
+        self.formado = criar_leitor(matricula='2', nome='Bruno')
+        self.devendo = criar_leitor(matricula='3', nome='Carla')
+        self.inativo = criar_leitor(matricula='4', nome='Davi', ativo=False)
+        livro = criar_livro()
+        circulacao.emprestar(livro, self.devendo, timezone.localdate(), self.bibliotecario)
+        estatisticas.recalcular()
+        self.lista = (
+            'Matrícula,Nome,Turma,Telefone\n'
+            '1,Ana Souza,2A,\n'
+            '4,Davi,2B,\n'
+            '5,Eva,2A,9999-0000\n'
+        )
+
+    def sincronizar(self, **kwargs):
+        return matriculas.sincronizar(io.BytesIO(self.lista.encode()), 'csv', **kwargs)
+
+    def test_simular_nao_grava(self):
+        plano, erros = self.sincronizar(simular=True)
+        self.assertEqual(erros, [])
+        self.assertEqual([a['matricula'] for a in plano['novos']], ['5'])
+        self.assertEqual(plano['atualizados'][0]['mudancas'], {'turma': ('1A', '2A')})
+        self.assertEqual([i['matricula'] for i in plano['reativados']], ['4'])
+        self.assertEqual([i['matricula'] for i in plano['inativados']], ['2'])
+        self.assertEqual([i['matricula'] for i in plano['com_pendencias']], ['3'])
+        self.assertEqual(Leitor.objects.count(), 4)
+
+    def test_aplicar_em_poucas_consultas(self):
+        # Leitura do cadastro, INSERT, UPDATE em lote, UPDATE ... NOT EXISTS,
+        # estatísticas e savepoint: não cresce com o número de alunos
+        with self.assertNumQueries(7):
+            self.sincronizar()
+        ativos = dict(Leitor.objects.values_list('matricula', 'ativo'))
+        self.assertEqual(ativos, {'1': True, '2': False, '3': True, '4': True, '5': True})
+        self.assertEqual(Leitor.objects.get(matricula='4').turma, '2B')
+        # 3 ativos antes; +1 novo, +1 reativado, -1 inativado
+        self.assertEqual(EstatisticaAcervo.objects.get().leitores_ativos, 4)
+
+
+class CirculacaoConcorrenteTests(TransactionTestCase):
+    """Vários bibliotecários disputando as mesmas cópias ao mesmo tempo."""
+
+    THREADS = 12
+    COPIAS = 3
+
+    def test_emprestimos_simultaneos_nao_passam_do_estoque(self):
+        bibliotecario = User.objects.create_user('bibliotecaria', password='senha')
+        livro = criar_livro(numero_copias=self.COPIAS, copias_disponiveis=self.COPIAS)
+        leitores = [criar_leitor(matricula=f'M{i}') for i in range(self.THREADS)]
+        prevista = timezone.localdate() + timedelta(days=7)
+        barreira = threading.Barrier(self.THREADS)
+        resultados = []
+
+        def tentar(leitor):
+            try:
+                barreira.wait()
+                while True:
+                    try:
+                        circulacao.emprestar(livro, leitor, prevista, bibliotecario)
+                        resultados.append('ok')
+                    except circulacao.SemCopiasDisponiveis:
+                        resultados.append('sem_copias')
+                    except OperationalError:
+                        # SQLite serializa as escritas ("database is locked"): tenta de novo
+                        continue
+                    break
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=tentar, args=(leitor,)) for leitor in leitores]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        livro.refresh_from_db()
+        self.assertEqual(resultados.count('ok'), self.COPIAS)
+        self.assertEqual(resultados.count('sem_copias'), self.THREADS - self.COPIAS)
+        self.assertEqual(livro.copias_disponiveis, 0)
+        self.assertEqual(Emprestimo.objects.filter(livro=livro).count(), self.COPIAS)
+
+
+class FilaRelatoriosTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('bibliotecaria', password='senha')
+
+    def test_pedidos_iguais_reaproveitam_a_tarefa_em_andamento(self):
+        primeira = relatorios.solicitar({'status': 'pendente', 'q': ' dom '}, self.usuario)
+        segunda = relatorios.solicitar({'q': 'dom', 'status': 'pendente', 'data_fim': ''}, self.usuario)
+        self.assertEqual(primeira.pk, segunda.pk)
+        outra = relatorios.solicitar({'status': 'devolvido'}, self.usuario)
+        self.assertNotEqual(primeira.pk, outra.pk)
+
+    def test_worker_reserva_cada_tarefa_uma_unica_vez(self):
+        tarefa = relatorios.solicitar({}, self.usuario)
+        self.assertEqual(relatorios.pegar_proxima().pk, tarefa.pk)
+        self.assertIsNone(relatorios.pegar_proxima())
+        self.assertEqual(TarefaRelatorio.objects.get(pk=tarefa.pk).status, TarefaRelatorio.PROCESSANDO)
+
+    def test_worker_sobrevive_a_erros_de_banco_e_para_no_sigterm(self):
+        primeira = relatorios.solicitar({}, self.usuario)
+        segunda = relatorios.solicitar({'status': 'devolvido'}, self.usuario)
+        pegar_proxima = relatorios.pegar_proxima
+        falhas = [OperationalError('conexão perdida')]
+
+        def pegar_instavel():
+            if falhas:
+                raise falhas.pop()
+            return pegar_proxima()
+
+        def gerar_e_receber_sigterm(filtros):
+            signal.raise_signal(signal.SIGTERM)  # o deploy pede para parar no meio do relatório
+            return b'%PDF'
+
+        manutencao = [OperationalError('banco reiniciando'), (0, 0), (0, 0)]
+        comando = 'acervo.management.commands.processar_relatorios'
+        with mock.patch.object(relatorios, 'manutencao', side_effect=manutencao), \
+                mock.patch.object(relatorios, 'pegar_proxima', side_effect=pegar_instavel), \
+                mock.patch.object(relatorios, 'gerar_pdf', side_effect=gerar_e_receber_sigterm), \
+                mock.patch(f'{comando}.connections'), self.assertLogs(comando, 'ERROR') as logs:
+            call_command('processar_relatorios', intervalo=0, stdout=io.StringIO())
+
+        self.assertEqual(len(logs.records), 2)
+        # O relatório em andamento termina; o próximo fica para o worker que subir depois
+        self.assertEqual(TarefaRelatorio.objects.get(pk=primeira.pk).status, TarefaRelatorio.CONCLUIDO)
+        self.assertEqual(TarefaRelatorio.objects.get(pk=segunda.pk).status, TarefaRelatorio.PENDENTE)
+        self.assertIs(signal.getsignal(signal.SIGTERM), signal.SIG_DFL)
+
+
+    def test_relatorio_pronto_e_reaproveitado_ate_os_emprestimos_mudarem(self):
+        tarefa = relatorios.solicitar({'status': 'devolvido'}, self.usuario)
+        TarefaRelatorio.objects.filter(pk=tarefa.pk).update(
+            status=TarefaRelatorio.CONCLUIDO, pdf=b'%PDF', concluido_em=timezone.now()
+        )
+        self.assertEqual(relatorios.solicitar({'status': 'devolvido'}, self.usuario).pk, tarefa.pk)
+
+        livro = criar_livro()
+        circulacao.emprestar(livro, criar_leitor(), timezone.localdate(), self.usuario)
+        self.assertNotEqual(relatorios.solicitar({'status': 'devolvido'}, self.usuario).pk, tarefa.pk)
+
+    def test_partes_sao_lidas_conforme_a_renderizacao_avanca(self):
+        from PyPDF2 import PdfReader, PdfWriter
+
+        livro = criar_livro(numero_copias=7, copias_disponiveis=7)
+        leitor = criar_leitor()
+        for _ in range(7):
+            circulacao.emprestar(livro, leitor, timezone.localdate(), self.usuario)
+
+        contagem = {'lidas': 0, 'renderizadas': 0}
+        adiantadas = []
+        partes = relatorios._partes
+
+        def ler_partes(params):
+            for parte in partes(params):
+                contagem['lidas'] += 1
+                adiantadas.append(contagem['lidas'] - contagem['renderizadas'])
+                yield parte
+
+        def renderizar_parte(emprestimos, primeira):
+            # Uma página cuja largura é o número de linhas da parte
+            pdf = PdfWriter()
+            pdf.add_blank_page(width=len(emprestimos), height=10)
+            saida = io.BytesIO()
+            pdf.write(saida)
+            contagem['renderizadas'] += 1
+            return saida.getvalue()
+
+        with mock.patch.object(relatorios, 'LINHAS_POR_PARTE', 2), \
+                mock.patch.object(relatorios, '_partes', ler_partes), \
+                mock.patch.object(relatorios, 'renderizar_parte', renderizar_parte), \
+                mock.patch.object(relatorios, 'ProcessPoolExecutor', ThreadPoolExecutor), \
+                override_settings(ACERVO_RELATORIO_PROCESSOS=1):
+            pdf = PdfReader(io.BytesIO(relatorios.gerar_pdf({})))
+        self.assertEqual([int(pagina.mediabox.width) for pagina in pdf.pages], [2, 2, 2, 1])
+        # Com um processo, no máximo duas partes lidas esperam a renderização
+        self.assertLessEqual(max(adiantadas), 2)
+
+
+class ColdStartTests(SimpleTestCase):
+
+    # Só a geração do PDF e a exportação XLSX usam estas; o boot do worker não pode carregá-las
+    PESADAS = ('weasyprint', 'openpyxl', 'PyPDF2')
+
+    def test_urls_e_views_nao_importam_as_bibliotecas_pesadas(self):
+        # Num interpretador novo: neste processo os testes já importaram tudo
+        codigo = (
+            'import sys, django\n'
+            'django.setup()\n'
+            'from django.urls import get_resolver\n'
+            'get_resolver().url_patterns\n'
+            f'print(" ".join(m for m in {self.PESADAS!r} if m in sys.modules))\n'
+        )
+        processo = subprocess.run(
+            [sys.executable, '-c', codigo], cwd=settings.BASE_DIR, capture_output=True, text=True,
+            env=dict(os.environ, DJANGO_SETTINGS_MODULE='biblioteca_virtual.settings'),
+        )
+        self.assertEqual(processo.returncode, 0, processo.stderr)
+        self.assertEqual(processo.stdout.strip(), '')
+
+
+class OrcamentoConsultasMixin:
+    """
+    Mede quantas consultas uma página faz antes e depois de o acervo crescer.
+    Se o número aumenta junto com os dados, algum template está acessando uma
+    relação linha a linha (N+1).
+    """
+
+    def contar_consultas(self, url, metodo='get'):
+        # O painel e outras páginas ficam em cache: mede sempre o caminho completo
+        cache.clear()
+        with CaptureQueriesContext(connection) as consultas:
+            response = getattr(self.client, metodo)(url)
+            if response.streaming:
+                # Exportações geram as linhas só quando o corpo é consumido
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, f'{metodo.upper()} {url} respondeu {response.status_code}')
+        return len(consultas)
+
+    def assertOrcamentoConsultas(self, url, maximo, crescer, metodo='get'):
+        antes = self.contar_consultas(url, metodo)
+        crescer()
+        depois = self.contar_consultas(url, metodo)
+        self.assertLessEqual(
+            depois, antes, f'{url}: {antes} consultas antes e {depois} depois de o acervo crescer (N+1?)'
+        )
+        self.assertLessEqual(depois, maximo, f'{url}: {depois} consultas, o limite é {maximo}')
+
+    criados = 0
+
+    def crescer(self, quantidade=10, livro_fixo=None, leitor_fixo=None):
+        """
+        Mais livros, leitores e empréstimos em aberto, feitos por 'self.usuario'.
+        Com livro_fixo/leitor_fixo (os usados nas URLs), cada rodada também
+        empresta esse livro a esse leitor.
+        """
+        prevista = timezone.localdate() + timedelta(days=7)
+        for _ in range(quantidade):
+            self.criados += 1
+            livro = criar_livro(
+                isbn=f'978{self.criados:010d}', titulo=f'Livro {self.criados}', autor=f'Autor {self.criados % 3}'
+            )
+            leitor = criar_leitor(matricula=f'M{self.criados}', turma=f'{self.criados % 4}A')
+            circulacao.emprestar(livro, leitor, prevista, self.usuario)
+            if livro_fixo is not None:
+                circulacao.emprestar(livro_fixo, leitor_fixo, prevista, self.usuario)
+
+
+class OrcamentoConsultasViewsTests(OrcamentoConsultasMixin, TestCase):
+    """Toda rota de acervo.urls tem um limite de consultas que não depende do tamanho do acervo."""
+
+    # Limite de consultas por rota (inclui sessão e usuário logado)
+    ORCAMENTOS = {
+        'login': 2,
+        'logout': 3,
+        'registrar': 2,
+        'dashboard': 6,
+        'lista_livros': 4,
+        'adicionar_livro': 2,
+        'importar_livros': 2,
+        'detalhes_livro': 5,  # tabela e arquivo de empréstimos
+        'editar_livro': 3,
+        'excluir_livro': 3,
+        'lista_leitores': 4,
+        'adicionar_leitor': 2,
+        'sincronizar_leitores': 2,
+        'editar_leitor': 3,
+        'inativar_leitor': 6,
+        'lista_emprestimos': 6,  # página e contagem na tabela e no arquivo
+        'adicionar_emprestimo': 2,
+        'emprestimo_em_lote': 2,
+        'devolucao_em_lote': 2,
+        'devolver_livro': 10,
+        'search_livros': 3,
+        'search_leitores': 3,
+        'sobre_nos': 0,
+        'contato': 0,
+        'gerar_relatorio_emprestimos_pdf': 9,
+        'status_relatorio': 3,
+        'baixar_relatorio': 3,
+        'exportar': 4,
+    }
+    # Rotas que só aceitam POST
+    ROTAS_POST = {'logout'}
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('bibliotecaria', password='senha')
+        # Cada rota empresta este livro mais 10 vezes
+        self.livro = criar_livro(numero_copias=1000, copias_disponiveis=1000)
+        self.leitor = criar_leitor()
+        self.tarefa = TarefaRelatorio.objects.create(
+            filtros={}, chave='pronta', status=TarefaRelatorio.CONCLUIDO, pdf=b'%PDF', concluido_em=timezone.now()
+        )
+        self.crescer(2, self.livro, self.leitor)
+
+    def url(self, nome):
+        argumentos = {
+            'detalhes_livro': [self.livro.pk],
+            'editar_livro': [self.livro.pk],
+            'excluir_livro': [self.livro.pk],
+            'editar_leitor': [self.leitor.pk],
+            'inativar_leitor': [self.leitor.pk],
+            'status_relatorio': [self.tarefa.pk],
+            'baixar_relatorio': [self.tarefa.pk],
+            'exportar': ['emprestimos', 'csv'],
+        }
+        if nome == 'devolver_livro':
+            # A devolução altera o empréstimo: usa um que ainda está aberto
+            emprestimo = Emprestimo.objects.filter(data_devolucao_real__isnull=True).first()
+            return reverse(nome, args=[emprestimo.pk])
+        return reverse(nome, args=argumentos.get(nome, []))
+
+    def test_toda_rota_tem_orcamento(self):
+        nomes = {padrao.name for padrao in urls.urlpatterns}
+        self.assertEqual(nomes, set(self.ORCAMENTOS))
+
+    def test_consultas_nao_crescem_com_o_acervo(self):
+        for nome, maximo in self.ORCAMENTOS.items():
+            with self.subTest(rota=nome):
+                if nome not in ('login', 'registrar', 'sobre_nos', 'contato'):
+                    self.client.force_login(self.usuario)
+                metodo = 'post' if nome in self.ROTAS_POST else 'get'
+                crescer = partial(self.crescer, 10, self.livro, self.leitor)
+                self.assertOrcamentoConsultas(self.url(nome), maximo, crescer, metodo)
+                self.client.logout()
+
+
+class AdminEscalavelTests(OrcamentoConsultasMixin, TestCase):
+    """As listas do admin não fazem uma consulta por linha nem contam a tabela inteira."""
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(self.usuario)
+        self.crescer(2)
+
+    def test_listas_e_autocomplete_com_consultas_constantes(self):
+        lista_emprestimos = reverse('admin:acervo_emprestimo_changelist')
+        urls = {
+            lista_emprestimos: 4,
+            lista_emprestimos + '?q=Livro&status=aberto': 4,
+            reverse('admin:acervo_livro_changelist') + '?autor=Autor+1': 6,
+            reverse('admin:acervo_leitor_changelist'): 5,
+            reverse('admin:acervo_emprestimo_add'): 6,
+            reverse('admin:autocomplete') + '?app_label=acervo&model_name=emprestimo&field_name=livro&term=livro': 4,
+        }
+        for url, maximo in urls.items():
+            with self.subTest(url=url):
+                self.assertOrcamentoConsultas(url, maximo, self.crescer)
+
+    def test_filtro_de_autor_lista_os_mais_frequentes(self):
+        response = self.client.get(reverse('admin:acervo_livro_changelist'))
+        self.assertContains(response, 'Autor 1 (1)')
+
+
+class APITests(OrcamentoConsultasMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('integracao', password='senha')
+        self.client.force_login(self.usuario)
+        self.crescer(3)
+
+    def test_paginas_por_cursor_com_campos_esparsos(self):
+        url = reverse('v1:emprestimo-list') + '?page_size=2&fields=id,livro_titulo,leitor_nome'
+        self.assertOrcamentoConsultas(url, 4, self.crescer)  # sessão, usuário, versão e a página
+
+        vistos = []
+        while url:
+            dados = self.client.get(url).json()
+            self.assertEqual(set(dados['results'][0]), {'id', 'livro_titulo', 'leitor_nome'})
+            vistos += [item['id'] for item in dados['results']]
+            url = dados['next']
+        self.assertEqual(vistos, list(Emprestimo.objects.order_by('-data_emprestimo', '-id').values_list('id', flat=True)))
+        self.assertEqual(self.client.get(reverse('v1:livro-list') + '?fields=telefone').status_code, 400)
+
+    def test_etag_da_versao_responde_304_sem_consultar_a_pagina(self):
+        url = reverse('v1:livro-list')
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(2):  # só sessão e usuário
+            repetida = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repetida.status_code, 304)
+
+        emprestimos = reverse('v1:emprestimo-list')
+        etag = self.client.get(emprestimos)['ETag']
+        circulacao.devolver(Emprestimo.objects.first())
+        self.assertEqual(self.client.get(emprestimos, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_changed_since_traz_so_o_que_mudou(self):
+        marco = timezone.now() - timedelta(hours=1)
+        for modelo in (Livro, Leitor, Emprestimo):
+            modelo.objects.update(atualizado_em=marco - timedelta(hours=1))
+        emprestimo = Emprestimo.objects.first()
+        circulacao.devolver(emprestimo)
+        matriculas.aplicar({
+            'novos': [], 'reativados': [], 'inativados': [],
+            'atualizados': [{'id': emprestimo.leitor_id, 'mudancas': {'turma': ('3A', '1B')}}],
+        })
+
+        params = {'changed_since': marco.isoformat()}
+        alterados = self.client.get(reverse('v1:emprestimo-list'), params).json()['results']
+        self.assertEqual([(item['id'], item['status']) for item in alterados], [(emprestimo.pk, 'devolvido')])
+        livros = self.client.get(reverse('v1:livro-list'), params).json()['results']
+        self.assertEqual([item['id'] for item in livros], [emprestimo.livro_id])
+        leitores = self.client.get(reverse('v1:leitor-list'), params).json()['results']
+        self.assertEqual([(item['id'], item['turma'], item['ativo']) for item in leitores], [(emprestimo.leitor_id, '1B', True)])
+        self.assertEqual(self.client.get(reverse('v1:livro-list'), {'changed_since': 'ontem'}).status_code, 400)
@@ -17,20 +17,24 @@ urlpatterns = [
     # URLs para Livros
     path('livros/', views.lista_livros, name='lista_livros'),
     path('livros/novo/', views.adicionar_livro, name='adicionar_livro'),
+    path('livros/importar/', views.importar_livros, name='importar_livros'),
     path('livros/<int:pk>/', views.detalhes_livro, name='detalhes_livro'),
     # CRUD de Livros
     path('livros/<int:pk>/editar/', views.EditarLivro.as_view(), name='editar_livro'),
     path('livros/<int:pk>/excluir/', views.ExcluirLivro.as_view(), name='excluir_livro'),
     
     # URLs para Leitores
-    path('leitores/', views.ListaLeitores.as_view(), name='lista_leitores'),
+    path('leitores/', views.lista_leitores, name='lista_leitores'),
     path('leitores/novo/', views.AdicionarLeitor.as_view(), name='adicionar_leitor'),
+    path('leitores/sincronizar/', views.sincronizar_leitores, name='sincronizar_leitores'),
     path('leitores/<int:pk>/editar/', views.EditarLeitor.as_view(), name='editar_leitor'),
     path('leitores/<int:pk>/inativar/', views.InativarLeitor.as_view(), name='inativar_leitor'),
 
     # URLs para Empréstimos
     path('emprestimos/', views.lista_emprestimos, name='lista_emprestimos'),
     path('emprestimos/novo/', views.adicionar_emprestimo, name='adicionar_emprestimo'),
+    path('emprestimos/lote/', views.emprestimo_em_lote, name='emprestimo_em_lote'),
+    path('emprestimos/devolucao-lote/', views.devolucao_em_lote, name='devolucao_em_lote'),
     
     # URLs para devolução
     path('emprestimos/<int:emprestimo_id>/devolver/', views.devolver_livro, name='devolver_livro'),
@@ -46,4 +50,9 @@ urlpatterns = [
     
     # URL PARA O PDF
     path('emprestimos/gerar-pdf/', views.gerar_relatorio_emprestimos_pdf, name='gerar_relatorio_emprestimos_pdf'),
+    path('relatorios/<int:pk>/', views.status_relatorio, name='status_relatorio'),
+    path('relatorios/<int:pk>/baixar/', views.baixar_relatorio, name='baixar_relatorio'),
+
+    # URL PARA EXPORTAÇÃO CSV/XLSX (tipo: emprestimos, livros ou leitores)
+    path('exportar/<str:tipo>/<str:formato>/', views.exportar, name='exportar'),
 ]
\ No newline at end of file
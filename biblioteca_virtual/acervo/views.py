@@ -3,26 +3,29 @@ from django.contrib import messages
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
-from .models import Livro, Emprestimo, Leitor
-from .forms import LivroForm, EmprestimoForm, LeitorForm
+from .models import Livro, Emprestimo, Leitor, TarefaRelatorio
+from .forms import LivroForm, EmprestimoForm, LeitorForm, EmprestimoLivrosLoteForm, EmprestimoTurmaLoteForm, DevolucaoLoteForm, ImportacaoLivrosForm, SincronizacaoLeitoresForm
+from . import autocomplete, circulacao, estatisticas, exclusao, exportacao, filtros, historico, importacao, matriculas, relatorios
 from django.utils import timezone
 
-from django.views.generic import ListView, CreateView, UpdateView, DeleteView, TemplateView
+from django.views.generic import CreateView, UpdateView, DeleteView, TemplateView
 from django.contrib.messages.views import SuccessMessageMixin 
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin
 
-from django.core.paginator import Paginator
+from .paginacao import apaginar_juntos, apaginar_por_cursor, paginar_juntos
+from .cache_catalogo import cache_catalogo, pagina_estatica
+from django.utils.decorators import method_decorator
 
-from django.http import HttpResponseRedirect,JsonResponse, HttpResponse
-from django.db.models import Q
-from django.template.loader import render_to_string
-from weasyprint import HTML
+from django.http import HttpResponseRedirect,JsonResponse, HttpResponse, Http404
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q, F
 
 
         
 # --------------- Registrar novo bibliotecario ------------
 
+@pagina_estatica('acervo/home.html', 'acervo/base_publica.html')
 def home(request):
     return render(request, 'acervo/home.html')
 
@@ -41,64 +44,42 @@ class RegistrarBibliotecario(CreateView):
 
 # --------------- View para dashboard ------------
 
-@login_required
-def dashboard(request):
-    # --- Cálculos dos Números Chave ---
-    total_livros = Livro.objects.count()
-    livros_emprestados = Emprestimo.objects.filter(data_devolucao_real__isnull=True).count()
-    livros_disponiveis = total_livros - livros_emprestados # Ou Livro.objects.filter(disponivel=True).count()
-    
-    emprestimos_atrasados = Emprestimo.objects.filter(
-        data_devolucao_real__isnull=True,
-        data_devolucao_prevista__lt=timezone.now().date()
-    ).count()
-    
-    total_leitores_ativos = Leitor.objects.filter(ativo=True).count()
+async def _carregar_usuario(request):
+    # Os templates leem 'user' de forma síncrona: com o usuário já carregado,
+    # a renderização nas views async não consulta o banco
+    request.user = await request.auser()
 
-    # --- (Opcional) Buscar Atividade Recente ---
-    ultimos_emprestimos = Emprestimo.objects.select_related('livro', 'leitor').order_by('-data_emprestimo')[:5] # Pega os 5 mais recentes
 
-    context = {
-        'total_livros': total_livros,
-        'livros_emprestados': livros_emprestados,
-        'livros_disponiveis': livros_disponiveis,
-        'emprestimos_atrasados': emprestimos_atrasados,
-        'total_leitores_ativos': total_leitores_ativos,
-        'ultimos_emprestimos': ultimos_emprestimos,
-    }
+@login_required
+async def dashboard(request):
+    # --- Números Chave e Atividade Recente ---
+    # Os contadores são mantidos incrementalmente e o painel fica em cache
+    # (ver acervo/estatisticas.py), então aqui não há nenhum COUNT
+    context = await estatisticas.apainel()
+    await _carregar_usuario(request)
     return render(request, 'acervo/dashboard.html', context)
 
 
 # --------------- View para listar todos os livros ------------
 
-def lista_livros(request):
-    # A lógica de busca e filtro continua exatamente a mesma
-    queryset = Livro.objects.all().order_by('titulo')
-    termo_busca = request.GET.get('q')
-    if termo_busca:
-        queryset = queryset.filter(
-            Q(titulo__icontains=termo_busca) | Q(autor__icontains=termo_busca)
-        )
-    filtro_status = request.GET.get('status')
-    if filtro_status == 'disponivel':
-        queryset = queryset.filter(disponivel=True)
-    elif filtro_status == 'emprestado':
-        queryset = queryset.filter(disponivel=False)
+@cache_catalogo
+async def lista_livros(request):
+    # Busca, filtro de status e ordenação ficam em acervo/filtros.py
+    # (compartilhados com a exportação)
+    ordem = filtros.ordem_livros(request.GET)
+    queryset = filtros.filtrar_livros(request.GET)
 
     # --- INÍCIO DA LÓGICA DE PAGINAÇÃO ---
-    # 1. Cria o objeto Paginator, definindo 10 livros por página
-    paginator = Paginator(queryset, 10) 
-
-    # 2. Pega o número da página da URL (ex: /?page=2)
-    page_number = request.GET.get('page')
-
-    # 3. Pega o objeto da página correta
-    page_obj = paginator.get_page(page_number)
+    # Paginação por cursor: 10 livros por página, continuando a partir do
+    # último livro exibido (?cursor=...), sem COUNT(*) nem OFFSET
+    page_obj = await apaginar_por_cursor(request, queryset, 10, contar=True)
     # --- FIM DA LÓGICA DE PAGINAÇÃO ---
+    await _carregar_usuario(request)
 
     context = {
         # 4. Envia o objeto da página para o template em vez da lista inteira
-        'page_obj': page_obj 
+        'page_obj': page_obj,
+        'ordem': ordem,
     }
     return render(request, 'acervo/lista_livros.html', context)
 
@@ -121,35 +102,15 @@ def adicionar_livro(request):
 # -------------------- View para listar todos os empréstimos -----------------
 
 @login_required
-def lista_emprestimos(request):
-    queryset = Emprestimo.objects.select_related('livro', 'leitor').order_by('-data_emprestimo')
-
-    # Pega todos os parâmetros da URL
-    termo_busca = request.GET.get('q')
-    data_inicio = request.GET.get('data_inicio')
-    data_fim = request.GET.get('data_fim')
-    status = request.GET.get('status')
-
-    # Aplica os filtros
-    if termo_busca:
-        queryset = queryset.filter(
-            Q(livro__titulo__icontains=termo_busca) |
-            Q(leitor__nome__icontains=termo_busca) |
-            Q(leitor__matricula__icontains=termo_busca)
-        )
-    if data_inicio:
-        queryset = queryset.filter(data_emprestimo__gte=data_inicio)
-    if data_fim:
-        queryset = queryset.filter(data_emprestimo__lte=data_fim)
-    if status == 'pendente':
-        queryset = queryset.filter(data_devolucao_real__isnull=True)
-    elif status == 'devolvido':
-        queryset = queryset.filter(data_devolucao_real__isnull=False)
+async def lista_emprestimos(request):
+    # Os filtros (busca, período e status) ficam em acervo/filtros.py,
+    # os mesmos usados pelo PDF e pelas exportações; os devolvidos há muito
+    # tempo vêm do arquivo (ver acervo/historico.py)
+    consultas = [consulta.select_related('livro', 'leitor') for consulta in historico.emprestimos(request.GET)]
     
-    # Paginação (continua igual)
-    paginator = Paginator(queryset, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Paginação por cursor (o histórico é grande e as páginas fundas ficavam lentas)
+    page_obj = await apaginar_juntos(request, consultas, 10, contar=True)
+    await _carregar_usuario(request)
 
     context = {
         'page_obj': page_obj,
@@ -166,23 +127,24 @@ def adicionar_emprestimo(request):
             emprestimo = form.save(commit=False)
             
             # --- LÓGICA DE CÓPIAS ---
+            # A retirada da cópia e o registro do empréstimo acontecem numa única
+            # transação, com UPDATE condicional (ver acervo/circulacao.py)
             livro_emprestado = emprestimo.livro
-            if livro_emprestado.copias_disponiveis > 0:
-                # Diminui as cópias disponíveis
-                livro_emprestado.copias_disponiveis -= 1
-                livro_emprestado.save()
-
-                # Salva o empréstimo
-                emprestimo.bibliotecario = request.user
-                emprestimo.save()
-                
-                messages.success(request, f'O empréstimo do livro "{livro_emprestado.titulo}" foi registrado com sucesso!')
-                return redirect('lista_emprestimos')
-            else:
-                messages.error(request, f'Não há cópias disponíveis do livro "{livro_emprestado.titulo}" no momento.')
+            try:
+                circulacao.emprestar(
+                    livro_emprestado,
+                    emprestimo.leitor,
+                    emprestimo.data_devolucao_prevista,
+                    request.user,
+                )
+            except circulacao.SemCopiasDisponiveis as erro:
+                messages.error(request, str(erro))
                 # Retorna o formulário com o erro
                 return render(request, 'acervo/adicionar_emprestimo.html', {'form': form})
             # --- FIM DA LÓGICA ---
+
+            messages.success(request, f'O empréstimo do livro "{livro_emprestado.titulo}" foi registrado com sucesso!')
+            return redirect('lista_emprestimos')
     else:
         # Filtra os livros no GET para mostrar apenas os com cópias disponíveis
         form = EmprestimoForm()
@@ -194,27 +156,107 @@ def adicionar_emprestimo(request):
 # --------------------- NOVA VIEW PARA DEVOLUÇÃO: -------------------------
 @login_required
 def devolver_livro(request, emprestimo_id):
-    emprestimo = get_object_or_404(Emprestimo, id=emprestimo_id)
-
-    # Verifica se já não foi devolvido para evitar contagem dupla
-    if emprestimo.data_devolucao_real is None:
-        emprestimo.data_devolucao_real = timezone.now().date()
-        emprestimo.save()
-
-        livro = emprestimo.livro
-        # --- LÓGICA DE CÓPIAS ---
-        # Aumenta as cópias disponíveis, garantindo que não ultrapasse o total
-        livro.copias_disponiveis = min(livro.numero_copias, livro.copias_disponiveis + 1)
-        livro.save()
-        # --- FIM DA LÓGICA ---
-        
-        messages.success(request, f'O livro "{livro.titulo}" foi devolvido com sucesso!')
-    else:
-        messages.warning(request, f'O livro "{emprestimo.livro.titulo}" já havia sido devolvido.')
+    emprestimo = get_object_or_404(Emprestimo.objects.select_related('livro'), id=emprestimo_id)
+
+    # A devolução só é aplicada uma vez, mesmo com cliques repetidos (ver acervo/circulacao.py)
+    try:
+        circulacao.devolver(emprestimo)
+        messages.success(request, f'O livro "{emprestimo.livro.titulo}" foi devolvido com sucesso!')
+    except circulacao.EmprestimoJaDevolvido as erro:
+        messages.warning(request, str(erro))
 
     return redirect('lista_emprestimos')
 
 
+# --------------------- EMPRÉSTIMO E DEVOLUÇÃO EM LOTE -------------------------
+@login_required
+def emprestimo_em_lote(request):
+    form_livros = EmprestimoLivrosLoteForm(prefix='livros')
+    form_turma = EmprestimoTurmaLoteForm(prefix='turma')
+    resultados = None
+
+    if request.method == 'POST':
+        modo = request.POST.get('modo')
+        if modo == 'turma':
+            form_turma = EmprestimoTurmaLoteForm(request.POST, prefix='turma')
+            form = form_turma
+        else:
+            form_livros = EmprestimoLivrosLoteForm(request.POST, prefix='livros')
+            form = form_livros
+
+        if form.is_valid():
+            dados = form.cleaned_data
+            if modo == 'turma':
+                # Um livro para cada leitor ativo da turma
+                leitores = Leitor.objects.filter(ativo=True, turma=dados['turma']).order_by('nome')
+                itens = [(dados['livro'], leitor) for leitor in leitores]
+            else:
+                itens = [(livro, dados['leitor']) for livro in dados['livros']]
+
+            if not itens:
+                messages.warning(request, 'Nenhum leitor ativo encontrado para esta turma.')
+            else:
+                resultados = circulacao.emprestar_em_lote(itens, dados['data_devolucao_prevista'], request.user)
+                registrados = sum(1 for r in resultados if r['ok'])
+                messages.success(request, f'{registrados} de {len(resultados)} empréstimos registrados.')
+
+    context = {
+        'form_livros': form_livros,
+        'form_turma': form_turma,
+        'resultados': resultados,
+    }
+    return render(request, 'acervo/emprestimo_lote.html', context)
+
+
+@login_required
+def devolucao_em_lote(request):
+    resultados = None
+    if request.method == 'POST':
+        form = DevolucaoLoteForm(request.POST)
+        if form.is_valid():
+            codigos = form.cleaned_data['lista_codigos']
+            try:
+                if form.cleaned_data['tipo'] == 'id':
+                    resultados = circulacao.devolver_em_lote(emprestimo_ids=codigos)
+                else:
+                    resultados = circulacao.devolver_em_lote(isbns=codigos)
+            except circulacao.ErroCirculacao as erro:
+                messages.error(request, str(erro))
+            else:
+                devolvidos = sum(1 for r in resultados if r['ok'])
+                messages.success(request, f'{devolvidos} de {len(resultados)} devoluções registradas.')
+                form = DevolucaoLoteForm()
+    else:
+        form = DevolucaoLoteForm()
+
+    return render(request, 'acervo/devolucao_lote.html', {'form': form, 'resultados': resultados})
+
+
+@login_required
+def importar_livros(request):
+    resumo = None
+    if request.method == 'POST':
+        form = ImportacaoLivrosForm(request.POST, request.FILES)
+        if form.is_valid():
+            arquivo = form.cleaned_data['arquivo']
+            try:
+                resumo = importacao.importar(arquivo, importacao.formato_do_arquivo(arquivo.name))
+            except importacao.ErroImportacao as erro:
+                messages.error(request, str(erro))
+            else:
+                messages.success(
+                    request,
+                    f"{resumo['criados']} livro(s) adicionado(s) e {resumo['atualizados']} atualizado(s)."
+                )
+                if resumo['erros']:
+                    messages.warning(request, f"{len(resumo['erros'])} linha(s) não importada(s); veja abaixo.")
+                form = ImportacaoLivrosForm()
+    else:
+        form = ImportacaoLivrosForm()
+
+    return render(request, 'acervo/importar_livros.html', {'form': form, 'resumo': resumo})
+
+
 # ------------------ DETALHES DO LIVRO, E HISTORICO DE MOVIMENTAÇÃO: ---------------
 
 @login_required
@@ -222,14 +264,18 @@ def detalhes_livro(request, pk):
     # Busca o livro específico pelo seu ID (pk), ou retorna erro 404 se não encontrar
     livro = get_object_or_404(Livro, pk=pk)
     
-    # Busca todos os empréstimos associados a este livro
-    # O .order_by('-data_emprestimo') mostra os mais recentes primeiro
-    emprestimos = Emprestimo.objects.filter(livro=livro).order_by('-data_emprestimo')
-    
+    # Busca os empréstimos associados a este livro (na tabela e no arquivo), já
+    # com o leitor (o template mostra nome e matrícula em cada linha), mais
+    # recentes primeiro
+    emprestimos = [consulta.select_related('leitor') for consulta in historico.do_livro(livro)]
+
+    # Livros populares têm centenas de empréstimos: o histórico é paginado
+    page_obj = paginar_juntos(request, emprestimos, 20)
+
     # Monta o "contexto" que será enviado para o template
     context = {
         'livro': livro,
-        'emprestimos': emprestimos
+        'page_obj': page_obj,
     }
     
     # Renderiza o template, passando o contexto com os dados
@@ -253,48 +299,25 @@ class ExcluirLivro(LoginRequiredMixin, SuccessMessageMixin, DeleteView):
     success_message = "O livro '%(titulo)s' foi excluído com sucesso!"
     
     def post(self, request, *args, **kwargs):
-        # Pega o título do livro antes de deletá-lo
-        titulo_livro = self.get_object().titulo
-        # Adiciona a mensagem na fila
-        messages.success(self.request, f"O livro '{titulo_livro}' foi excluído com sucesso!")
-        # Continua com o processo normal de exclusão
-        return self.delete(request, *args, **kwargs)
+        livro = self.get_object()
+        # Exclusão lógica (um UPDATE): o histórico de empréstimos fica, e a
+        # remoção física é feita em lotes por 'manage.py purgar_livros'
+        exclusao.excluir(Livro.objects.filter(pk=livro.pk))
+        messages.success(self.request, f"O livro '{livro.titulo}' foi excluído com sucesso!")
+        return HttpResponseRedirect(self.success_url)
     
     
     
 # ------------------- CRUD PARA LEITORES -----------------
 
-class ListaLeitores(LoginRequiredMixin, ListView):
-    model = Leitor
-    template_name = 'acervo/lista_leitores.html'
-    context_object_name = 'leitores'
-    paginate_by = 10 
-
-    # SUBSTITUA ESTE MÉTODO PELO CÓDIGO ABAIXO
-    def get_queryset(self):
-        # Começa com todos os leitores
-        queryset = Leitor.objects.all().order_by('nome')
-
-        # --- Lógica da Busca (continua igual) ---
-        termo_busca = self.request.GET.get('q')
-        if termo_busca:
-            queryset = queryset.filter(
-                Q(nome__icontains=termo_busca) |
-                Q(matricula__icontains=termo_busca) |
-                Q(turma__icontains=termo_busca)
-            )
-
-        # --- Lógica do Filtro de Status CORRIGIDA ---
-        filtro_status = self.request.GET.get('status')
-        if filtro_status == 'inativo':
-            # Se o filtro for 'inativo', mostra apenas os inativos
-            queryset = queryset.filter(ativo=False)
-        else:
-            # PARA QUALQUER OUTRO CASO (filtro 'ativo' ou nenhum filtro),
-            # mostra apenas os leitores ATIVOS. Este é o novo padrão.
-            queryset = queryset.filter(ativo=True)
-            
-        return queryset
+@login_required
+async def lista_leitores(request):
+    # Busca e filtro de status (ativo/inativo) ficam em acervo/filtros.py
+    queryset = filtros.filtrar_leitores(request.GET)
+    # Paginação por cursor, 10 por página (sem COUNT + OFFSET)
+    page_obj = await apaginar_por_cursor(request, queryset, 10, contar=True)
+    await _carregar_usuario(request)
+    return render(request, 'acervo/lista_leitores.html', {'page_obj': page_obj})
 
 class AdicionarLeitor(LoginRequiredMixin, SuccessMessageMixin, CreateView):
     model = Leitor
@@ -303,6 +326,12 @@ class AdicionarLeitor(LoginRequiredMixin, SuccessMessageMixin, CreateView):
     success_url = reverse_lazy('lista_leitores')
     success_message = "Leitor '%(nome)s' cadastrado com sucesso!"
 
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        # Leitores novos já entram ativos
+        estatisticas.ajustar(leitores_ativos=1)
+        return response
+
 class EditarLeitor(LoginRequiredMixin, SuccessMessageMixin, UpdateView):
     model = Leitor
     form_class = LeitorForm
@@ -317,75 +346,74 @@ class InativarLeitor(LoginRequiredMixin, DeleteView):
     template_name = 'acervo/inativar_leitor_confirm.html'
     success_url = reverse_lazy('lista_leitores')
 
-    # Este método continua correto e é usado para exibir a página (GET)
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['emprestimos_pendentes'] = Emprestimo.objects.filter(
-            leitor=self.get_object(), 
-            data_devolucao_real__isnull=True
-        )
-        return context
+    # Os empréstimos pendentes vêm do contador mantido em Leitor
+    # (ver acervo/estatisticas.py), sem consultar a tabela de empréstimos
 
     # A correção está neste método, que lida com a ação de inativar (POST)
     def post(self, request, *args, **kwargs):
         leitor = self.get_object()
-        
-        # CORREÇÃO: Fazemos a consulta diretamente aqui, em vez de chamar get_context_data
-        emprestimos_pendentes = Emprestimo.objects.filter(
-            leitor=leitor, 
-            data_devolucao_real__isnull=True
-        )
 
-        if emprestimos_pendentes.exists():
+        if leitor.emprestimos_abertos > 0:
             messages.error(request, f"Não é possível inativar o leitor '{leitor.nome}', pois ele possui empréstimos pendentes.")
             return HttpResponseRedirect(self.success_url)
 
         # Se não houver pendências, inativa o leitor
+        estava_ativo = leitor.ativo
         leitor.ativo = False
-        leitor.save()
+        # Sem os contadores de empréstimos, que a circulação altera por UPDATE
+        leitor.save(update_fields=['ativo', 'atualizado_em'])
+        if estava_ativo:
+            estatisticas.ajustar(leitores_ativos=-1)
         messages.success(request, f"O leitor '{leitor.nome}' foi inativado com sucesso!")
         return HttpResponseRedirect(self.success_url)
     
 
+@login_required
+def sincronizar_leitores(request):
+    plano = erros = None
+    simulado = True
+    if request.method == 'POST':
+        form = SincronizacaoLeitoresForm(request.POST, request.FILES)
+        if form.is_valid():
+            arquivo = form.cleaned_data['arquivo']
+            simulado = form.cleaned_data['simular']
+            try:
+                plano, erros = matriculas.sincronizar(
+                    arquivo, importacao.formato_do_arquivo(arquivo.name),
+                    turmas=form.cleaned_data['turmas'], simular=simulado,
+                )
+            except importacao.ErroImportacao as erro:
+                messages.error(request, str(erro))
+            else:
+                if simulado:
+                    messages.info(request, "Simulação: nada foi gravado. Desmarque 'Apenas simular' para aplicar.")
+                else:
+                    messages.success(request, "Leitores sincronizados com a lista de matrículas.")
+    else:
+        form = SincronizacaoLeitoresForm()
+
+    context = {'form': form, 'plano': plano, 'erros': erros, 'simulado': simulado}
+    return render(request, 'acervo/sincronizar_leitores.html', context)
+
+
 # --------------- API PARA BUSCAR LIVROS DISPONÍVEIS -----------------
 
 @login_required
-def search_livros(request):
-    term = request.GET.get('term', '')
-    livros = Livro.objects.filter(
-        # ALTERE AQUI: filtra por cópias disponíveis > 0
-        copias_disponiveis__gt=0 
-    ).filter(
-        Q(titulo__icontains=term) | Q(isbn__icontains=term)
-    ).order_by('titulo')[:10]
-
-    results = [
-        # ADICIONE a contagem de cópias ao texto exibido
-        {'id': livro.id, 'text': f'{livro.titulo} ({livro.copias_disponiveis} cópias) - ISBN: {livro.isbn}'} 
-        for livro in livros
-    ]
-    return JsonResponse(results, safe=False)
+async def search_livros(request):
+    # Só livros com cópias disponíveis; resultados em cache por termo (ver acervo/autocomplete.py)
+    return autocomplete.resposta(request, await autocomplete.alivros(request.GET.get('term', '')))
 
 # API PARA BUSCAR LEITORES ATIVOS
 @login_required
-def search_leitores(request):
-    term = request.GET.get('term', '')
-    # Busca por leitores ativos cujo nome ou matrícula contenha o termo
-    leitores = Leitor.objects.filter(
-        ativo=True
-    ).filter(
-        Q(nome__icontains=term) | Q(matricula__icontains=term)
-    ).order_by('nome')[:10] # Limita a 10 resultados
-
-    results = [
-        {'id': leitor.id, 'text': f'{leitor.nome} (Matrícula: {leitor.matricula})'} 
-        for leitor in leitores
-    ]
-    return JsonResponse(results, safe=False)
+async def search_leitores(request):
+    # Busca por leitores ativos pelo nome, matrícula ou turma (até 10 resultados)
+    return autocomplete.resposta(request, await autocomplete.aleitores(request.GET.get('term', '')))
 
+@method_decorator(pagina_estatica('acervo/contato.html', 'acervo/base_publica.html'), name='dispatch')
 class ContatoView(TemplateView):
     template_name = 'acervo/contato.html'
     
+@method_decorator(pagina_estatica('acervo/sobre_nos.html', 'acervo/base_publica.html'), name='dispatch')
 class SobreNosView(TemplateView):
     template_name = 'acervo/sobre_nos.html'
     
@@ -393,32 +421,42 @@ class SobreNosView(TemplateView):
     
 @login_required
 def gerar_relatorio_emprestimos_pdf(request):
-    # A LÓGICA DE FILTRO É EXATAMENTE A MESMA DA 'lista_emprestimos'
-    queryset = Emprestimo.objects.select_related('livro', 'leitor').order_by('-data_emprestimo')
-    termo_busca = request.GET.get('q')
-    data_inicio = request.GET.get('data_inicio')
-    data_fim = request.GET.get('data_fim')
-    status = request.GET.get('status')
-
-    if termo_busca:
-        queryset = queryset.filter(Q(livro__titulo__icontains=termo_busca) | Q(leitor__nome__icontains=termo_busca) | Q(leitor__matricula__icontains=termo_busca))
-    if data_inicio:
-        queryset = queryset.filter(data_emprestimo__gte=data_inicio)
-    if data_fim:
-        queryset = queryset.filter(data_emprestimo__lte=data_fim)
-    if status == 'pendente':
-        queryset = queryset.filter(data_devolucao_real__isnull=True)
-    elif status == 'devolvido':
-        queryset = queryset.filter(data_devolucao_real__isnull=False)
-
-    # Renderiza um template HTML com os dados filtrados
-    html_string = render_to_string('acervo/partials/_relatorio_pdf.html', {'emprestimos': queryset})
-
-    # Cria o PDF a partir do HTML
-    pdf = HTML(string=html_string).write_pdf()
+    # O PDF não é mais gerado aqui: o pedido vai para a fila e o comando
+    # 'processar_relatorios' faz a renderização (ver acervo/relatorios.py).
+    # Os filtros são os mesmos da 'lista_emprestimos'; cliques repetidos com
+    # os mesmos filtros reaproveitam o pedido que já está na fila.
+    tarefa = relatorios.solicitar(request.GET, request.user)
+    return redirect('status_relatorio', pk=tarefa.pk)
+
 
+@login_required
+def status_relatorio(request, pk):
+    tarefa = get_object_or_404(TarefaRelatorio.objects.defer('pdf'), pk=pk)
+    if request.GET.get('formato') == 'json':
+        # Para consulta periódica via JavaScript
+        return JsonResponse({
+            'id': tarefa.pk,
+            'status': tarefa.status,
+            'download': reverse('baixar_relatorio', args=[tarefa.pk]) if tarefa.status == TarefaRelatorio.CONCLUIDO else None,
+        })
+    return render(request, 'acervo/status_relatorio.html', {'tarefa': tarefa})
+
+
+@login_required
+def baixar_relatorio(request, pk):
+    tarefa = get_object_or_404(TarefaRelatorio, pk=pk, status=TarefaRelatorio.CONCLUIDO)
     # Cria a resposta HTTP para forçar o download do arquivo
-    response = HttpResponse(pdf, content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="relatorio_emprestimos.pdf"'
-    
-    return response
\ No newline at end of file
+    response = HttpResponse(bytes(tarefa.pdf), content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="relatorio_emprestimos_{tarefa.pk}.pdf"'
+    return response
+
+
+# ------------------- EXPORTAÇÃO CSV / XLSX -------------------
+
+@login_required
+def exportar(request, tipo, formato):
+    # Usa os mesmos filtros da listagem correspondente (ver acervo/filtros.py)
+    if tipo not in exportacao.EXPORTACOES or formato not in exportacao.FORMATOS:
+        raise Http404("Exportação não encontrada.")
+    # No ASGI o corpo vai como iterador async (senão o Django o leria inteiro antes de enviar)
+    return exportacao.exportar(tipo, formato, request.GET, assincrono=isinstance(request, ASGIRequest))
@@ -4,6 +4,8 @@ Django settings for biblioteca_virtual project.
 
 from pathlib import Path
 import os
+import sys
+import tempfile
 from dotenv import load_dotenv
 import dj_database_url # Certifique-se que está importado
 
@@ -43,12 +45,16 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'rest_framework',
+    'rest_framework.authtoken',
     'acervo'
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware', # Correto
+    # Logo depois do WhiteNoise: mede as requisições das páginas (não os estáticos)
+    'acervo.metricas.MetricasMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -61,7 +67,8 @@ ROOT_URLCONF = 'biblioteca_virtual.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # O backend padrão, com o tempo de renderização medido (acervo/metricas.py)
+        'BACKEND': 'acervo.metricas.DjangoTemplatesMedidos',
         'DIRS': [BASE_DIR / 'templates'], # Correto
         'APP_DIRS': True,
         'OPTIONS': {
@@ -78,17 +85,98 @@ TEMPLATES = [
 WSGI_APPLICATION = 'biblioteca_virtual.wsgi.application' # Correto
 
 
+# Modo do servidor (ver start.sh): 'wsgi' (workers síncronos) ou 'asgi' (workers Uvicorn)
+SERVIDOR = os.environ.get('SERVIDOR', 'wsgi')
+
 # --- CORREÇÃO DATABASES ---
 # Usa dj_database_url para ler a variável DATABASE_URL do ambiente
 DATABASES = {
     'default': dj_database_url.config(
         # Define um valor padrão caso DATABASE_URL não exista (útil para testes locais sem .env)
         default=os.environ.get('DATABASE_URL', f'sqlite:///{BASE_DIR / "db.sqlite3"}'),
-        conn_max_age=600 # Tempo de vida da conexão (bom para produção)
+        # Tempo de vida da conexão (bom para produção). No ASGI o ORM das views
+        # async roda numa thread por requisição e conexões persistentes ficariam
+        # abertas nelas, então lá cada requisição abre e fecha a sua
+        conn_max_age=0 if SERVIDOR == 'asgi' else 600,
+        # Conexões reaproveitadas são testadas antes do uso (o banco pode ter
+        # derrubado uma conexão ociosa entre duas requisições)
+        conn_health_checks=True,
     )
 }
 
 
+# --- CACHE ---
+# Redis quando REDIS_URL estiver definida; senão, cache em arquivos no diretório
+# temporário (compartilhado entre os workers do Gunicorn, ao contrário do cache
+# em memória, então a invalidação feita por um worker vale para todos)
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'biblioteca_virtual_cache')),
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+# Por quantos segundos a 'lista_livros' anônima fica em cache (além da invalidação por sinal)
+ACERVO_CATALOGO_CACHE_TIMEOUT = int(os.environ.get('ACERVO_CATALOGO_CACHE_TIMEOUT', 300))
+
+
+# Fração das requisições medidas pelo MetricasMiddleware (0 desliga, 1 mede todas)
+ACERVO_METRICAS_AMOSTRAGEM = float(os.environ.get('ACERVO_METRICAS_AMOSTRAGEM', 1 if DEBUG else 0.1))
+
+# Empréstimos devolvidos há mais que isso (em meses) vão para o arquivo
+# ('manage.py arquivar_emprestimos', ver acervo/historico.py)
+ACERVO_ARQUIVO_MESES = int(os.environ.get('ACERVO_ARQUIVO_MESES', 12))
+
+# Livros excluídos há mais que isso (em dias) são removidos de vez, com o
+# histórico ('manage.py purgar_livros', ver acervo/exclusao.py)
+ACERVO_EXCLUSAO_DIAS = int(os.environ.get('ACERVO_EXCLUSAO_DIAS', 30))
+
+# API somente leitura em /api/v1/ (acervo/api.py). Integrações usam token
+# ('manage.py drf_create_token <usuário>'); a sessão serve para a API navegável,
+# que só fica ligada com DEBUG
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.TokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'] + (
+        ['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []
+    ),
+    'DEFAULT_VERSIONING_CLASS': 'rest_framework.versioning.NamespaceVersioning',
+    'ALLOWED_VERSIONS': ['v1'],
+}
+
+# As linhas JSON de 'acervo.metricas' vão para o console (o Gunicorn as junta ao log).
+# Nos testes ('manage.py test' ou pytest) ficam desligadas: os testes que as
+# verificam usam assertLogs, que liga o logger só durante o bloco
+TESTANDO = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'acervo.metricas': {
+            'handlers': ['console'],
+            'level': os.environ.get('ACERVO_METRICAS_LOG', 'WARNING' if TESTANDO else 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+
 # Password validation
 # ... (AUTH_PASSWORD_VALIDATORS - sem alterações) ...
 
@@ -20,9 +20,15 @@ from django.contrib import admin
 from django.urls import path, include # Adicione 'include'
 
 from acervo import views as acervo_views
+from acervo.api import router as api_router
+from acervo.metricas import metricas
 
 urlpatterns = [
     path('', acervo_views.home, name='home'),
     path('admin/', admin.site.urls),
     path('acervo/', include('acervo.urls')), # Adicione esta linha
+    # API REST somente leitura; uma nova versão entra ao lado, em outro namespace
+    path('api/v1/', include((api_router.urls, 'api'), namespace='v1')),
+    # Percentis por view do MetricasMiddleware (só equipe)
+    path('metrics', metricas, name='metricas'),
 ]
@@ -0,0 +1,81 @@
+# gunicorn.conf.py
+#
+# Perfil de produção do Gunicorn (lido pelo start.sh). Tudo pode ser ajustado
+# por variáveis de ambiente, sem mexer no código:
+#
+#   SERVIDOR               'wsgi' (padrão, workers gthread) ou 'asgi' (workers Uvicorn)
+#   WEB_CONCURRENCY        número de processos (padrão: núcleos + 1)
+#   GUNICORN_THREADS       threads por processo no modo WSGI (padrão: 4)
+#   GUNICORN_PRELOAD       'false' desliga o preload_app (padrão: ligado)
+#   GUNICORN_MAX_REQUESTS  requisições até reciclar um processo (padrão: 1000; 0 desliga)
+#   GUNICORN_TIMEOUT       segundos até matar uma requisição travada (padrão: 60)
+#   PORT                   porta (padrão: 10000, a do Render)
+#
+# Memória: com preload_app o Django (e as bibliotecas pesadas) é carregado uma
+# vez no processo mestre e os workers nascem por fork, compartilhando essas
+# páginas (copy-on-write). Threads (gthread) ou o event loop (Uvicorn) dão a
+# concorrência; os processos são só um por núcleo, o que cabe numa instância
+# pequena.
+#
+# Timeout: o PDF de empréstimos é gerado pelo 'processar_relatorios', fora dos
+# workers web; a view só enfileira e o download entrega o arquivo pronto. As
+# requisições mais longas que sobram são a importação de planilhas e as
+# exportações, daí os 60s. O CSV sai em streaming, mas o XLSX só começa a ser
+# enviado depois de gravado inteiro (ver acervo/exportacao.py): uma exportação
+# XLSX de centenas de milhares de linhas pode passar desse limite, e para ela
+# o caminho é o CSV (ou aumentar GUNICORN_TIMEOUT).
+
+import multiprocessing
+import os
+
+
+def _inteiro(nome, padrao):
+    return int(os.environ.get(nome) or padrao)
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+
+if os.environ.get('SERVIDOR', 'wsgi') == 'asgi':
+    wsgi_app = 'biblioteca_virtual.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'biblioteca_virtual.wsgi:application'
+    worker_class = 'gthread'
+    threads = _inteiro('GUNICORN_THREADS', 4)
+
+workers = _inteiro('WEB_CONCURRENCY', multiprocessing.cpu_count() + 1)
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() != 'false'
+
+# Recicla cada processo depois de algumas requisições (contém vazamentos de
+# memória); o jitter evita que todos reiniciem ao mesmo tempo
+max_requests = _inteiro('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = max_requests // 10
+
+timeout = _inteiro('GUNICORN_TIMEOUT', 60)
+graceful_timeout = 30
+keepalive = 5
+
+# O heartbeat dos workers em memória: em containers o /tmp pode estar em disco
+# lento, e um fsync demorado faria o mestre matar workers saudáveis
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        return
+    # Carrega as URLs (e com elas as views) ainda no mestre, para que os
+    # workers herdem esses módulos já importados
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+
+
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+    # Conexões abertas pelo mestre durante o preload não podem ser compartilhadas
+    from django.db import connections
+    connections.close_all()
@@ -2,8 +2,56 @@
 # Exit on error
 set -o errexit
 
-# 1. Aplicar as migrações do banco de dados (roda toda vez que o app inicia)
-python manage.py migrate
+# 1. Aplicar as migrações do banco de dados. Com várias instâncias (ou quando o
+#    deploy já migra antes), defina MIGRAR=false para não repetir isso a cada
+#    inicialização
+if [ "${MIGRAR:-true}" = "true" ]; then
+    python manage.py migrate --no-input
+fi
 
-# 2. Iniciar o servidor Gunicorn
-gunicorn biblioteca_virtual.wsgi:application --bind 0.0.0.0:10000
\ No newline at end of file
+# 2. Worker da fila de relatórios em PDF, no mesmo container (defina
+#    RELATORIOS_WORKER=false se ele rodar num serviço separado). Se ele terminar
+#    por qualquer motivo, é reiniciado; no SIGTERM, termina o relatório em
+#    andamento e sai
+worker_pid=
+if [ "${RELATORIOS_WORKER:-true}" = "true" ]; then
+    (
+        filho=
+        trap 'kill -TERM $filho 2>/dev/null || true; wait $filho || true; exit 0' TERM INT
+        while true; do
+            python manage.py processar_relatorios &
+            filho=$!
+            codigo=0
+            wait "$filho" || codigo=$?
+            echo "Worker de relatórios terminou (código $codigo); reiniciando em 5s." >&2
+            sleep 5 &
+            filho=$!
+            wait "$filho" || true
+        done
+    ) &
+    worker_pid=$!
+fi
+
+# 3. Iniciar o servidor Gunicorn com o perfil de gunicorn.conf.py (processos,
+#    threads, preload, reciclagem e timeouts configuráveis por variáveis de
+#    ambiente). SERVIDOR=asgi usa workers Uvicorn: as views async (autocomplete,
+#    dashboard e listas) atendem muitas requisições simultâneas em cada
+#    processo. O padrão é WSGI com workers gthread.
+#    O Gunicorn roda como filho deste script (e não com exec) para que o SIGTERM
+#    do deploy chegue aos dois processos
+gunicorn -c gunicorn.conf.py &
+gunicorn_pid=$!
+trap 'kill -TERM $gunicorn_pid $worker_pid 2>/dev/null || true' TERM INT
+
+# O 'wait' volta assim que chega um sinal: espera de novo até o Gunicorn sair
+status=0
+while kill -0 "$gunicorn_pid" 2>/dev/null; do
+    wait "$gunicorn_pid" && status=0 || status=$?
+done
+
+# O container termina com o Gunicorn, levando o worker junto
+if [ -n "$worker_pid" ]; then
+    kill -TERM "$worker_pid" 2>/dev/null || true
+    wait "$worker_pid" || true
+fi
+exit "$status"